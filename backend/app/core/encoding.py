@@ -0,0 +1,160 @@
+"""
+Response encoding: a fast JSON path and negotiated compression.
+
+- `dumps` / `FastJSONResponse`: orjson when installed (dates, datetimes, enums and numpy
+  natively), stdlib json otherwise. Hot read endpoints return FastJSONResponse with rows
+  they built from the query, so FastAPI skips response-model validation and
+  jsonable_encoder; the response_model stays on the route for the OpenAPI docs.
+- `CompressionMiddleware`: brotli (if installed) or gzip, by the client's Accept-Encoding,
+  for bodies of PHARMA_COMPRESSION_MIN_BYTES or more. Streams are compressed as they go;
+  the live event stream (text/event-stream), binary formats and already-encoded bodies
+  pass through. ETags become weak on compressed responses (If-None-Match compares weakly).
+"""
+import dataclasses
+import json
+import zlib
+from decimal import Decimal
+from typing import Any, Optional
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from app.core.config import get_settings
+
+try:
+    import orjson
+except ImportError:  # Optional: stdlib json is the fallback
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip is always available
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4        # Fast setting; close to gzip -9 in size for JSON
+SKIP_TYPES = ("text/event-stream", "application/zip", "application/gzip",
+              "application/vnd.apache.arrow.stream", "application/vnd.apache.parquet", "image/")
+
+
+def _default(value: Any):
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, Decimal):
+        return float(value)
+    if hasattr(value, "_asdict"):  # SQLAlchemy Row
+        return value._asdict()
+    if dataclasses.is_dataclass(value):
+        return dataclasses.asdict(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    return str(value)
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, default=_default, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON for content that is already the response shape (no validation, no jsonable_encoder)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+# --- COMPRESSION ---
+
+def _negotiate(accept_encoding: str) -> Optional[str]:
+    """"br" / "gzip" / None from Accept-Encoding, honouring q=0."""
+    offered = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip()] = quality
+    wildcard = offered.get("*", 0.0)
+    if brotli is not None and offered.get("br", wildcard) > 0:
+        return "br"
+    if offered.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+
+class _Encoder:
+    def __init__(self, coding: str):
+        self._brotli = brotli.Compressor(quality=BROTLI_QUALITY) if coding == "br" else None
+        self._gzip = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31) if coding == "gzip" else None  # 31: gzip container
+
+    def chunk(self, data: bytes) -> bytes:
+        # No flush per chunk: per-row stream chunks would wreck the ratio
+        return self._brotli.process(data) if self._brotli else self._gzip.compress(data)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self._brotli:
+            return self._brotli.process(data) + self._brotli.finish()
+        return self._gzip.compress(data) + self._gzip.flush()
+
+
+class CompressionMiddleware:
+    """Pure ASGI; holds only the response start until the first body chunk shows whether it is worth it."""
+
+    def __init__(self, app, minimum_size: Optional[int] = None):
+        self.app = app
+        self.minimum_size = get_settings().compression_min_bytes if minimum_size is None else minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        coding = _negotiate(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if coding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        encoder = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, encoder, passthrough
+            if message["type"] == "http.response.start":
+                response_headers = [(k.lower(), v) for k, v in message.get("headers", [])]
+                content_type = next((v.decode("latin-1") for k, v in response_headers if k == b"content-type"), "")
+                passthrough = (
+                    message["status"] in (204, 304)
+                    or content_type.startswith(SKIP_TYPES)
+                    or any(k == b"content-encoding" for k, _ in response_headers)
+                )
+                if passthrough:
+                    return await send(message)
+                start = {**message, "headers": response_headers}  # Held until the first body chunk decides
+                return
+            if passthrough or message["type"] != "http.response.body":
+                return await send(message)
+
+            body, more = message.get("body", b""), message.get("more_body", False)
+            if start is not None:
+                response_start, start = start, None
+                if not more and len(body) < self.minimum_size:
+                    await send(response_start)
+                    return await send(message)
+                encoder = _Encoder(coding)
+                # The representation changed: a strong validator becomes weak
+                response_headers = [
+                    (k, b"W/" + v if k == b"etag" and not v.startswith(b"W/") else v)
+                    for k, v in response_start["headers"] if k != b"content-length"
+                ]
+                response_headers += [(b"content-encoding", coding.encode()), (b"vary", b"Accept-Encoding")]
+                if not more:
+                    body = encoder.finish(body)
+                    response_headers.append((b"content-length", str(len(body)).encode()))
+                    await send({**response_start, "headers": response_headers})
+                    return await send({"type": "http.response.body", "body": body})
+                await send({**response_start, "headers": response_headers})
+            data = encoder.chunk(body) if more else encoder.finish(body)
+            if data or not more:
+                await send({"type": "http.response.body", "body": data, "more_body": more})
+
+        await self.app(scope, receive, send_wrapper)
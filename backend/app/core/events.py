@@ -0,0 +1,158 @@
+"""
+Change-event bus for live dashboards.
+
+Write paths stage row-level deltas on their Session with `stage(db, event)`; the events are
+published only when that transaction commits (and dropped on rollback), so subscribers never
+see a change that didn't happen. Every published event gets a monotonically increasing `seq`.
+
+Clients take a snapshot (GET /inventory/stock/live/ returns X-Event-Seq) and then follow
+GET /inventory/stock/live/events?since=<seq>; events still in the ring buffer are replayed,
+older gaps get a `reset` event telling the client to re-snapshot.
+
+The default backend is in-process (one worker). For multi-worker deployments set
+PHARMA_EVENT_BACKEND=package.module:Class to a backend with the same interface as
+InMemoryBackend (e.g. one backed by Redis Streams or Postgres LISTEN/NOTIFY) that calls
+`deliver` for events published by any worker.
+"""
+import asyncio
+import importlib
+import threading
+from collections import deque
+from typing import Callable, List, Optional
+from sqlalchemy import event as sa_event
+from sqlalchemy.orm import Session
+from app.core.config import get_settings
+
+EVENT_BUFFER_SIZE = 10000    # events kept for resume (ring buffer)
+SUBSCRIBER_QUEUE_SIZE = 1000 # a client further behind than this is reset
+
+
+# --- BACKENDS ---
+
+class InMemoryBackend:
+    """Sequence counter + ring buffer for a single worker process."""
+
+    def __init__(self, size: int = EVENT_BUFFER_SIZE):
+        self._lock = threading.Lock()
+        self._buffer = deque(maxlen=size)
+        self._seq = 0
+        self._deliver: Optional[Callable[[List[dict]], None]] = None
+
+    def attach(self, deliver: Callable[[List[dict]], None]):
+        self._deliver = deliver
+
+    def publish(self, events: List[dict]):
+        with self._lock:
+            sequenced = []
+            for payload in events:
+                self._seq += 1
+                sequenced.append({"seq": self._seq, **payload})
+            self._buffer.extend(sequenced)
+            # Still under the lock: subscribers must get seqs in order (a stream drops anything
+            # at or below the last seq it sent). Delivery only schedules, it never blocks.
+            if self._deliver:
+                self._deliver(sequenced)
+
+    def head(self) -> int:
+        return self._seq
+
+    def since(self, seq: int):
+        """Events after `seq`, and whether the buffer still reaches back that far."""
+        with self._lock:
+            events = [e for e in self._buffer if e["seq"] > seq]
+            oldest = self._buffer[0]["seq"] if self._buffer else self._seq + 1
+            # A seq ahead of ours means the process restarted: the client must re-snapshot
+            complete = oldest - 1 <= seq <= self._seq
+        return events, complete
+
+
+# --- BUS ---
+
+class Subscription:
+    def __init__(self, loop, warehouse_id: Optional[int]):
+        self.loop = loop
+        self.warehouse_id = warehouse_id
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.lagged = False
+
+    def wants(self, payload: dict) -> bool:
+        return self.warehouse_id is None or payload.get("warehouse_id") in (None, self.warehouse_id)
+
+    def _put(self, payload: dict):
+        # Runs on the subscriber's event loop
+        if self.lagged:
+            return
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.lagged = True
+
+
+class EventBus:
+    def __init__(self, backend):
+        self.backend = backend
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        backend.attach(self._deliver)
+
+    def publish(self, events: List[dict]):
+        if events:
+            self.backend.publish(events)
+
+    def head(self) -> int:
+        return self.backend.head()
+
+    def replay(self, seq: int):
+        return self.backend.since(seq)
+
+    def subscribe(self, warehouse_id: Optional[int] = None) -> Subscription:
+        """Must be called from the event loop that will read the subscription."""
+        subscription = Subscription(asyncio.get_running_loop(), warehouse_id)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def _deliver(self, events: List[dict]):
+        # Publishers run in worker threads (sync routes); hand over to each subscriber's loop
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            for payload in events:
+                if subscription.wants(payload):
+                    try:
+                        subscription.loop.call_soon_threadsafe(subscription._put, payload)
+                    except RuntimeError:
+                        self.unsubscribe(subscription)  # Loop already closed
+                        break
+
+
+def _load_backend():
+    path = get_settings().event_backend
+    if not path:
+        return InMemoryBackend()
+    module_name, class_name = path.split(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+bus = EventBus(_load_backend())
+
+
+# --- TRANSACTION HOOKS ---
+
+def stage(db: Session, *events: dict):
+    """Queue events to publish when `db` commits."""
+    db.info.setdefault("pending_events", []).extend(events)
+
+@sa_event.listens_for(Session, "after_commit")
+def _publish_on_commit(session):
+    events = session.info.pop("pending_events", None)
+    if events:
+        bus.publish(events)
+
+@sa_event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop("pending_events", None)
@@ -0,0 +1,247 @@
+"""
+Idempotency keys for retried writes.
+
+A POST carrying `Idempotency-Key` runs once: the response is stored under the key and a
+retry gets the stored response back (with `Idempotent-Replayed: true`) without the handler
+running again. A duplicate that arrives while the first is still running waits for its
+result instead of racing it. Reusing a key for a different request (method, path, query or
+body) is a 422. Server errors (5xx) are not stored, so a retry after one runs again.
+
+Stored responses are compressed and evicted after PHARMA_IDEMPOTENCY_TTL_SECONDS, or
+earlier (oldest first) once they add up to PHARMA_IDEMPOTENCY_MAX_BYTES.
+The default store is in-process (one worker). For multi-worker deployments set
+PHARMA_IDEMPOTENCY_BACKEND=package.module:Class to a shared store with the same interface
+as MemoryStore (reserve / complete / release); duplicates on other workers poll it.
+"""
+import asyncio
+import hashlib
+import importlib
+import json
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from app.core.config import get_settings
+
+HEADER = b"idempotency-key"
+MAX_KEY_LENGTH = 255
+MAX_ENTRIES = 100000
+IN_PROGRESS_TTL_SECONDS = 300   # a key held by a crashed request frees up after this
+WAIT_SECONDS = 30               # how long a duplicate waits for the first request
+POLL_SECONDS = 0.05             # duplicate of a request running on another worker
+MAX_STORED_BODY = 5 * 1024 * 1024
+MAX_STORED_BYTES = 256 * 1024 * 1024  # all stored responses of a MemoryStore
+COMPRESS_ABOVE = 1024           # bytes
+
+PENDING = "PENDING"
+DONE = "DONE"
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes         # zlib-compressed when `compressed`
+    compressed: bool
+
+    def content(self) -> bytes:
+        return zlib.decompress(self.body) if self.compressed else self.body
+
+    def size(self) -> int:
+        return len(self.body) + sum(len(name) + len(value) for name, value in self.headers)
+
+
+@dataclass(frozen=True)
+class Entry:
+    state: str          # PENDING / DONE
+    fingerprint: str
+    response: Optional[StoredResponse] = None
+
+
+# --- STORES ---
+
+class MemoryStore:
+    """
+    Per-process key -> Entry map with a TTL per entry, and caps on the number of entries and
+    on the bytes of stored responses (oldest evicted first).
+    """
+
+    def __init__(self, ttl: float, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_STORED_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, Entry)
+        self._bytes = 0
+
+    @staticmethod
+    def _size(entry: Entry) -> int:
+        return entry.response.size() if entry.response is not None else 0
+
+    def _put(self, key: str, expires_at: float, entry: Entry):
+        self._drop(key)
+        self._entries[key] = (expires_at, entry)
+        self._bytes += self._size(entry)
+
+    def _drop(self, key: str):
+        current = self._entries.pop(key, None)
+        if current is not None:
+            self._bytes -= self._size(current[1])
+
+    def _evict(self, now: float):
+        while self._entries:
+            key, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) <= self.max_entries and self._bytes <= self.max_bytes:
+                break
+            self._drop(key)
+
+    def reserve(self, key: str, fingerprint: str) -> Optional[Entry]:
+        """Claims the key (returns None) unless a live entry holds it (returns that entry)."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            current = self._entries.get(key)
+            if current is not None and current[0] > now:
+                return current[1]
+            self._put(key, now + IN_PROGRESS_TTL_SECONDS, Entry(PENDING, fingerprint))
+            return None
+
+    def complete(self, key: str, fingerprint: str, response: StoredResponse):
+        now = time.monotonic()
+        with self._lock:
+            self._put(key, now + self.ttl, Entry(DONE, fingerprint, response))
+            self._evict(now)
+
+    def release(self, key: str):
+        with self._lock:
+            self._drop(key)
+
+    @property
+    def stored_bytes(self) -> int:
+        return self._bytes
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _load_store():
+    settings = get_settings()
+    if not settings.idempotency_backend:
+        return MemoryStore(ttl=settings.idempotency_ttl_seconds, max_bytes=settings.idempotency_max_bytes)
+    module_name, class_name = settings.idempotency_backend.split(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+# --- MIDDLEWARE ---
+
+async def _send_json(send, status: int, detail: str):
+    body = json.dumps({"detail": detail}).encode()
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware; only POSTs under `prefixes` that carry the header are affected."""
+
+    def __init__(self, app, prefixes: Tuple[str, ...], store=None):
+        self.app = app
+        self.prefixes = prefixes
+        self.store = store or _load_store()
+        self._running = {}  # key -> asyncio.Event, requests running in this process
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith(self.prefixes):
+            return await self.app(scope, receive, send)
+        key = dict(scope["headers"]).get(HEADER)
+        if key is None:
+            return await self.app(scope, receive, send)
+        key = key.decode("latin-1").strip()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return await _send_json(send, 400, f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters")
+
+        # 1. Buffer the body: it is part of the fingerprint and is replayed to the handler
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        body = b"".join(chunks)
+        fingerprint = hashlib.sha256(
+            b"\0".join([scope["method"].encode(), scope["path"].encode(), scope.get("query_string", b""), body])
+        ).hexdigest()
+
+        # 2. Claim the key, or replay / wait for whoever holds it
+        deadline = time.monotonic() + WAIT_SECONDS
+        while True:
+            entry = self.store.reserve(key, fingerprint)
+            if entry is None:
+                break
+            if entry.fingerprint != fingerprint:
+                return await _send_json(send, 422, "Idempotency-Key was already used for a different request")
+            if entry.state == DONE:
+                return await self._replay(send, entry.response)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return await _send_json(send, 409, "A request with this Idempotency-Key is still being processed")
+            running = self._running.get(key)
+            try:
+                if running is not None:
+                    await asyncio.wait_for(running.wait(), remaining)
+                else:
+                    await asyncio.sleep(min(POLL_SECONDS, remaining))
+            except asyncio.TimeoutError:
+                pass
+
+        # 3. Run the handler once, passing the response through while keeping a copy
+        done = self._running[key] = asyncio.Event()
+        replayed_body = False
+        status, headers, parts = 500, [], []
+
+        async def replay_receive():
+            nonlocal replayed_body
+            if not replayed_body:
+                replayed_body = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        async def capture_send(message):
+            nonlocal status, headers
+            if message["type"] == "http.response.start":
+                status, headers = message["status"], list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                parts.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            self.store.release(key)
+            raise
+        else:
+            content = b"".join(parts)
+            if status >= 500 or len(content) > MAX_STORED_BODY:
+                self.store.release(key)
+            else:
+                compressed = len(content) > COMPRESS_ABOVE
+                self.store.complete(key, fingerprint, StoredResponse(
+                    status=status,
+                    headers=[(name, value) for name, value in headers if name.lower() not in (b"date", b"server")],
+                    body=zlib.compress(content, 1) if compressed else content,
+                    compressed=compressed
+                ))
+        finally:
+            # After IN_PROGRESS_TTL a newer request may have claimed the key: leave its event alone
+            if self._running.get(key) is done:
+                del self._running[key]
+            done.set()
+
+    async def _replay(self, send, response: StoredResponse):
+        await send({"type": "http.response.start", "status": response.status,
+                    "headers": response.headers + [(b"idempotent-replayed", b"true")]})
+        await send({"type": "http.response.body", "body": response.content()})
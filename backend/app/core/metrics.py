@@ -0,0 +1,326 @@
+"""
+Request and database instrumentation, rendered as Prometheus text on GET /metrics.
+
+- MetricsMiddleware: latency histogram per (method, route template), request counter per
+  status, and per-request SQL statement count / DB time. A request issuing more than
+  PHARMA_SQL_STATEMENT_BUDGET statements is logged with its most repeated statements
+  (the usual N+1 signature).
+- instrument_engine: cursor-level hooks counting statements and DB time, globally and
+  for the request in progress (a ContextVar, which follows sync routes into the threadpool).
+- Profiling: `?profile=1` with `X-Profile-Token: $PHARMA_PROFILING_TOKEN` returns a cProfile
+  report of the endpoint instead of its response (`?profile=pyinstrument` when pyinstrument
+  is installed). Routers opt in with `route_class=ProfiledRoute`, which starts the profiler
+  in the thread the endpoint actually runs on. Without a token set, profiling is off.
+"""
+import cProfile
+import functools
+import inspect
+import io
+import logging
+import pstats
+import threading
+import time
+import collections
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from app.core.config import get_settings
+
+try:
+    import pyinstrument
+except ImportError:  # Optional: cProfile is always available
+    pyinstrument = None
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)   # seconds
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+PROFILE_TOP_FUNCTIONS = 60
+
+
+# --- PRIMITIVES ---
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names: Tuple[str, ...], values: Tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()):
+        self.name, self.help, self.label_names = name, help_text, label_names
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, labels: Tuple = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> str:
+        with self._lock:
+            lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+            lines += [f"{self.name}{_labels(self.label_names, k)} {v}" for k, v in sorted(self._values.items())]
+        return "\n".join(lines)
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.name, self.help, self.label_names, self.buckets = name, help_text, label_names, buckets
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, labels: Tuple, value: float):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def totals(self, labels: Tuple) -> Tuple[float, int]:
+        """(sum, count) observed so far for one label set."""
+        with self._lock:
+            entry = self._values.get(labels)
+            return (entry[-2], entry[-1]) if entry else (0.0, 0)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.label_names + ("le",)
+        with self._lock:
+            for labels, entry in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, entry):
+                    lines.append(f"{self.name}_bucket{_labels(names, labels + (bound,))} {count}")
+                lines.append(f"{self.name}_bucket{_labels(names, labels + ('+Inf',))} {entry[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {entry[-2]}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {entry[-1]}")
+        return "\n".join(lines)
+
+def _samples(name: str, help_text: str, samples, metric_type: str = "gauge") -> str:
+    """samples: [(labels_dict, value)]"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples:
+        if value is not None:
+            lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {value}")
+    return "\n".join(lines)
+
+
+REQUEST_SECONDS = Histogram("pharma_http_request_duration_seconds", "Request latency.", ("method", "route"), LATENCY_BUCKETS)
+REQUESTS = Counter("pharma_http_requests_total", "Requests by status.", ("method", "route", "status"))
+REQUEST_STATEMENTS = Histogram("pharma_http_request_sql_statements", "SQL statements per request.", ("method", "route"), STATEMENT_BUCKETS)
+REQUEST_DB_SECONDS = Histogram("pharma_http_request_db_seconds", "Time in SQL per request.", ("method", "route"), LATENCY_BUCKETS)
+BUDGET_EXCEEDED = Counter("pharma_sql_statement_budget_exceeded_total", "Requests over the SQL statement budget.", ("method", "route"))
+DB_STATEMENTS = Counter("pharma_db_statements_total", "SQL statements executed (requests and background jobs).")
+DB_SECONDS = Counter("pharma_db_seconds_total", "Time spent executing SQL.")
+
+
+# --- PER-REQUEST STATE ---
+
+@dataclass
+class RequestStats:
+    statements: int = 0
+    db_seconds: float = 0.0
+    by_statement: collections.Counter = field(default_factory=collections.Counter)
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+_profiler: ContextVar[Optional[object]] = ContextVar("profiler", default=None)
+
+
+def instrument_engine(engine):
+    """Counts statements and DB time on a (sync) Engine; async engines pass `.sync_engine`."""
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finish(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_started"].pop()
+        DB_STATEMENTS.inc()
+        DB_SECONDS.inc(amount=elapsed)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.db_seconds += elapsed
+            stats.by_statement[statement] += 1
+
+
+# --- PROFILING ---
+
+def _profiled(endpoint):
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def run_async(*args, **kwargs):
+            profiler = _profiler.get()
+            if profiler is None:
+                return await endpoint(*args, **kwargs)
+            profiler.start()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                profiler.stop()
+        return run_async
+
+    @functools.wraps(endpoint)
+    def run(*args, **kwargs):
+        # Sync routes run in the threadpool: the profiler must start on that thread
+        profiler = _profiler.get()
+        if profiler is None:
+            return endpoint(*args, **kwargs)
+        profiler.start()
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            profiler.stop()
+    return run
+
+class ProfiledRoute(APIRoute):
+    """APIRoute whose endpoint can be profiled per request (see module docstring)."""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _profiled(endpoint), **kwargs)
+
+class _CProfile:
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def report(self) -> str:
+        out = io.StringIO()
+        pstats.Stats(self.profile, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+        return out.getvalue()
+
+class _Pyinstrument:
+    def __init__(self):
+        self.profiler = pyinstrument.Profiler(async_mode="disabled")
+
+    def start(self):
+        self.profiler.start()
+
+    def stop(self):
+        self.profiler.stop()
+
+    def report(self) -> str:
+        return self.profiler.output_text(unicode=True)
+
+
+# --- MIDDLEWARE ---
+
+def _route_label(scope) -> str:
+    # Route template, never the raw path: one series per route however many ids are requested
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+        settings = get_settings()
+        self.budget = settings.sql_statement_budget
+        self.profiling_token = settings.profiling_token
+
+    def _profile_mode(self, scope) -> Optional[str]:
+        if not self.profiling_token:
+            return None
+        mode = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("profile", [None])[0]
+        if mode not in ("1", "pyinstrument"):
+            return None
+        token = dict(scope["headers"]).get(b"x-profile-token", b"").decode("latin-1")
+        return mode if token == self.profiling_token else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        stats_token = _request_stats.set(stats)
+        mode = self._profile_mode(scope)
+        profiler = None
+        if mode:
+            profiler = _Pyinstrument() if mode == "pyinstrument" and pyinstrument else _CProfile()
+        profiler_token = _profiler.set(profiler)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            if profiler is None:
+                await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_stats.reset(stats_token)
+            _profiler.reset(profiler_token)
+            self._record(scope, status, elapsed, stats)
+
+        if profiler is not None:
+            await self._send_profile(send, scope, status, elapsed, stats, profiler)
+
+    def _record(self, scope, status: int, elapsed: float, stats: RequestStats):
+        labels = (scope["method"], _route_label(scope))
+        REQUEST_SECONDS.observe(labels, elapsed)
+        REQUESTS.inc(labels + (status,))
+        REQUEST_STATEMENTS.observe(labels, stats.statements)
+        REQUEST_DB_SECONDS.observe(labels, stats.db_seconds)
+        if stats.statements > self.budget:
+            BUDGET_EXCEEDED.inc(labels)
+            repeated = [(count, " ".join(sql.split())[:200]) for sql, count in stats.by_statement.most_common(3)]
+            logger.warning(
+                "%s %s issued %s SQL statements (budget %s) in %.0f ms; most repeated: %s",
+                labels[0], scope["path"], stats.statements, self.budget, elapsed * 1000, repeated
+            )
+
+    async def _send_profile(self, send, scope, status, elapsed, stats, profiler):
+        header = (
+            f"{scope['method']} {scope['path']} -> {status} in {elapsed * 1000:.1f} ms; "
+            f"{stats.statements} SQL statement(s), {stats.db_seconds * 1000:.1f} ms in the database\n\n"
+        )
+        body = (header + profiler.report()).encode()
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/plain; charset=utf-8"),
+            (b"content-length", str(len(body)).encode()),
+            (b"x-profiled-status", str(status).encode())
+        ]})
+        await send({"type": "http.response.body", "body": body})
+
+
+# --- EXPOSITION ---
+
+def _pool_samples(engines: Dict[str, object]):
+    samples = {"size": [], "checked_out": [], "checked_in": [], "overflow": []}
+    for name, engine in engines.items():
+        pool = engine.pool
+        for metric, method in (("size", "size"), ("checked_out", "checkedout"), ("checked_in", "checkedin"), ("overflow", "overflow")):
+            reader = getattr(pool, method, None)
+            samples[metric].append(({"engine": name}, reader() if callable(reader) else None))
+    return samples
+
+def render(engines: Dict[str, object], extra: Dict[str, Tuple[str, list]] = None,
+           counters: Dict[str, Tuple[str, list]] = None) -> str:
+    """
+    All metrics in Prometheus text format. `extra`: name -> (help, [(labels, value)]) gauges;
+    `counters`: the same for values that only ever grow (names end in _total).
+    """
+    parts = [metric.render() for metric in (
+        REQUEST_SECONDS, REQUESTS, REQUEST_STATEMENTS, REQUEST_DB_SECONDS, BUDGET_EXCEEDED, DB_STATEMENTS, DB_SECONDS
+    )]
+    for metric, samples in _pool_samples(engines).items():
+        parts.append(_samples(f"pharma_db_pool_{metric}", f"Connection pool {metric.replace('_', ' ')}.", samples))
+    for name, (help_text, samples) in (counters or {}).items():
+        parts.append(_samples(name, help_text, samples, "counter"))
+    for name, (help_text, samples) in (extra or {}).items():
+        parts.append(_samples(name, help_text, samples))
+    return "\n".join(parts) + "\n"
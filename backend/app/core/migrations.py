@@ -0,0 +1,274 @@
+"""
+Versioned schema migrations.
+
+The app no longer runs DDL at import time. Apply pending migrations explicitly:
+    python -m app.core.migrations upgrade
+    python -m app.core.migrations status
+
+Each migration is a function taking an open Connection (inside one transaction) and is
+recorded in `schema_migrations`. Migrations must be safe on databases created by older
+builds with create_all(), so table/index creation always uses checkfirst.
+"""
+import sys
+from datetime import datetime
+from sqlalchemy import Column, String, DateTime, Table, MetaData, inspect, select, text
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+from app.core.database import engine
+
+# Every model module must be imported so its tables are registered on Base.metadata
+from app.domains.master import models as master_models
+from app.domains.inventory import models as inv_models
+from app.domains.sales import models as sales_models
+from app.domains.analytics import models as analytics_models
+from app.domains.compliance import models as compliance_models
+from app.domains.jobs import models as jobs_models
+
+_meta = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _meta,
+    Column("version", String, primary_key=True),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now())
+)
+
+
+def _create_tables(conn, *models):
+    for model in models:
+        model.__table__.create(bind=conn, checkfirst=True)
+
+def _create_indexes(conn, *models):
+    existing = {}
+    for model in models:
+        table = model.__table__
+        if table.name not in existing:
+            existing[table.name] = {ix["name"] for ix in inspect(conn).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing[table.name]:
+                index.create(bind=conn)
+
+
+# --- MIGRATIONS ---
+
+def _0001_baseline(conn):
+    # The original schema (what create_all produced before migrations existed)
+    _create_tables(
+        conn,
+        master_models.Manufacturer, master_models.Product,
+        inv_models.Warehouse, inv_models.Bin, inv_models.Batch, inv_models.Stock,
+        sales_models.SalesOrder, sales_models.SalesOrderItem
+    )
+
+def _0002_rollups_allocations_telemetry(conn):
+    seed_rollups = not inspect(conn).has_table(analytics_models.ProductStockRollup.__tablename__)
+    _create_tables(
+        conn,
+        analytics_models.ProductStockRollup, analytics_models.ProductSalesDaily,
+        sales_models.SalesOrderAllocation,
+        inv_models.TelemetryReading, inv_models.TelemetryRollup, inv_models.TelemetryExcursion
+    )
+    if seed_rollups:
+        from app.domains.analytics.rollups import rebuild_rollups
+        rebuild_rollups(Session(bind=conn))
+
+def _merge_duplicate_batches(conn):
+    # Older builds could create the same (product, batch_number) twice; keep the lowest id
+    dupes = conn.execute(text(
+        "SELECT product_id, batch_number, MIN(id) FROM batches "
+        "GROUP BY product_id, batch_number HAVING COUNT(*) > 1"
+    )).all()
+    for product_id, batch_number, keep_id in dupes:
+        params = {"product_id": product_id, "batch_number": batch_number, "keep_id": keep_id}
+        others = "SELECT id FROM batches WHERE product_id = :product_id AND batch_number = :batch_number AND id <> :keep_id"
+        conn.execute(text(f"UPDATE stocks SET batch_id = :keep_id WHERE batch_id IN ({others})"), params)
+        conn.execute(text(f"UPDATE sales_order_items SET allocated_batch_id = :keep_id WHERE allocated_batch_id IN ({others})"), params)
+        conn.execute(text(f"UPDATE sales_order_allocations SET batch_id = :keep_id WHERE batch_id IN ({others})"), params)
+        conn.execute(text(f"DELETE FROM batches WHERE id IN ({others})"), params)
+    return len(dupes)
+
+def _merge_duplicate_stocks(conn):
+    # One Stock per (batch, bin): fold duplicates into the lowest id
+    dupes = conn.execute(text(
+        "SELECT batch_id, bin_id, MIN(id), SUM(quantity), MAX(CASE WHEN is_quarantined THEN 1 ELSE 0 END) "
+        "FROM stocks GROUP BY batch_id, bin_id HAVING COUNT(*) > 1"
+    )).all()
+    for batch_id, bin_id, keep_id, quantity, quarantined in dupes:
+        params = {"batch_id": batch_id, "bin_id": bin_id, "keep_id": keep_id}
+        others = "SELECT id FROM stocks WHERE batch_id = :batch_id AND bin_id = :bin_id AND id <> :keep_id"
+        conn.execute(text(f"UPDATE sales_order_allocations SET stock_id = :keep_id WHERE stock_id IN ({others})"), params)
+        conn.execute(text(f"DELETE FROM stocks WHERE id IN ({others})"), params)
+        conn.execute(
+            text("UPDATE stocks SET quantity = :quantity, is_quarantined = :quarantined WHERE id = :keep_id"),
+            {"quantity": quantity, "quarantined": bool(quarantined), "keep_id": keep_id}
+        )
+    return len(dupes)
+
+def _0003_hot_path_indexes(conn):
+    merged = _merge_duplicate_batches(conn) + _merge_duplicate_stocks(conn)
+    _create_indexes(conn, inv_models.Batch, inv_models.Stock, sales_models.SalesOrderItem)
+    if merged:
+        # Merging can change what counts as quarantined
+        from app.domains.analytics.rollups import rebuild_rollups
+        rebuild_rollups(Session(bind=conn))
+
+def _0004_batch_trace_index(conn):
+    if inspect(conn).has_table(compliance_models.BatchSaleIndex.__tablename__):
+        return
+    _create_tables(conn, compliance_models.BatchSaleIndex)
+
+    # Backfill: allocation slices first, then pre-0002 lines that only carry allocated_batch_id
+    conn.execute(text("""
+        INSERT INTO batch_sales_index
+            (batch_id, product_id, order_id, order_item_id, customer_name, order_date, quantity)
+        SELECT a.batch_id, i.product_id, o.id, i.id, o.customer_name, o.created_at, a.quantity
+        FROM sales_order_allocations a
+        JOIN sales_order_items i ON i.id = a.order_item_id
+        JOIN sales_orders o ON o.id = i.order_id
+        WHERE a.batch_id IS NOT NULL
+    """))
+    conn.execute(text("""
+        INSERT INTO batch_sales_index
+            (batch_id, product_id, order_id, order_item_id, customer_name, order_date, quantity)
+        SELECT i.allocated_batch_id, i.product_id, o.id, i.id, o.customer_name, o.created_at, i.quantity
+        FROM sales_order_items i
+        JOIN sales_orders o ON o.id = i.order_id
+        WHERE i.allocated_batch_id IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM sales_order_allocations a WHERE a.order_item_id = i.id)
+    """))
+
+def _0005_product_search(conn):
+    if conn.dialect.name == "postgresql":
+        # Trigram GIN index over the same text the search endpoint matches (see master/search.py)
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_products_search_trgm ON products USING gin "
+            "((coalesce(name, '') || ' ' || coalesce(sku_code, '') || ' ' || coalesce(composition, '')) gin_trgm_ops)"
+        ))
+        return
+    if conn.dialect.name != "sqlite":
+        return  # Search falls back to LIKE
+
+    # FTS5 external-content table over products, kept in sync by triggers
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5("
+        "name, sku_code, composition, content='products', content_rowid='id', prefix='2 3 4')"
+    ))
+    columns = "name, sku_code, composition"
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS products_search_ai AFTER INSERT ON products BEGIN
+            INSERT INTO product_search(rowid, {columns}) VALUES (new.id, new.name, new.sku_code, new.composition);
+        END
+    """))
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS products_search_ad AFTER DELETE ON products BEGIN
+            INSERT INTO product_search(product_search, rowid, {columns})
+            VALUES ('delete', old.id, old.name, old.sku_code, old.composition);
+        END
+    """))
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS products_search_au AFTER UPDATE OF {columns} ON products BEGIN
+            INSERT INTO product_search(product_search, rowid, {columns})
+            VALUES ('delete', old.id, old.name, old.sku_code, old.composition);
+            INSERT INTO product_search(rowid, {columns}) VALUES (new.id, new.name, new.sku_code, new.composition);
+        END
+    """))
+    conn.execute(text("INSERT INTO product_search(product_search) VALUES ('rebuild')"))
+    # Case-insensitive starts-with on SKU / name (type-ahead's first tier) as index range scans
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_products_sku_nocase ON products (sku_code COLLATE NOCASE)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_products_name_nocase ON products (name COLLATE NOCASE)"))
+
+def _0006_expiry_calendar(conn):
+    _create_tables(conn, inv_models.StockExpiryCalendar)
+    _create_indexes(conn, inv_models.StockExpiryCalendar)
+    from app.domains.inventory.expiry import rebuild_calendar
+    rebuild_calendar(Session(bind=conn))
+
+def _0007_pick_waves(conn):
+    _create_tables(conn, sales_models.PickWave, sales_models.PickWaveOrder, sales_models.PickTask)
+    _create_indexes(conn, sales_models.SalesOrder, sales_models.PickWaveOrder, sales_models.PickTask)
+
+def _0008_stock_ledger(conn):
+    _create_tables(conn, inv_models.StockMovement, inv_models.StockSnapshot, inv_models.StockSnapshotLine)
+    _create_indexes(conn, inv_models.StockMovement, inv_models.StockSnapshot)
+    # Opening balance per stock row, so every row's movements sum to its quantity
+    conn.execute(text("""
+        INSERT INTO stock_movements
+            (created_at, movement_type, stock_id, product_id, warehouse_id, quantity_delta, quarantined_delta)
+        SELECT :now, 'OPENING', s.id, b.product_id, bn.warehouse_id, s.quantity,
+               CASE WHEN s.is_quarantined THEN s.quantity ELSE 0 END
+        FROM stocks s
+        JOIN batches b ON b.id = s.batch_id
+        JOIN bins bn ON bn.id = s.bin_id
+        WHERE s.quantity <> 0
+    """), {"now": datetime.utcnow()})
+
+def _0009_product_forecasts(conn):
+    # Filled by the first forecast refresh; insights fall back to the window average until then
+    _create_tables(conn, analytics_models.ProductForecast)
+
+def _0010_bin_capacity(conn):
+    # NULL keeps the configured default capacity for bins nobody has measured
+    if "capacity" not in {column["name"] for column in inspect(conn).get_columns("bins")}:
+        conn.execute(text("ALTER TABLE bins ADD COLUMN capacity INTEGER"))
+
+def _0011_jobs(conn):
+    _create_tables(conn, jobs_models.Job, jobs_models.JobSchedule)
+
+def _0012_job_result_chunks(conn):
+    # Results move out of the jobs row; jobs.result (0011) is no longer read or written
+    _create_tables(conn, jobs_models.JobResultChunk)
+
+
+MIGRATIONS = [
+    ("0001", "baseline schema", _0001_baseline),
+    ("0002", "rollups, allocation slices, telemetry history", _0002_rollups_allocations_telemetry),
+    ("0003", "hot path indexes + upsert unique keys", _0003_hot_path_indexes),
+    ("0004", "batch -> customer trace index", _0004_batch_trace_index),
+    ("0005", "product search index (FTS5 / pg_trgm)", _0005_product_search),
+    ("0006", "stock expiry calendar", _0006_expiry_calendar),
+    ("0007", "pick waves and routed pick tasks", _0007_pick_waves),
+    ("0008", "stock movement ledger + snapshots", _0008_stock_ledger),
+    ("0009", "product demand forecasts", _0009_product_forecasts),
+    ("0010", "bin capacity for putaway", _0010_bin_capacity),
+    ("0011", "background jobs and schedules", _0011_jobs),
+    ("0012", "job results in chunk rows", _0012_job_result_chunks),
+]
+HEAD = MIGRATIONS[-1][0]
+
+
+def applied_versions(bind=engine):
+    with bind.connect() as conn:
+        if not inspect(conn).has_table(schema_migrations.name):
+            return set()
+        return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+def pending(bind=engine):
+    done = applied_versions(bind)
+    return [(version, description) for version, description, _ in MIGRATIONS if version not in done]
+
+def upgrade(bind=engine):
+    """Applies every pending migration, each in its own transaction. Returns the versions applied."""
+    schema_migrations.create(bind=bind, checkfirst=True)
+    done = applied_versions(bind)
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version in done:
+            continue
+        with bind.begin() as conn:
+            migrate(conn)
+            conn.execute(schema_migrations.insert().values(version=version))
+        applied.append(version)
+    return applied
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    if command == "upgrade":
+        applied = upgrade()
+        print(f"applied: {', '.join(applied) or 'nothing'} (head {HEAD})")
+    elif command == "status":
+        todo = pending()
+        for version, description in todo:
+            print(f"pending {version}: {description}")
+        print(f"{len(todo)} pending migration(s) (head {HEAD})")
+    else:
+        sys.exit("usage: python -m app.core.migrations [upgrade|status]")
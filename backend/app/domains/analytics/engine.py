@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from app.domains.analytics.models import ProductStockRollup, ProductSalesDaily, ProductForecast
+from app.domains.master.models import Product
+
+# --- RULE THRESHOLDS ---
+STOCKOUT_DAYS = 7          # Less than a week of cover => CRITICAL
+SAFETY_STOCK_UNITS = 50    # No sales history and below this => WARNING
+DEAD_STOCK_UNITS = 500     # Above this with zero sales in the window => INFO
+
+# Rows are pulled from the DB cursor in chunks so memory stays flat for big catalogs
+CHUNK_SIZE = 5000
+
+
+def _catalog_query(db: Session, window_days: int):
+    """
+    One statement for the whole catalog, read from the rollups:
+    products LEFT JOIN stock rollup LEFT JOIN (daily sales summed over the window)
+    LEFT JOIN forecast (see analytics/forecast.py).
+    """
+    since = datetime.utcnow().date() - timedelta(days=window_days)
+    sales_per_product = db.query(
+        ProductSalesDaily.product_id.label("product_id"),
+        func.sum(ProductSalesDaily.quantity).label("total_sold")
+    ).filter(ProductSalesDaily.day > since)\
+     .group_by(ProductSalesDaily.product_id)\
+     .subquery()
+
+    return db.query(
+        Product.name,
+        func.coalesce(ProductStockRollup.on_hand, 0),
+        func.coalesce(sales_per_product.c.total_sold, 0),
+        ProductForecast.daily_rate
+    ).outerjoin(ProductStockRollup, ProductStockRollup.product_id == Product.id)\
+     .outerjoin(sales_per_product, sales_per_product.c.product_id == Product.id)\
+     .outerjoin(ProductForecast, ProductForecast.product_id == Product.id)\
+     .order_by(Product.id)\
+     .yield_per(CHUNK_SIZE)
+
+
+def _apply_rules(names, stock, sold, forecast, window_days: int):
+    """
+    Applies the insight rules column-wise over one chunk.
+    names/stock/sold/forecast are parallel columns; returns the insights for the chunk.
+    """
+    # C. Burn rate (units/day): the forecast daily rate; the window average for products
+    #    without one yet (no forecast refresh since they first sold)
+    demand = [f if f is not None else s / window_days for s, f in zip(sold, forecast)]
+
+    # Column masks, computed once per chunk
+    has_demand = [d > 0 for d in demand]
+    days_left = [st / d if hd else None for st, d, hd in zip(stock, demand, has_demand)]
+    stockout = [hd and dl < STOCKOUT_DAYS for hd, dl in zip(has_demand, days_left)]
+    low_inventory = [not hd and st < SAFETY_STOCK_UNITS for hd, st in zip(has_demand, stock)]
+    dead_stock = [st > DEAD_STOCK_UNITS and s == 0 for st, s in zip(stock, sold)]
+
+    insights = []
+    for i, name in enumerate(names):
+        # Insight 1: Low Stock / Stockout Risk
+        if stockout[i]:
+            insights.append({
+                "type": "CRITICAL",
+                "title": "Stockout Risk",
+                "message": f"{name} will run out in {int(days_left[i])} days.",
+                "metric": f"{stock[i]} Units left"
+            })
+        elif low_inventory[i]:
+            insights.append({
+                "type": "WARNING",
+                "title": "Low Inventory",
+                "message": f"{name} is below safety stock levels.",
+                "metric": f"{stock[i]} Units"
+            })
+
+        # Insight 2: Dead Stock (High Stock, Zero Sales)
+        if dead_stock[i]:
+            insights.append({
+                "type": "INFO",
+                "title": "Dead Stock",
+                "message": f"{name} is not moving. Consider a discount.",
+                "metric": "Overstocked"
+            })
+    return insights
+
+
+def compute_insights(db: Session, window_days: Optional[int] = 30,
+                     progress: Optional[Callable[[int], None]] = None):
+    """`progress(products)` is called after each chunk, the last partial one included (background jobs report it)."""
+    window_days = window_days or 30
+    insights = []
+
+    names, stock, sold, forecast = [], [], [], []
+    done = 0
+    for name, total_stock, total_sold, daily_rate in _catalog_query(db, window_days):
+        names.append(name)
+        stock.append(int(total_stock))
+        sold.append(int(total_sold))
+        forecast.append(daily_rate)
+
+        if len(names) >= CHUNK_SIZE:
+            insights.extend(_apply_rules(names, stock, sold, forecast, window_days))
+            done += len(names)
+            names, stock, sold, forecast = [], [], [], []
+            if progress:
+                progress(done)
+
+    if names:
+        insights.extend(_apply_rules(names, stock, sold, forecast, window_days))
+        done += len(names)
+        if progress:
+            progress(done)
+
+    return insights
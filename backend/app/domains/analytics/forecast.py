@@ -0,0 +1,256 @@
+"""
+Demand forecasting for the whole catalog, vectorised with NumPy.
+
+Daily demand comes from the sales rollup (`product_sales_daily`, one row per product and
+UTC day with sales), streamed once in product order into dense (products x days) blocks.
+Every block is fitted at once, one column (day) per step:
+
+- damped-trend exponential smoothing (Holt) gives a level and a trend per product;
+- a day-of-week profile from the last PROFILE_DAYS, shrunk towards flat for slow movers;
+- 7- and 28-day moving averages, for reference.
+
+The forecast for the next HORIZON_DAYS is level + damped trend, shaped by the weekday
+profile; `daily_rate` is its mean and is what insights divide stock by (days of cover).
+
+Results are stored in `product_forecasts`. A refresh after new days have completed is
+incremental: the stored level / trend are advanced over the new days only, reading just the
+last PROFILE_DAYS of sales. A full refresh refits FIT_DAYS of history. Today's sales are not
+used until the day completes.
+
+    python -m app.domains.analytics.forecast refresh
+    python -m app.domains.analytics.forecast refresh --full
+"""
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import Integer, cast, delete, func, insert, select
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal
+from app.domains.analytics.models import ProductForecast, ProductSalesDaily, ProductStockRollup
+from app.domains.master.models import Product
+
+# Smoothing constants (daily data): slow level, slower trend, trend fades over ~2 weeks
+ALPHA = 0.1
+BETA = 0.02
+PHI = 0.9
+
+FIT_DAYS = 364          # History used by a full refresh
+INIT_DAYS = 28          # Initial level: mean of the first days fitted
+PROFILE_DAYS = 56       # Weekday profile window; also the longest gap an incremental refresh covers
+PROFILE_PRIOR = 2.0     # Pseudo-units per weekday: slow movers get a near-flat profile
+HORIZON_DAYS = 28
+
+BLOCK_PRODUCTS = 20000  # Rows per dense block: 20000 x 364 float32 is ~29 MB
+ROW_CHUNK = 50000
+
+
+# --- DEMAND MATRIX ---
+
+def _day_offset(db: Session, start: date):
+    # Days since `start`, computed by the database: no per-row date parsing in Python
+    if db.get_bind().dialect.name == "sqlite":
+        return cast(func.julianday(ProductSalesDaily.day) - func.julianday(start.isoformat()), Integer)
+    return ProductSalesDaily.day - start
+
+def _sales(db: Session, start: date, end: date) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """(product_ids, day offsets from start, units) arrays for start..end, in product order (the rollup's key order)."""
+    statement = select(ProductSalesDaily.product_id, _day_offset(db, start), ProductSalesDaily.quantity)\
+        .where(ProductSalesDaily.day >= start, ProductSalesDaily.day <= end)\
+        .order_by(ProductSalesDaily.product_id)\
+        .execution_options(yield_per=ROW_CHUNK)
+    for partition in db.connection().execute(statement).partitions():
+        pids, offsets, units = zip(*partition)
+        yield (np.asarray(pids, dtype=np.int64), np.asarray(offsets, dtype=np.int64),
+               np.asarray(units, dtype=np.float32))
+
+def demand_blocks(product_ids: np.ndarray, sales: Iterable[Tuple[np.ndarray, np.ndarray, np.ndarray]],
+                  days: int, block: int = BLOCK_PRODUCTS) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Yields (ids, matrix) for consecutive blocks of the sorted `product_ids`, where matrix[i, d]
+    is the units of ids[i] sold on day d of the range. `sales` chunks must be in product order.
+    """
+    sales = iter(sales)
+    pids, cols, units = np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.float32)
+    exhausted = False
+    for lo in range(0, len(product_ids), block):
+        ids = product_ids[lo:lo + block]
+        # Pull chunks until one reaches past this block (or the rows run out)
+        while not exhausted and (not len(pids) or pids[-1] <= ids[-1]):
+            chunk = next(sales, None)
+            if chunk is None:
+                exhausted = True
+                break
+            pids = np.concatenate([pids, chunk[0]])
+            cols = np.concatenate([cols, chunk[1]])
+            units = np.concatenate([units, chunk[2]])
+        split = np.searchsorted(pids, ids[-1], side="right")
+        block_pids, block_cols, block_units = pids[:split], cols[:split], units[:split]
+        pids, cols, units = pids[split:], cols[split:], units[split:]
+
+        matrix = np.zeros((len(ids), days), dtype=np.float32)
+        if len(block_pids):
+            index = np.minimum(np.searchsorted(ids, block_pids), len(ids) - 1)
+            # Sales of since-deleted products are skipped
+            known = (ids[index] == block_pids) & (block_cols >= 0) & (block_cols < days)
+            matrix[index[known], block_cols[known]] = block_units[known]
+        yield ids, matrix
+
+
+# --- MODEL ---
+
+def fit(matrix: np.ndarray, level: Optional[np.ndarray] = None, trend: Optional[np.ndarray] = None):
+    """Damped Holt over the columns of `matrix`, for every row at once. Returns (level, trend)."""
+    if level is None:
+        level = matrix[:, :INIT_DAYS].mean(axis=1, dtype=np.float64)
+        trend = np.zeros(len(matrix))
+    for t in range(matrix.shape[1]):
+        previous = level
+        level = ALPHA * matrix[:, t] + (1 - ALPHA) * (previous + PHI * trend)
+        trend = BETA * (level - previous) + (1 - BETA) * PHI * trend
+    return level, trend
+
+def weekday_profile(window: np.ndarray, first_day: date) -> np.ndarray:
+    """(n, 7) multiplicative factors, Monday first, averaging 1 per row."""
+    weeks = window.shape[1] // 7
+    by_column = window[:, -weeks * 7:].reshape(len(window), weeks, 7).sum(axis=1, dtype=np.float64)
+    factors = 7 * (by_column + PROFILE_PRIOR) / (by_column.sum(axis=1, keepdims=True) + 7 * PROFILE_PRIOR)
+    # Column j is weekday (first_day of that slice + j); roll so column w is weekday w
+    offset = (first_day + timedelta(days=window.shape[1] - weeks * 7)).weekday()
+    return np.roll(factors, offset, axis=1)
+
+def project(level: np.ndarray, trend: np.ndarray, profile: np.ndarray, first_day: date, horizon: int) -> np.ndarray:
+    """Forecast units per product over `horizon` days starting `first_day`."""
+    damping = np.cumsum(PHI ** np.arange(1, horizon + 1))
+    base = np.maximum(level[:, None] + trend[:, None] * damping[None, :], 0)
+    weekdays = [(first_day + timedelta(days=d)).weekday() for d in range(horizon)]
+    return (base * profile[:, weekdays]).sum(axis=1)
+
+
+# --- REFRESH ---
+
+def _stored_state(db: Session, product_ids: np.ndarray):
+    """Stored (level, trend, has_state) aligned with product_ids."""
+    level, trend = np.zeros(len(product_ids)), np.zeros(len(product_ids))
+    has_state = np.zeros(len(product_ids), dtype=bool)
+    rows = db.query(ProductForecast.product_id, ProductForecast.level, ProductForecast.trend).all()
+    if rows:
+        pids, levels, trends = (np.asarray(column) for column in zip(*rows))
+        index = np.searchsorted(product_ids, pids)
+        known = (index < len(product_ids)) & (product_ids[np.minimum(index, len(product_ids) - 1)] == pids)
+        level[index[known]], trend[index[known]], has_state[index[known]] = levels[known], trends[known], True
+    return level, trend, has_state
+
+def refresh(db: Session, today: Optional[date] = None, full: bool = False,
+            progress: Optional[Callable[[int, int], None]] = None) -> dict:
+    """
+    Brings `product_forecasts` up to the last completed day. Incremental when the stored
+    forecasts are at most PROFILE_DAYS behind, full otherwise (or when asked). The caller commits.
+    `progress(products_done, products)` is called after each block.
+    """
+    started = time.perf_counter()
+    today = today or datetime.utcnow().date()
+    last_day = today - timedelta(days=1)
+    as_of = db.query(func.max(ProductForecast.as_of)).scalar()
+    if not full and as_of is not None and as_of >= last_day:
+        return {"as_of": as_of, "mode": "current", "products": 0, "seconds": 0.0}
+
+    incremental = not full and as_of is not None and (last_day - as_of).days <= PROFILE_DAYS
+    days = PROFILE_DAYS if incremental else FIT_DAYS
+    start = last_day - timedelta(days=days - 1)
+    new_days = (last_day - as_of).days if incremental else days
+
+    # 1. One pass over the sales rollup, in dense blocks of products
+    product_ids = np.asarray(db.execute(select(Product.id).order_by(Product.id)).scalars().all(), dtype=np.int64)
+    if incremental:
+        stored_level, stored_trend, has_state = _stored_state(db, product_ids)
+
+    records = []
+    for lo, (ids, matrix) in zip(range(0, len(product_ids), BLOCK_PRODUCTS),
+                                 demand_blocks(product_ids, _sales(db, start, last_day), days)):
+        # 2. Level / trend: advance the stored state over the new days; fit products without one
+        if incremental:
+            level, trend = fit(matrix[:, -new_days:], stored_level[lo:lo + len(ids)], stored_trend[lo:lo + len(ids)])
+            fresh = ~has_state[lo:lo + len(ids)]
+            if fresh.any():
+                level[fresh], trend[fresh] = fit(matrix[fresh])
+        else:
+            level, trend = fit(matrix)
+
+        # 3. Weekday shape, horizon forecast, moving averages
+        window = matrix[:, -PROFILE_DAYS:]
+        profile = weekday_profile(window, last_day - timedelta(days=PROFILE_DAYS - 1))
+        horizon_units = project(level, trend, profile, today, HORIZON_DAYS)
+        ma_7 = window[:, -7:].mean(axis=1)
+        ma_28 = window[:, -28:].mean(axis=1)
+
+        # Products that never sold in the window carry no state worth storing
+        active = (level > 1e-6) | (np.abs(trend) > 1e-6) | (ma_28 > 0)
+        for i in np.flatnonzero(active):
+            records.append({
+                "product_id": int(ids[i]), "as_of": last_day,
+                "level": float(level[i]), "trend": float(trend[i]),
+                "ma_7": float(ma_7[i]), "ma_28": float(ma_28[i]),
+                "daily_rate": float(horizon_units[i]) / HORIZON_DAYS, "horizon_units": float(horizon_units[i])
+            })
+        if progress:
+            progress(lo + len(ids), len(product_ids))
+
+    # 4. Replace the stored forecasts (readers see the old set until the caller commits)
+    db.execute(delete(ProductForecast))
+    if records:
+        db.execute(insert(ProductForecast.__table__), records)
+    return {
+        "as_of": last_day,
+        "mode": "incremental" if incremental else "full",
+        "products": len(records),
+        "seconds": round(time.perf_counter() - started, 3)
+    }
+
+def run_refresh(full: bool = False, progress: Optional[Callable[[int, int], None]] = None) -> dict:
+    """Scheduler / CLI entry point: own session, own commit."""
+    db = SessionLocal()
+    try:
+        result = refresh(db, full=full, progress=progress)
+        db.commit()
+        return result
+    finally:
+        db.close()
+
+
+# --- READ ---
+
+def forecasts(db: Session, product_id: Optional[int] = None, limit: int = 100) -> List[dict]:
+    """Fastest movers first, with days of cover against current sellable stock."""
+    sellable = func.coalesce(ProductStockRollup.on_hand - ProductStockRollup.quarantined, 0)
+    query = db.query(ProductForecast, Product.sku_code, Product.name, sellable)\
+        .join(Product, Product.id == ProductForecast.product_id)\
+        .outerjoin(ProductStockRollup, ProductStockRollup.product_id == ProductForecast.product_id)
+    if product_id is not None:
+        query = query.filter(ProductForecast.product_id == product_id)
+    rows = query.order_by(ProductForecast.daily_rate.desc(), ProductForecast.product_id).limit(limit).all()
+    return [
+        {
+            "product_id": forecast.product_id,
+            "sku": sku,
+            "name": name,
+            "as_of": forecast.as_of,
+            "daily_rate": round(forecast.daily_rate, 3),
+            "horizon_days": HORIZON_DAYS,
+            "horizon_units": round(forecast.horizon_units, 1),
+            "trend": round(forecast.trend, 4),
+            "ma_7": round(forecast.ma_7, 3),
+            "ma_28": round(forecast.ma_28, 3),
+            "sellable_units": int(stock),
+            "days_of_cover": round(stock / forecast.daily_rate, 1) if forecast.daily_rate > 0 else None
+        }
+        for forecast, sku, name, stock in rows
+    ]
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "refresh"
+    if command != "refresh":
+        sys.exit("usage: python -m app.domains.analytics.forecast refresh [--full]")
+    print(run_refresh(full="--full" in sys.argv))
@@ -0,0 +1,38 @@
+from sqlalchemy import Column, Integer, Float, Date, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+# --- ROLLUPS ---
+# Maintained in the same transaction as the stock/sales writes so analytics
+# reads O(products) rows instead of rescanning stocks and order lines.
+
+class ProductStockRollup(Base):
+    __tablename__ = "product_stock_rollups"
+
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    on_hand = Column(Integer, default=0, nullable=False)      # All physical stock (incl. quarantined)
+    quarantined = Column(Integer, default=0, nullable=False)  # Portion of on_hand that is locked
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class ProductSalesDaily(Base):
+    __tablename__ = "product_sales_daily"
+
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    quantity = Column(Integer, default=0, nullable=False)
+
+# --- DEMAND FORECASTS ---
+# Written by analytics/forecast.py (full fit, then incremental per completed day);
+# insights read the daily rate from here instead of a flat average over the window.
+
+class ProductForecast(Base):
+    __tablename__ = "product_forecasts"
+
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    as_of = Column(Date, nullable=False)                    # Last completed (UTC) day fitted
+    level = Column(Float, nullable=False, default=0.0)      # Smoothed units/day
+    trend = Column(Float, nullable=False, default=0.0)      # Units/day per day (damped)
+    ma_7 = Column(Float, nullable=False, default=0.0)
+    ma_28 = Column(Float, nullable=False, default=0.0)
+    daily_rate = Column(Float, nullable=False, default=0.0) # Mean forecast over the horizon, weekday-adjusted
+    horizon_units = Column(Float, nullable=False, default=0.0)
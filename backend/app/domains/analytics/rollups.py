@@ -0,0 +1,138 @@
+"""
+Per-product stock and sales rollups.
+
+Write paths call the `record_*` helpers inside their own transaction (no commit here),
+so the rollups move together with the base rows they summarise. Stock changes arrive
+through the movement ledger (inventory/ledger.py).
+
+Rebuild / verify from the base tables:
+    python -m app.domains.analytics.rollups verify
+    python -m app.domains.analytics.rollups rebuild
+"""
+import sys
+from datetime import datetime, date
+from sqlalchemy.orm import Session
+from sqlalchemy import func, case, Date
+from app.core.database import dialect_insert
+from app.domains.analytics.models import ProductStockRollup, ProductSalesDaily
+from app.domains.inventory import models as inv_models
+from app.domains.sales import models as sales_models
+
+
+def _bump(db: Session, model, keys: dict, deltas: dict):
+    # One atomic "INSERT ... ON CONFLICT DO UPDATE SET col = col + delta": concurrent
+    # writers neither lose updates nor race each other on the first insert of a key
+    table = model.__table__
+    stmt = dialect_insert(db)(table).values(**keys, **deltas)
+    set_ = {col: table.c[col] + stmt.excluded[col] for col in deltas}
+    if "updated_at" in table.c:
+        set_["updated_at"] = func.now()
+    db.execute(stmt.on_conflict_do_update(index_elements=list(keys), set_=set_))
+
+
+# --- WRITE HOOKS ---
+
+def record_stock_change(db: Session, product_id: int, quantity_delta: int, quarantined_delta: int = 0):
+    if not quantity_delta and not quarantined_delta:
+        return
+    _bump(db, ProductStockRollup, {"product_id": product_id},
+          {"on_hand": quantity_delta, "quarantined": quarantined_delta})
+
+def record_quarantine(db: Session, product_id: int, quantity: int):
+    record_stock_change(db, product_id, 0, quarantined_delta=quantity)
+
+def record_sale(db: Session, product_id: int, quantity: int, day: date = None):
+    # SalesOrder.created_at defaults to the DB clock (UTC), so bucket on UTC days
+    day = day or datetime.utcnow().date()
+    _bump(db, ProductSalesDaily, {"product_id": product_id, "day": day}, {"quantity": quantity})
+
+
+# --- REBUILD / VERIFY ---
+
+def _expected_stock(db: Session):
+    rows = db.query(
+        inv_models.Batch.product_id,
+        func.sum(inv_models.Stock.quantity),
+        func.sum(case((inv_models.Stock.is_quarantined == True, inv_models.Stock.quantity), else_=0))
+    ).join(inv_models.Stock, inv_models.Stock.batch_id == inv_models.Batch.id)\
+     .group_by(inv_models.Batch.product_id).all()
+    return {pid: (int(on_hand or 0), int(quarantined or 0)) for pid, on_hand, quarantined in rows}
+
+def _expected_sales(db: Session):
+    day = func.date(sales_models.SalesOrder.created_at, type_=Date)
+    rows = db.query(
+        sales_models.SalesOrderItem.product_id,
+        day,
+        func.sum(sales_models.SalesOrderItem.quantity)
+    ).join(sales_models.SalesOrder, sales_models.SalesOrderItem.order_id == sales_models.SalesOrder.id)\
+     .group_by(sales_models.SalesOrderItem.product_id, day).all()
+    return {(pid, d): int(qty or 0) for pid, d, qty in rows}
+
+def verify_rollups(db: Session):
+    """Returns a list of drift records; empty means the rollups match the base tables."""
+    drift = []
+
+    expected = _expected_stock(db)
+    actual = {r.product_id: (r.on_hand, r.quarantined) for r in db.query(ProductStockRollup).all()}
+    for pid in sorted(set(expected) | set(actual)):
+        exp, act = expected.get(pid, (0, 0)), actual.get(pid, (0, 0))
+        if exp != act:
+            drift.append({
+                "table": ProductStockRollup.__tablename__,
+                "product_id": pid,
+                "expected": {"on_hand": exp[0], "quarantined": exp[1]},
+                "actual": {"on_hand": act[0], "quarantined": act[1]}
+            })
+
+    expected = _expected_sales(db)
+    actual = {(r.product_id, r.day): r.quantity for r in db.query(ProductSalesDaily).all()}
+    for key in sorted(set(expected) | set(actual)):
+        exp, act = expected.get(key, 0), actual.get(key, 0)
+        if exp != act:
+            drift.append({
+                "table": ProductSalesDaily.__tablename__,
+                "product_id": key[0],
+                "day": key[1].isoformat(),
+                "expected": {"quantity": exp},
+                "actual": {"quantity": act}
+            })
+
+    return drift
+
+def rebuild_rollups(db: Session):
+    """Recomputes both rollup tables from scratch. Returns the drift that was fixed."""
+    drift = verify_rollups(db)
+
+    db.query(ProductStockRollup).delete(synchronize_session=False)
+    db.query(ProductSalesDaily).delete(synchronize_session=False)
+    db.bulk_insert_mappings(ProductStockRollup, [
+        {"product_id": pid, "on_hand": on_hand, "quarantined": quarantined}
+        for pid, (on_hand, quarantined) in _expected_stock(db).items()
+    ])
+    db.bulk_insert_mappings(ProductSalesDaily, [
+        {"product_id": pid, "day": day, "quantity": qty}
+        for (pid, day), qty in _expected_sales(db).items()
+    ])
+    db.commit()
+    return drift
+
+
+if __name__ == "__main__":
+    from app.core.database import SessionLocal
+    from app.domains.master import models as master_models  # registers "products" for the FKs
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "verify"
+    if command not in ("verify", "rebuild"):
+        sys.exit("usage: python -m app.domains.analytics.rollups [verify|rebuild]")
+
+    session = SessionLocal()
+    try:
+        drift = rebuild_rollups(session) if command == "rebuild" else verify_rollups(session)
+    finally:
+        session.close()
+
+    for record in drift:
+        print(record)
+    print(f"{command}: {len(drift)} drifted row(s)")
+    if command == "verify" and drift:
+        sys.exit(1)
@@ -1,69 +1,46 @@
-from fastapi import APIRouter, Depends
+from typing import Optional
+from fastapi import APIRouter, Depends, Query, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.core.database import get_db
-from app.domains.inventory import models as inv_models
-from app.domains.sales import models as sales_models
-from app.domains.master.models import Product
+from app.core.database import get_db, get_read_db
+from app.core.encoding import FastJSONResponse
+from app.core.metrics import ProfiledRoute
+from app.domains.analytics import engine, forecast
+from app.domains.jobs import runner as jobs
 
 router = APIRouter(
     prefix="/analytics",
-    tags=["AI & Analytics"]
+    tags=["AI & Analytics"],
+    route_class=ProfiledRoute
 )
 
 @router.get("/insights/")
-def get_insights(db: Session = Depends(get_db)):
-    insights = []
-
-    # 1. Fetch all Products
-    products = db.query(Product).all()
-
-    for p in products:
-        # A. Calculate Total Current Stock
-        total_stock = db.query(func.sum(inv_models.Stock.quantity))\
-            .join(inv_models.Batch)\
-            .filter(inv_models.Batch.product_id == p.id)\
-            .scalar() or 0
-        
-        # B. Calculate Total Sales (Lifetime)
-        # In a real app, we would limit this to "Last 30 Days"
-        total_sold = db.query(func.sum(sales_models.SalesOrderItem.quantity))\
-            .filter(sales_models.SalesOrderItem.product_id == p.id)\
-            .scalar() or 0
-
-        # C. Predict Burn Rate
-        # Simplification: We assume 'total_sold' happened over a set period (e.g., 30 days) 
-        # to calculate a daily velocity.
-        estimated_daily_demand = total_sold / 30 if total_sold > 0 else 0
-        
-        # D. Generate Insights
-        
-        # Insight 1: Low Stock / Stockout Risk
-        if estimated_daily_demand > 0:
-            days_left = total_stock / estimated_daily_demand
-            if days_left < 7:
-                insights.append({
-                    "type": "CRITICAL",
-                    "title": "Stockout Risk",
-                    "message": f"{p.name} will run out in {int(days_left)} days.",
-                    "metric": f"{total_stock} Units left"
-                })
-        elif total_stock < 50: 
-            # Fallback if no sales history but low absolute number
-            insights.append({
-                "type": "WARNING",
-                "title": "Low Inventory",
-                "message": f"{p.name} is below safety stock levels.",
-                "metric": f"{total_stock} Units"
+def get_insights(
+    window_days: int = Query(30, ge=1, le=365, description="Dead-stock window; burn rate for products without a forecast yet"),
+    stored: bool = Query(False, description="Latest precomputed result (insights job) instead of computing now"),
+    db: Session = Depends(get_read_db)
+):
+    if stored:
+        job = jobs.latest_result(db, "insights", {"window_days": window_days})
+        if job is not None:
+            # Stored JSON goes out as is
+            return Response(content=b"".join(jobs.result_chunks(job.id)), media_type=job.content_type, headers={
+                "X-Job-Id": str(job.id), "X-Computed-At": job.finished_at.isoformat()
             })
+    # Whole catalog in one grouped statement; rules are applied per chunk of rows
+    return FastJSONResponse(engine.compute_insights(db, window_days=window_days))
 
-        # Insight 2: Dead Stock (High Stock, Zero Sales)
-        if total_stock > 500 and total_sold == 0:
-            insights.append({
-                "type": "INFO",
-                "title": "Dead Stock",
-                "message": f"{p.name} is not moving. Consider a discount.",
-                "metric": "Overstocked"
-            })
+@router.get("/forecast/")
+def get_forecasts(
+    product_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=5000),
+    db: Session = Depends(get_read_db)
+):
+    # Stored forecasts, fastest movers first, with days of cover against current stock
+    return forecast.forecasts(db, product_id=product_id, limit=limit)
 
-    return insights
\ No newline at end of file
+@router.post("/forecast/refresh")
+def refresh_forecasts(full: bool = False, db: Session = Depends(get_db)):
+    # Also runs on a timer (PHARMA_FORECAST_REFRESH_SECONDS); incremental unless full=true
+    result = forecast.refresh(db, full=full)
+    db.commit()
+    return result
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from app.core.database import Base
+
+class BatchSaleIndex(Base):
+    """
+    Denormalised batch -> order/customer index for recalls.
+    One row per allocation slice, written in the same transaction as the allocation,
+    so a forward trace is a single range scan on batch_id (no joins over order lines).
+    """
+    __tablename__ = "batch_sales_index"
+    __table_args__ = (
+        Index("ix_batch_sales_index_batch_date", "batch_id", "order_date"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    batch_id = Column(Integer, ForeignKey("batches.id"), nullable=False)
+    product_id = Column(Integer, nullable=False)
+    order_id = Column(Integer, ForeignKey("sales_orders.id"), nullable=False)
+    order_item_id = Column(Integer, ForeignKey("sales_order_items.id"), nullable=False)
+    customer_name = Column(String)
+    order_date = Column(DateTime(timezone=True))
+    quantity = Column(Integer, nullable=False)
@@ -1,60 +1,34 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.domains.inventory import models as inv_models
-from app.domains.sales import models as sales_models
-from app.domains.master.models import Product
+from typing import Optional
+from app.core.database import get_read_db
+from app.core.encoding import FastJSONResponse
+from app.core.metrics import ProfiledRoute
+from app.domains.compliance import trace, schemas
 
 router = APIRouter(
     prefix="/compliance",
-    tags=["Compliance & Traceability"]
+    tags=["Compliance & Traceability"],
+    route_class=ProfiledRoute
 )
 
 @router.get("/trace/{batch_number}")
-def trace_batch(batch_number: str, db: Session = Depends(get_db)):
-    # 1. Find the Batch ID and Basic Info
-    batch = db.query(inv_models.Batch).filter(inv_models.Batch.batch_number == batch_number).first()
-    if not batch:
+def trace_batch(batch_number: str, product_id: Optional[int] = None, db: Session = Depends(get_read_db)):
+    # 1. Resolve (product, batch_number) to one Batch
+    ref = (product_id, batch_number)
+    found, not_found, ambiguous = trace.resolve_batches(db, [ref])
+    if not_found:
         raise HTTPException(status_code=404, detail="Batch not found")
-        
-    product = db.query(Product).filter(Product.id == batch.product_id).first()
-
-    # 2. Find Current Location (Where is it NOW?)
-    current_stock = db.query(inv_models.Stock, inv_models.Bin)\
-        .join(inv_models.Bin, inv_models.Stock.bin_id == inv_models.Bin.id)\
-        .filter(inv_models.Stock.batch_id == batch.id).all()
-    
-    locations = []
-    for stock, bin_loc in current_stock:
-        if stock.quantity > 0:
-            locations.append({
-                "bin": bin_loc.bin_code,
-                "qty": stock.quantity,
-                "status": "In Stock"
-            })
-
-    # 3. Find Sales History (Who bought it?)
-    # Note: We query SalesOrderItem where allocated_batch_id matches
-    sales = db.query(sales_models.SalesOrderItem, sales_models.SalesOrder)\
-        .join(sales_models.SalesOrder, sales_models.SalesOrderItem.order_id == sales_models.SalesOrder.id)\
-        .filter(sales_models.SalesOrderItem.allocated_batch_id == batch.id).all()
-        
-    sales_history = []
-    for item, order in sales:
-        sales_history.append({
-            "order_id": order.id,
-            "customer": order.customer_name,
-            "date": order.created_at,
-            "qty_sold": item.quantity
+    if ambiguous:
+        raise HTTPException(status_code=409, detail={
+            "message": "Batch number exists for several products; pass product_id",
+            "candidates": ambiguous[ref]
         })
 
-    return {
-        "batch_info": {
-            "batch_number": batch.batch_number,
-            "product": product.name,
-            "expiry": batch.expiry_date,
-            "mfg": batch.mfg_date
-        },
-        "current_locations": locations,
-        "sales_trail": sales_history
-    }
\ No newline at end of file
+    # 2. Forward trace: locations, orders, customers (plain dicts: straight to JSON)
+    return FastJSONResponse(trace.trace(db, [found[ref]])[found[ref]])
+
+@router.post("/trace/")
+def trace_batches(request: schemas.TraceRequest, db: Session = Depends(get_read_db)):
+    # Recall mode: many batches, a handful of queries in total (bigger recalls: the recall_trace job)
+    return FastJSONResponse(trace.recall(db, [(b.product_id, b.batch_number) for b in request.batches]))
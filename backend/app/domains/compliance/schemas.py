@@ -0,0 +1,10 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+# --- Recall Tracing ---
+class BatchRef(BaseModel):
+    batch_number: str
+    product_id: Optional[int] = None # Needed when the number exists for several products
+
+class TraceRequest(BaseModel):
+    batches: List[BatchRef] = Field(max_length=1000)
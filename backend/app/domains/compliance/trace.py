@@ -0,0 +1,127 @@
+from typing import List, Optional, Tuple
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.domains.compliance.models import BatchSaleIndex
+from app.domains.inventory import models as inv_models
+from app.domains.master.cache import cache as master_cache
+
+
+# --- INDEX MAINTENANCE ---
+
+def record_sales(db: Session, rows: List[dict]):
+    """
+    Called by the allocation paths (same transaction). Each row:
+    batch_id, product_id, order_id, order_item_id, customer_name, order_date, quantity.
+    """
+    if rows:
+        db.execute(insert(BatchSaleIndex), rows)
+
+
+# --- RESOLUTION ---
+
+def resolve_batches(db: Session, refs: List[Tuple[Optional[int], str]]):
+    """
+    Maps (product_id or None, batch_number) references to batch ids with ONE query.
+    Batch numbers are only unique per product, so a bare number matching several
+    products is reported as ambiguous instead of picking one.
+    Returns (found {ref: batch_id}, not_found [ref], ambiguous {ref: [candidates]}).
+    """
+    numbers = {number for _, number in refs}
+    rows = db.query(inv_models.Batch.id, inv_models.Batch.product_id, inv_models.Batch.batch_number)\
+        .filter(inv_models.Batch.batch_number.in_(numbers)).all()
+    products = master_cache.products(db, {product_id for _, product_id, _ in rows})
+
+    by_number = {}
+    for batch_id, product_id, number in rows:
+        if product_id in products:
+            by_number.setdefault(number, []).append({
+                "batch_id": batch_id, "product_id": product_id, "product": products[product_id].name
+            })
+
+    found, not_found, ambiguous = {}, [], {}
+    for ref in refs:
+        product_id, number = ref
+        candidates = by_number.get(number, [])
+        if product_id is not None:
+            candidates = [c for c in candidates if c["product_id"] == product_id]
+        if not candidates:
+            not_found.append(ref)
+        elif len(candidates) > 1:
+            ambiguous[ref] = candidates
+        else:
+            found[ref] = candidates[0]["batch_id"]
+    return found, not_found, ambiguous
+
+
+# --- FORWARD TRACE ---
+
+def trace(db: Session, batch_ids: List[int]) -> dict:
+    """Full forward trace (bins, orders, customers, quantities) for many batches in three queries (product names from the master cache)."""
+    batch_ids = list(set(batch_ids))
+    traces = {}
+
+    # 1. Batch + product info
+    batches = db.query(inv_models.Batch).filter(inv_models.Batch.id.in_(batch_ids)).all()
+    products = master_cache.products(db, {batch.product_id for batch in batches})
+    for batch in batches:
+        if batch.product_id not in products:
+            continue
+        traces[batch.id] = {
+            "batch_info": {
+                "batch_number": batch.batch_number,
+                "product_id": batch.product_id,
+                "product": products[batch.product_id].name,
+                "expiry": batch.expiry_date,
+                "mfg": batch.mfg_date
+            },
+            "current_locations": [],
+            "sales_trail": [],
+            "customers": {}
+        }
+
+    # 2. Where is it NOW?
+    rows = db.query(inv_models.Stock.batch_id, inv_models.Bin.bin_code, inv_models.Stock.quantity, inv_models.Stock.is_quarantined)\
+        .join(inv_models.Bin, inv_models.Stock.bin_id == inv_models.Bin.id)\
+        .filter(inv_models.Stock.batch_id.in_(batch_ids))\
+        .filter(inv_models.Stock.quantity > 0).all()
+    for batch_id, bin_code, qty, quarantined in rows:
+        traces[batch_id]["current_locations"].append({
+            "bin": bin_code,
+            "qty": qty,
+            "status": "Quarantined" if quarantined else "In Stock"
+        })
+
+    # 3. Who bought it? (index range scan on batch_id)
+    rows = db.query(
+        BatchSaleIndex.batch_id, BatchSaleIndex.order_id, BatchSaleIndex.customer_name,
+        BatchSaleIndex.order_date, BatchSaleIndex.quantity
+    ).filter(BatchSaleIndex.batch_id.in_(batch_ids))\
+     .order_by(BatchSaleIndex.batch_id, BatchSaleIndex.order_date).all()
+    for batch_id, order_id, customer, order_date, qty in rows:
+        entry = traces[batch_id]
+        entry["sales_trail"].append({
+            "order_id": order_id,
+            "customer": customer,
+            "date": order_date,
+            "qty_sold": qty
+        })
+        entry["customers"][customer] = entry["customers"].get(customer, 0) + qty
+
+    for entry in traces.values():
+        entry["customers"] = [{"customer": name, "qty": qty} for name, qty in entry["customers"].items()]
+        entry["total_sold"] = sum(sale["qty_sold"] for sale in entry["sales_trail"])
+    return traces
+
+
+def recall(db: Session, refs: List[Tuple[Optional[int], str]]) -> dict:
+    """Recall mode (route and background job): traces for every resolvable reference, plus the misses."""
+    found, not_found, ambiguous = resolve_batches(db, refs)
+    traces = trace(db, list(found.values())) if found else {}
+    return {
+        "results": [traces[batch_id] for batch_id in dict.fromkeys(found.values())],
+        "not_found": [{"product_id": p, "batch_number": n} for p, n in not_found],
+        "ambiguous": [
+            {"product_id": p, "batch_number": n, "candidates": candidates}
+            for (p, n), candidates in ambiguous.items()
+        ]
+    }
@@ -0,0 +1,249 @@
+"""
+Expiry engine: the precomputed expiry calendar, near-expiry reports and the expired-stock sweep.
+
+Stock write paths post to the ledger, which calls `record_changes` inside their own transaction
+(no commit here), so the calendar moves together with the stock rows. Reports only read the calendar: a handful of
+rows per (warehouse, expiry date, product) instead of a join over every stock line.
+
+The sweep quarantines stock whose batch has expired in one UPDATE; it runs on a timer from
+app startup (PHARMA_EXPIRY_SWEEP_SECONDS) and from the CLI:
+    python -m app.domains.inventory.expiry sweep
+    python -m app.domains.inventory.expiry verify
+    python -m app.domains.inventory.expiry rebuild
+"""
+import sys
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import func, case, select, update, delete, insert
+from sqlalchemy.orm import Session
+from app.core import events
+from app.core.database import SessionLocal, dialect_insert
+from app.domains.inventory import models
+from app.domains.master.cache import cache as master_cache
+
+DEFAULT_THRESHOLDS = (30, 90, 180)  # days
+EXPIRED_REASON = "Expired"
+
+CalendarKey = Tuple[int, date, int]  # (warehouse_id, expiry_date, product_id)
+
+
+# --- WRITE HOOK ---
+
+def record_changes(db: Session, changes: Dict[CalendarKey, Tuple[int, int]]):
+    """Applies {key: (on_hand_delta, quarantined_delta)} with one executemany upsert."""
+    rows = [
+        {"warehouse_id": wh, "expiry_date": expiry, "product_id": pid, "on_hand": on_hand, "quarantined": quarantined}
+        for (wh, expiry, pid), (on_hand, quarantined) in changes.items()
+        if on_hand or quarantined
+    ]
+    if not rows:
+        return
+    table = models.StockExpiryCalendar.__table__
+    stmt = dialect_insert(db)(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["warehouse_id", "expiry_date", "product_id"],
+        set_={
+            "on_hand": table.c.on_hand + stmt.excluded.on_hand,
+            "quarantined": table.c.quarantined + stmt.excluded.quarantined
+        }
+    )
+    db.execute(stmt, rows)
+
+def add_change(changes: Dict[CalendarKey, Tuple[int, int]], key: CalendarKey, on_hand: int, quarantined: int = 0):
+    current = changes.get(key, (0, 0))
+    changes[key] = (current[0] + on_hand, current[1] + quarantined)
+
+
+# --- SWEEP ---
+
+def sweep(db: Session, today: Optional[date] = None) -> dict:
+    """
+    Quarantines every sellable stock row whose batch expired before `today` in ONE
+    set-based UPDATE (RETURNING the rows for the ledger and live feed). The caller commits.
+    """
+    today = today or date.today()
+    stocks = models.Stock.__table__
+    expired_batches = select(models.Batch.id).where(models.Batch.expiry_date < today)
+    rows = db.execute(
+        update(stocks)
+        .where(stocks.c.batch_id.in_(expired_batches))
+        .where(stocks.c.quantity > 0)
+        .where(stocks.c.is_quarantined == False)
+        .values(is_quarantined=True, quarantine_reason=EXPIRED_REASON)
+        .returning(stocks.c.id, stocks.c.batch_id, stocks.c.bin_id, stocks.c.quantity)
+    ).all()
+    if not rows:
+        return {"as_of": today, "quarantined_rows": 0, "quarantined_units": 0}
+
+    batches = {
+        row.id: row for row in db.query(models.Batch.id, models.Batch.product_id, models.Batch.expiry_date)
+        .filter(models.Batch.id.in_({row.batch_id for row in rows})).all()
+    }
+    warehouses = dict(
+        db.query(models.Bin.id, models.Bin.warehouse_id).filter(models.Bin.id.in_({row.bin_id for row in rows})).all()
+    )
+
+    # The ledger posts back into this module's calendar
+    from app.domains.inventory import ledger
+    ledger.post(db, (
+        ledger.Movement(
+            models.MovementType.QUARANTINE, row.id, batches[row.batch_id].product_id, warehouses[row.bin_id],
+            batches[row.batch_id].expiry_date, quarantined_delta=row.quantity, reference=EXPIRED_REASON
+        )
+        for row in rows
+    ))
+    events.stage(db, *(
+        {"type": "stock.quarantined", "warehouse_id": warehouses[row.bin_id], "stock_id": row.id, "reason": EXPIRED_REASON}
+        for row in rows
+    ))
+    return {"as_of": today, "quarantined_rows": len(rows), "quarantined_units": sum(row.quantity for row in rows)}
+
+def run_sweep(progress: Optional[Callable[[dict], None]] = None) -> dict:
+    """
+    Scheduler / CLI entry point: own session, own commit. `progress(result)` runs before the
+    commit; raising from it (a cancelled job) rolls the sweep back.
+    """
+    db = SessionLocal()
+    try:
+        result = sweep(db)
+        if progress:
+            progress(result)
+        db.commit()
+        return result
+    finally:
+        db.close()
+
+
+# --- REPORTS (calendar only) ---
+
+def _calendar_query(db: Session, columns, warehouse_id: Optional[int], start: Optional[date], end: Optional[date]):
+    query = db.query(*columns)
+    if warehouse_id is not None:
+        query = query.filter(models.StockExpiryCalendar.warehouse_id == warehouse_id)
+    if start is not None:
+        query = query.filter(models.StockExpiryCalendar.expiry_date >= start)
+    if end is not None:
+        query = query.filter(models.StockExpiryCalendar.expiry_date < end)
+    return query
+
+def summary(db: Session, warehouse_id: Optional[int] = None, thresholds: Sequence[int] = DEFAULT_THRESHOLDS) -> dict:
+    """Sellable and quarantined units already expired and expiring within each threshold (cumulative)."""
+    today = date.today()
+    thresholds = sorted(set(thresholds))
+    cal = models.StockExpiryCalendar
+    rows = _calendar_query(
+        db, (cal.expiry_date, func.sum(cal.on_hand - cal.quarantined), func.sum(cal.quarantined), func.count(func.distinct(cal.product_id))),
+        warehouse_id, None, today + timedelta(days=thresholds[-1] + 1) if thresholds else today
+    ).group_by(cal.expiry_date).all()
+
+    expired = {"sellable_units": 0, "quarantined_units": 0}
+    buckets = [{"within_days": days, "sellable_units": 0, "quarantined_units": 0} for days in thresholds]
+    for expiry, sellable, quarantined, _ in rows:
+        if expiry < today:
+            expired["sellable_units"] += int(sellable or 0)
+            expired["quarantined_units"] += int(quarantined or 0)
+            continue
+        for bucket in buckets:
+            if expiry <= today + timedelta(days=bucket["within_days"]):
+                bucket["sellable_units"] += int(sellable or 0)
+                bucket["quarantined_units"] += int(quarantined or 0)
+    return {"as_of": today, "warehouse_id": warehouse_id, "expired": expired, "expiring": buckets}
+
+def monthly(db: Session, warehouse_id: Optional[int] = None, months: int = 12) -> List[dict]:
+    """On-hand by expiry month, from the current month forward (plus anything already expired)."""
+    today = date.today()
+    first = today.replace(day=1)
+    end_year, end_month = divmod(first.month - 1 + months, 12)
+    end = date(first.year + end_year, end_month + 1, 1)
+    cal = models.StockExpiryCalendar
+    rows = _calendar_query(
+        db, (cal.expiry_date, func.sum(cal.on_hand), func.sum(cal.quarantined)), warehouse_id, None, end
+    ).group_by(cal.expiry_date).all()
+
+    buckets = {}
+    for expiry, on_hand, quarantined in rows:
+        month = "expired" if expiry < today else expiry.strftime("%Y-%m")
+        bucket = buckets.setdefault(month, {"month": month, "on_hand": 0, "quarantined": 0})
+        bucket["on_hand"] += int(on_hand or 0)
+        bucket["quarantined"] += int(quarantined or 0)
+    ordered = sorted((b for b in buckets.values() if b["month"] != "expired"), key=lambda b: b["month"])
+    return ([buckets["expired"]] if "expired" in buckets else []) + [b for b in ordered if b["on_hand"]]
+
+def expiring_products(db: Session, within_days: int, warehouse_id: Optional[int] = None, limit: int = 100) -> List[dict]:
+    """Products with sellable stock expiring within `within_days`, soonest first."""
+    today = date.today()
+    cal = models.StockExpiryCalendar
+    sellable = func.sum(cal.on_hand - cal.quarantined)
+    rows = _calendar_query(
+        db, (cal.product_id, func.min(cal.expiry_date), sellable), warehouse_id, today, today + timedelta(days=within_days + 1)
+    ).filter(cal.on_hand > cal.quarantined)\
+     .group_by(cal.product_id)\
+     .order_by(func.min(cal.expiry_date), cal.product_id)\
+     .limit(limit).all()
+
+    products = master_cache.products(db, {row[0] for row in rows})
+    return [
+        {
+            "product_id": product_id,
+            "sku": products[product_id].sku_code if product_id in products else None,
+            "name": products[product_id].name if product_id in products else None,
+            "earliest_expiry": earliest,
+            "days_left": (earliest - today).days,
+            "sellable_units": int(units or 0)
+        }
+        for product_id, earliest, units in rows
+    ]
+
+
+# --- REBUILD / VERIFY ---
+
+def _expected(db: Session):
+    return db.query(
+        models.Bin.warehouse_id,
+        models.Batch.expiry_date,
+        models.Batch.product_id,
+        func.sum(models.Stock.quantity),
+        func.sum(case((models.Stock.is_quarantined == True, models.Stock.quantity), else_=0))
+    ).join(models.Batch, models.Stock.batch_id == models.Batch.id)\
+     .join(models.Bin, models.Stock.bin_id == models.Bin.id)\
+     .group_by(models.Bin.warehouse_id, models.Batch.expiry_date, models.Batch.product_id)
+
+def verify_calendar(db: Session):
+    """Returns drift records; empty means the calendar matches the stock rows."""
+    expected = {(wh, expiry, pid): (int(q or 0), int(qq or 0)) for wh, expiry, pid, q, qq in _expected(db)}
+    cal = models.StockExpiryCalendar
+    actual = {
+        (r.warehouse_id, r.expiry_date, r.product_id): (r.on_hand, r.quarantined)
+        for r in db.query(cal).all()
+    }
+    return [
+        {"key": key, "expected": expected.get(key, (0, 0)), "actual": actual.get(key, (0, 0))}
+        for key in sorted(set(expected) | set(actual))
+        if expected.get(key, (0, 0)) != actual.get(key, (0, 0))
+    ]
+
+def rebuild_calendar(db: Session):
+    db.execute(delete(models.StockExpiryCalendar))
+    db.execute(insert(models.StockExpiryCalendar).from_select(
+        ["warehouse_id", "expiry_date", "product_id", "on_hand", "quarantined"], _expected(db).statement
+    ))
+    db.commit()
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "verify"
+    if command == "sweep":
+        print(run_sweep())
+    elif command in ("verify", "rebuild"):
+        session = SessionLocal()
+        try:
+            if command == "rebuild":
+                rebuild_calendar(session)
+            drift = verify_calendar(session)
+            for record in drift:
+                print(record)
+            print(f"{command}: {len(drift)} drifted row(s)")
+        finally:
+            session.close()
+    else:
+        sys.exit("usage: python -m app.domains.inventory.expiry [sweep|verify|rebuild]")
@@ -0,0 +1,132 @@
+"""
+Live stock exports, shared by GET /inventory/stock/live/export and the stock_export job.
+
+Rows come off the Core connection in partitions (a server-side cursor where the driver has
+one) and never become ORM objects. ndjson and csv are written as text. arrow (IPC stream)
+and parquet need pyarrow (optional): each partition becomes one record batch / row group,
+written to the output as it is built, so memory stays at one partition whatever the size.
+"""
+import csv
+import io
+from typing import Callable, Iterator, Optional
+from sqlalchemy.orm import Session
+from app.core.encoding import dumps
+from app.domains.inventory import queries
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional: only the columnar formats need it
+    pa = pq = None
+
+TEXT_CHUNK_ROWS = 2000
+BATCH_ROWS = 65536        # Rows per Arrow record batch / Parquet row group
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+COLUMNAR = ("arrow", "parquet")
+
+
+class Unavailable(Exception):
+    """The format needs an optional dependency that isn't installed."""
+
+
+def check_format(format: str):
+    if format not in MEDIA_TYPES:
+        raise ValueError(f"Unknown export format {format!r}")
+    if format in COLUMNAR and pa is None:
+        raise Unavailable(f"{format} export needs pyarrow (pip install pyarrow)")
+
+
+def _schema():
+    types = {
+        "stock_id": pa.int64(), "product_name": pa.string(), "sku": pa.string(),
+        "batch_number": pa.string(), "expiry_date": pa.date32(), "bin_code": pa.string(),
+        "is_cold_chain": pa.bool_(), "quantity": pa.int64(), "is_quarantined": pa.bool_()
+    }
+    return pa.schema([(name, types[name]) for name in queries.LIVE_STOCK_COLUMNS])
+
+
+class _Sink:
+    """Write-only file for pyarrow; drained after every batch so bytes go out as they are made."""
+
+    closed = False
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+def _partitions(db: Session, filters: queries.StockFilters, size: int):
+    statement = queries.live_stock_query(db, filters).statement
+    result = db.connection().execution_options(stream_results=True, yield_per=size).execute(statement)
+    return result.partitions(size)
+
+
+def live_stock(db: Session, filters: queries.StockFilters, format: str,
+               progress: Optional[Callable[[int, int], None]] = None) -> Iterator[bytes]:
+    """
+    The filtered live stock table in `format`, as byte chunks. `progress(last_stock_id, rows)`
+    is called after every chunk (rows are in stock id order).
+    """
+    check_format(format)
+    written = 0
+    if format in COLUMNAR:
+        schema, sink = _schema(), _Sink()
+        writer = pa.ipc.new_stream(sink, schema) if format == "arrow" else pq.ParquetWriter(sink, schema)
+        for rows in _partitions(db, filters, BATCH_ROWS):
+            columns = list(zip(*rows))
+            batch = pa.RecordBatch.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+            )
+            writer.write_batch(batch)
+            written += len(rows)
+            yield sink.drain()
+            if progress:
+                progress(rows[-1][0], written)
+        writer.close()
+        yield sink.drain()
+        return
+
+    if format == "csv":
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(queries.LIVE_STOCK_COLUMNS)
+        for rows in _partitions(db, filters, TEXT_CHUNK_ROWS):
+            writer.writerows(rows)
+            written += len(rows)
+            yield out.getvalue().encode()
+            out.seek(0)
+            out.truncate()
+            if progress:
+                progress(rows[-1][0], written)
+        yield out.getvalue().encode()
+    else:
+        for rows in _partitions(db, filters, TEXT_CHUNK_ROWS):
+            yield b"".join(dumps(dict(zip(queries.LIVE_STOCK_COLUMNS, row))) + b"\n" for row in rows)
+            written += len(rows)
+            if progress:
+                progress(rows[-1][0], written)
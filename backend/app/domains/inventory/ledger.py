@@ -0,0 +1,325 @@
+"""
+Stock movement ledger: an append-only journal of every change to a stock row, plus periodic
+snapshots so point-in-time queries read one snapshot and a bounded tail of movements.
+
+`post` is the single write hook for stock mutations (receipts, allocations, quarantines,
+adjustments). In the caller's transaction it journals the movements and moves the derived
+tables with them: per-product rollups and the expiry calendar. Live-feed events stay with
+the callers, whose payloads differ.
+
+Snapshots are built from the previous snapshot plus the movements since, never from the
+stocks table, so they can be taken while writes continue. Movements newer than
+SNAPSHOT_SETTLE_SECONDS are left for the next one: on Postgres a transaction may commit a
+lower id after a higher one.
+
+    python -m app.domains.inventory.ledger snapshot
+    python -m app.domains.inventory.ledger reconcile         # stocks vs last snapshot + tail
+    python -m app.domains.inventory.ledger reconcile --full  # stocks vs the whole journal
+"""
+import logging
+import sys
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Iterable, List, Optional
+from sqlalchemy import func, case, select, insert, update, union_all, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core import events
+from app.core.database import SessionLocal
+from app.domains.inventory import models, expiry, putaway
+from app.domains.inventory.models import MovementType
+from app.domains.master.cache import cache as master_cache
+from app.domains.analytics import rollups
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_SETTLE_SECONDS = 60
+
+
+class ConcurrentChange(Exception):
+    """The stock row changed between reading and writing it."""
+
+
+@dataclass
+class Movement:
+    movement_type: str
+    stock_id: int
+    product_id: int
+    warehouse_id: int
+    expiry_date: date
+    quantity_delta: int = 0
+    quarantined_delta: int = 0
+    reference: Optional[str] = None
+    bin_id: Optional[int] = None  # Keeps the putaway capacity index current
+
+
+def _utc(at: datetime) -> datetime:
+    return at if at.tzinfo is None else at.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+# --- WRITE HOOK ---
+
+def post(db: Session, movements: Iterable[Movement]):
+    """
+    Journals the movements, then applies them to the rollups, the expiry calendar and (on
+    commit) the putaway capacity index. The caller commits.
+    """
+    movements = [m for m in movements if m.quantity_delta or m.quarantined_delta]
+    if not movements:
+        return
+    now = datetime.utcnow()
+    db.execute(insert(models.StockMovement), [
+        {
+            "created_at": now,
+            "movement_type": m.movement_type,
+            "stock_id": m.stock_id,
+            "product_id": m.product_id,
+            "warehouse_id": m.warehouse_id,
+            "quantity_delta": m.quantity_delta,
+            "quarantined_delta": m.quarantined_delta,
+            "reference": m.reference
+        }
+        for m in movements
+    ])
+
+    per_product, calendar, per_bin = {}, {}, {}
+    for m in movements:
+        on_hand, quarantined = per_product.get(m.product_id, (0, 0))
+        per_product[m.product_id] = (on_hand + m.quantity_delta, quarantined + m.quarantined_delta)
+        expiry.add_change(calendar, (m.warehouse_id, m.expiry_date, m.product_id), m.quantity_delta, m.quarantined_delta)
+        if m.bin_id is not None and m.quantity_delta:
+            per_bin[m.bin_id] = per_bin.get(m.bin_id, 0) + m.quantity_delta
+    for product_id, (on_hand, quarantined) in per_product.items():
+        rollups.record_stock_change(db, product_id, on_hand, quarantined_delta=quarantined)
+    expiry.record_changes(db, calendar)
+    putaway.record_changes(db, per_bin)
+
+
+# --- ADJUSTMENTS ---
+
+def adjust(db: Session, stock_id: int, counted_quantity: int, reason: str) -> Optional[dict]:
+    """
+    Cycle count: sets a stock row to the counted quantity and journals the difference.
+    Returns None for an unknown row; raises ConcurrentChange if it moved meanwhile. The caller commits.
+    """
+    row = db.query(
+        models.Stock.id, models.Stock.quantity, models.Stock.is_quarantined,
+        models.Stock.bin_id, models.Batch.product_id, models.Batch.expiry_date, models.Bin.warehouse_id
+    ).join(models.Batch, models.Stock.batch_id == models.Batch.id)\
+     .join(models.Bin, models.Stock.bin_id == models.Bin.id)\
+     .filter(models.Stock.id == stock_id)\
+     .first()
+    if row is None:
+        return None
+
+    delta = counted_quantity - row.quantity
+    if delta:
+        # Only if nobody moved the row since we read it
+        stocks = models.Stock.__table__
+        updated = db.execute(
+            update(stocks)
+            .where(stocks.c.id == stock_id)
+            .where(stocks.c.quantity == row.quantity)
+            .values(quantity=counted_quantity)
+        ).rowcount
+        if not updated:
+            raise ConcurrentChange(f"Stock {stock_id} changed while it was being adjusted")
+        post(db, [Movement(
+            MovementType.ADJUSTMENT, row.id, row.product_id, row.warehouse_id, row.expiry_date,
+            quantity_delta=delta, quarantined_delta=delta if row.is_quarantined else 0, reference=reason,
+            bin_id=row.bin_id
+        )])
+        events.stage(db, {
+            "type": "stock.quantity", "warehouse_id": row.warehouse_id, "stock_id": row.id, "quantity": counted_quantity
+        })
+    return {"stock_id": row.id, "previous_quantity": row.quantity, "quantity": counted_quantity, "delta": delta}
+
+
+# --- SNAPSHOTS ---
+
+def latest_snapshot(db: Session, at: Optional[datetime] = None) -> Optional[models.StockSnapshot]:
+    query = db.query(models.StockSnapshot)
+    if at is not None:
+        query = query.filter(models.StockSnapshot.as_of <= at)
+    return query.order_by(models.StockSnapshot.last_movement_id.desc()).first()
+
+def _balances(snapshot: Optional[models.StockSnapshot], upto_movement_id: Optional[int] = None):
+    """Per stock row: the snapshot's balance plus the movements after it (up to upto_movement_id)."""
+    M, L = models.StockMovement, models.StockSnapshotLine
+    movements = select(
+        M.stock_id, M.product_id, M.warehouse_id,
+        M.quantity_delta.label("quantity"), M.quarantined_delta.label("quarantined")
+    )
+    if snapshot is not None:
+        movements = movements.where(M.id > snapshot.last_movement_id)
+    if upto_movement_id is not None:
+        movements = movements.where(M.id <= upto_movement_id)
+    parts = movements
+    if snapshot is not None:
+        parts = union_all(
+            select(L.stock_id, L.product_id, L.warehouse_id, L.quantity, L.quarantined).where(L.snapshot_id == snapshot.id),
+            movements
+        )
+    parts = parts.subquery()
+    return select(
+        parts.c.stock_id, parts.c.product_id, parts.c.warehouse_id,
+        func.sum(parts.c.quantity).label("quantity"), func.sum(parts.c.quarantined).label("quarantined")
+    ).group_by(parts.c.stock_id, parts.c.product_id, parts.c.warehouse_id)
+
+def take_snapshot(db: Session) -> Optional[models.StockSnapshot]:
+    """Compacts the previous snapshot + settled movements into a new one. None if nothing moved. Commits."""
+    previous = latest_snapshot(db)
+    cutoff = datetime.utcnow() - timedelta(seconds=SNAPSHOT_SETTLE_SECONDS)
+    last = db.query(models.StockMovement.id, models.StockMovement.created_at)\
+        .filter(models.StockMovement.created_at <= cutoff)\
+        .order_by(models.StockMovement.id.desc())\
+        .first()
+    if last is None or (previous is not None and last.id <= previous.last_movement_id):
+        return None
+
+    snapshot = models.StockSnapshot(as_of=last.created_at, last_movement_id=last.id)
+    db.add(snapshot)
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()  # Another worker just took this snapshot
+        return None
+    balances = _balances(previous, upto_movement_id=last.id).subquery()
+    snapshot.rows = db.execute(
+        insert(models.StockSnapshotLine).from_select(
+            ["snapshot_id", "stock_id", "product_id", "warehouse_id", "quantity", "quarantined"],
+            select(snapshot.id, balances.c.stock_id, balances.c.product_id, balances.c.warehouse_id,
+                   balances.c.quantity, balances.c.quarantined)
+            .where(or_(balances.c.quantity != 0, balances.c.quarantined != 0))
+        )
+    ).rowcount
+    db.commit()
+    return snapshot
+
+
+# --- QUERIES ---
+
+def stock_at(db: Session, at: datetime, warehouse_id: Optional[int] = None, product_id: Optional[int] = None) -> dict:
+    """
+    On-hand per (warehouse, product) at `at`: the last snapshot before it plus the movements
+    between that snapshot and `at` (bounded by the next snapshot).
+    """
+    at = _utc(at)
+    snapshot = latest_snapshot(db, at)
+    M, L = models.StockMovement, models.StockSnapshotLine
+
+    totals = {}
+    def add(rows):
+        for wh, pid, quantity, quarantined in rows:
+            on_hand, held = totals.get((wh, pid), (0, 0))
+            totals[(wh, pid)] = (on_hand + int(quantity or 0), held + int(quarantined or 0))
+
+    if snapshot is not None:
+        query = db.query(L.warehouse_id, L.product_id, func.sum(L.quantity), func.sum(L.quarantined))\
+            .filter(L.snapshot_id == snapshot.id)
+        if warehouse_id is not None:
+            query = query.filter(L.warehouse_id == warehouse_id)
+        if product_id is not None:
+            query = query.filter(L.product_id == product_id)
+        add(query.group_by(L.warehouse_id, L.product_id))
+
+    tail = db.query(M.warehouse_id, M.product_id, func.sum(M.quantity_delta), func.sum(M.quarantined_delta))\
+        .filter(M.created_at <= at)
+    if snapshot is not None:
+        tail = tail.filter(M.id > snapshot.last_movement_id)
+        following = db.query(func.min(models.StockSnapshot.last_movement_id))\
+            .filter(models.StockSnapshot.last_movement_id > snapshot.last_movement_id).scalar()
+        if following is not None:
+            tail = tail.filter(M.id <= following)
+    if warehouse_id is not None:
+        tail = tail.filter(M.warehouse_id == warehouse_id)
+    if product_id is not None:
+        tail = tail.filter(M.product_id == product_id)
+    add(tail.group_by(M.warehouse_id, M.product_id))
+
+    products = master_cache.products(db, {pid for _, pid in totals})
+    return {
+        "at": at,
+        "snapshot_id": snapshot.id if snapshot else None,
+        "snapshot_as_of": snapshot.as_of if snapshot else None,
+        "lines": [
+            {
+                "warehouse_id": wh,
+                "product_id": pid,
+                "sku": products[pid].sku_code if pid in products else None,
+                "name": products[pid].name if pid in products else None,
+                "on_hand": on_hand,
+                "quarantined": quarantined
+            }
+            for (wh, pid), (on_hand, quarantined) in sorted(totals.items())
+            if on_hand or quarantined
+        ]
+    }
+
+
+# --- RECONCILIATION ---
+
+def reconcile(db: Session, full: bool = False) -> List[dict]:
+    """
+    Stock rows whose quantity (or quarantined quantity) disagrees with the ledger; empty means
+    they match. One statement, so it reads a consistent view while writes continue.
+    """
+    balances = _balances(None if full else latest_snapshot(db)).subquery()
+    stocks = models.Stock.__table__
+    quarantined = case((stocks.c.is_quarantined == True, stocks.c.quantity), else_=0)
+    ledger_quantity = func.coalesce(balances.c.quantity, 0)
+    ledger_quarantined = func.coalesce(balances.c.quarantined, 0)
+    rows = db.execute(
+        select(stocks.c.id, stocks.c.quantity, quarantined, ledger_quantity, ledger_quarantined)
+        .select_from(stocks.outerjoin(balances, balances.c.stock_id == stocks.c.id))
+        .where(or_(stocks.c.quantity != ledger_quantity, quarantined != ledger_quarantined))
+        .order_by(stocks.c.id)
+    ).all()
+    return [
+        {
+            "stock_id": stock_id,
+            "stock": {"quantity": quantity, "quarantined": held},
+            "ledger": {"quantity": int(ledger_q), "quarantined": int(ledger_held)}
+        }
+        for stock_id, quantity, held, ledger_q, ledger_held in rows
+    ]
+
+def run_snapshot(progress: Optional[Callable[[Optional[models.StockSnapshot]], None]] = None) -> dict:
+    """
+    Scheduler entry point: snapshot, then reconcile the stock rows against it.
+    `progress(snapshot)` runs in between (the snapshot is committed by then).
+    """
+    db = SessionLocal()
+    try:
+        snapshot = take_snapshot(db)
+        if progress:
+            progress(snapshot)
+        drift = reconcile(db)
+        if drift:
+            logger.warning("Stock ledger drift on %s row(s), e.g. %s", len(drift), drift[:5])
+        return {
+            "snapshot_id": snapshot.id if snapshot else None,
+            "rows": snapshot.rows if snapshot else 0,
+            "drift": len(drift)
+        }
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "reconcile"
+    if command == "snapshot":
+        print(run_snapshot())
+    elif command == "reconcile":
+        session = SessionLocal()
+        try:
+            drift = reconcile(session, full="--full" in sys.argv)
+        finally:
+            session.close()
+        for record in drift:
+            print(record)
+        print(f"reconcile: {len(drift)} drifted row(s)")
+        if drift:
+            sys.exit(1)
+    else:
+        sys.exit("usage: python -m app.domains.inventory.ledger [snapshot|reconcile [--full]]")
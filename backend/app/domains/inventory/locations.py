@@ -0,0 +1,42 @@
+"""
+Bin locations. Bin codes follow AISLE-RACK-LEVEL (`A-01-01`); the walk through a warehouse
+goes up one aisle and down the next, so racks are visited ascending in every other aisle and
+descending in the rest. Codes that don't parse come last, in code order.
+
+Pick waves route their stops with it; putaway uses the same order as its notion of distance.
+"""
+import re
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+_BIN_CODE = re.compile(r"^\s*([A-Za-z]+)[-_ ]?(\d+)(?:[-_ ](\d+))?")
+
+
+@lru_cache(maxsize=100000)
+def parse_bin_code(bin_code: str) -> Optional[Tuple[str, int, int]]:
+    """`A-01-01` -> ("A", 1, 1); None when the code isn't AISLE-RACK[-LEVEL]."""
+    match = _BIN_CODE.match(bin_code or "")
+    if not match:
+        return None
+    aisle, rack, level = match.groups()
+    return aisle.upper(), int(rack), int(level or 0)
+
+def route(stops: Iterable[Tuple[int, str]]) -> List[Tuple[int, str]]:
+    """Orders (warehouse_id, bin_code) stops along a serpentine walk, warehouse by warehouse."""
+    stops = list(stops)
+    aisles = sorted({(wh, parsed[0]) for wh, code in stops if (parsed := parse_bin_code(code))})
+    # Direction alternates over the aisles that are actually visited, per warehouse
+    rank, visited = {}, {}
+    for wh, aisle in aisles:
+        rank[(wh, aisle)] = visited.get(wh, 0)
+        visited[wh] = rank[(wh, aisle)] + 1
+
+    def key(stop):
+        wh, code = stop
+        parsed = parse_bin_code(code)
+        if parsed is None:
+            return (wh, 1, 0, 0, 0, code)
+        aisle, rack, level = parsed
+        position = rank[(wh, aisle)]
+        return (wh, 0, position, rack if position % 2 == 0 else -rack, level, code)
+    return sorted(stops, key=key)
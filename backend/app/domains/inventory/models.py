@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, Boolean, Float, ForeignKey, DateTime, Date
+from sqlalchemy import Column, Integer, String, Boolean, Float, ForeignKey, DateTime, Date, Index, and_
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
+import enum
 
 class Warehouse(Base):
     __tablename__ = "warehouses"
@@ -19,15 +20,20 @@ class Bin(Base):
     bin_code = Column(String, unique=True, index=True) # e.g., A-01-01
     is_cold_storage = Column(Boolean, default=False)
     warehouse_id = Column(Integer, ForeignKey("warehouses.id"))
+    capacity = Column(Integer, nullable=True) # Units; NULL = settings.default_bin_capacity (putaway)
     
     warehouse = relationship("Warehouse", back_populates="bins")
     stocks = relationship("Stock", back_populates="bin")
 
 class Batch(Base):
     __tablename__ = "batches"
+    __table_args__ = (
+        Index("ux_batches_product_number", "product_id", "batch_number", unique=True), # One Batch per product+number
+        Index("ix_batches_product_expiry", "product_id", "expiry_date"),               # FEFO ordering
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    batch_number = Column(String, index=True) # Not unique globally, but unique per product usually
+    batch_number = Column(String, index=True) # Not unique globally, unique per product (see ux_batches_product_number)
     product_id = Column(Integer, ForeignKey("products.id")) # Links to Master Data
     
     expiry_date = Column(Date, nullable=False)
@@ -41,6 +47,10 @@ class Batch(Base):
 
 class Stock(Base):
     __tablename__ = "stocks"
+    __table_args__ = (
+        Index("ux_stocks_batch_bin", "batch_id", "bin_id", unique=True), # One Stock per batch+bin
+        Index("ix_stocks_bin", "bin_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     batch_id = Column(Integer, ForeignKey("batches.id"))
@@ -52,4 +62,115 @@ class Stock(Base):
     quarantine_reason = Column(String, nullable=True) # e.g., "Temp Excursion: 12°C"
 
     bin = relationship("Bin", back_populates="stocks")
-    batch = relationship("Batch")
\ No newline at end of file
+    batch = relationship("Batch")
+
+# Sellable stock only: what the FEFO allocator scans
+Index(
+    "ix_stocks_available", Stock.batch_id,
+    sqlite_where=and_(Stock.quantity > 0, Stock.is_quarantined == False),
+    postgresql_where=and_(Stock.quantity > 0, Stock.is_quarantined == False)
+)
+
+# --- TELEMETRY HISTORY (GDP audit trail) ---
+
+class TelemetryReading(Base):
+    """Append-only raw sensor points, written in batches."""
+    __tablename__ = "telemetry_readings"
+    __table_args__ = (Index("ix_telemetry_readings_bin_time", "bin_id", "recorded_at"),)
+
+    id = Column(Integer, primary_key=True)
+    bin_id = Column(Integer, ForeignKey("bins.id"), nullable=False)
+    recorded_at = Column(DateTime, nullable=False)
+    temperature = Column(Float, nullable=False)
+
+class TelemetryRollup(Base):
+    """Per-bin min/max/avg buckets ("1m" and "1h") so long-range queries skip raw points."""
+    __tablename__ = "telemetry_rollups"
+
+    bin_id = Column(Integer, ForeignKey("bins.id"), primary_key=True)
+    resolution = Column(String, primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    min_temp = Column(Float, nullable=False)
+    max_temp = Column(Float, nullable=False)
+    sum_temp = Column(Float, nullable=False)
+    samples = Column(Integer, nullable=False)
+
+class TelemetryExcursion(Base):
+    """A confirmed (sustained) breach that led to quarantine."""
+    __tablename__ = "telemetry_excursions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    bin_id = Column(Integer, ForeignKey("bins.id"), index=True)
+    product_id = Column(Integer, ForeignKey("products.id"))
+    kind = Column(String)              # HIGH / LOW
+    limit_temp = Column(Float)
+    peak_temp = Column(Float)
+    started_at = Column(DateTime)
+    confirmed_at = Column(DateTime)
+
+# --- EXPIRY CALENDAR ---
+
+class StockExpiryCalendar(Base):
+    """
+    On-hand quantity per (warehouse, expiry date, product), maintained by every stock write
+    path (see inventory/expiry.py). Expiry reports read this instead of stocks x batches x bins.
+    """
+    __tablename__ = "stock_expiry_calendar"
+    __table_args__ = (
+        Index("ix_stock_expiry_calendar_expiry", "expiry_date"),
+    )
+
+    warehouse_id = Column(Integer, ForeignKey("warehouses.id"), primary_key=True)
+    expiry_date = Column(Date, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    on_hand = Column(Integer, nullable=False, default=0)
+    quarantined = Column(Integer, nullable=False, default=0)
+
+# --- STOCK MOVEMENT LEDGER ---
+
+class MovementType(str, enum.Enum):
+    OPENING = "OPENING"         # Balance carried over when the ledger was introduced
+    RECEIPT = "RECEIPT"
+    ALLOCATION = "ALLOCATION"
+    QUARANTINE = "QUARANTINE"
+    ADJUSTMENT = "ADJUSTMENT"
+
+class StockMovement(Base):
+    """
+    Append-only journal of every change to a stock row, written in the same transaction
+    (see inventory/ledger.py). Summing a row's movements gives its quantity.
+    """
+    __tablename__ = "stock_movements"
+    __table_args__ = (
+        Index("ix_stock_movements_stock", "stock_id", "id"),
+        Index("ix_stock_movements_created", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, nullable=False)   # UTC
+    movement_type = Column(String, nullable=False)
+    stock_id = Column(Integer, ForeignKey("stocks.id"), nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    warehouse_id = Column(Integer, ForeignKey("warehouses.id"), nullable=False)
+    quantity_delta = Column(Integer, nullable=False, default=0)
+    quarantined_delta = Column(Integer, nullable=False, default=0)
+    reference = Column(String, nullable=True)       # order:12, GRN number, quarantine reason...
+
+class StockSnapshot(Base):
+    """Balances of every stock row after movement `last_movement_id` (as of `as_of`)."""
+    __tablename__ = "stock_snapshots"
+
+    id = Column(Integer, primary_key=True)
+    as_of = Column(DateTime, nullable=False, index=True)  # created_at of the last movement included
+    last_movement_id = Column(Integer, nullable=False, unique=True) # Two concurrent snapshotters can't both win
+    rows = Column(Integer, nullable=False, default=0)
+
+class StockSnapshotLine(Base):
+    __tablename__ = "stock_snapshot_lines"
+
+    snapshot_id = Column(Integer, ForeignKey("stock_snapshots.id"), primary_key=True)
+    stock_id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, nullable=False)
+    warehouse_id = Column(Integer, nullable=False)
+    quantity = Column(Integer, nullable=False)
+    quarantined = Column(Integer, nullable=False)
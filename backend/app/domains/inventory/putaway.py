@@ -0,0 +1,363 @@
+"""
+Putaway: picks bins for inbound stock.
+
+A line goes, in order of preference:
+  1. CONSOLIDATE   into a bin already holding the same batch, if it takes the whole line
+  2. NEAR_BATCH    the nearest bin with room to that batch's bins
+  3. NEAR_PRODUCT  the nearest bin with room to the product's other batches
+  4. FIRST_FREE    the first bin with room from the start of the walk
+Cold-chain products only go to cold-storage bins and everything else only to ambient ones.
+"Nearest" is distance along the picking walk (`locations.route`), so putaway and picking
+agree on what is close. A line no single bin can take is split over a few bins (suggestions
+only; auto-assigned receipts need one bin).
+
+Free space comes from an in-memory index, not from the stocks table: per (warehouse, cold)
+zone the bins sit in walk order under a max-tree of their free units, so "nearest bin with
+at least N free" is a tree descent. The ledger stages per-bin deltas with every movement and
+the index applies them when the transaction commits; it is rebuilt from the database when
+bins are created and every PUTAWAY_INDEX_TTL_SECONDS (writes made by other workers).
+
+Auto-assigned receipts hold the space they were given until their transaction ends, so two
+receipts running at once in this process can't both fill the same nearly full bin. Holds
+are per process: across workers, capacity is advisory until the next rebuild.
+"""
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import event as sa_event, func
+from sqlalchemy.orm import Session
+from app.core.config import get_settings
+from app.domains.inventory import models, schemas
+from app.domains.inventory.locations import route
+from app.domains.master.cache import cache as master_cache
+
+MAX_SPLITS = 10
+
+
+class _Zone:
+    """
+    Bins of one (warehouse, cold) zone in walk order, with a max-tree over their free units
+    and the zone's total free units.
+    """
+
+    def __init__(self, bin_ids: List[int], free: List[int]):
+        self.bin_ids = bin_ids
+        self.total = sum(free)
+        self.size = 1
+        while self.size < len(bin_ids):
+            self.size *= 2
+        self.tree = [-1] * (2 * self.size)
+        self.tree[self.size:self.size + len(free)] = free
+        for node in range(self.size - 1, 0, -1):
+            self.tree[node] = max(self.tree[2 * node], self.tree[2 * node + 1])
+
+    def free(self, position: int) -> int:
+        return self.tree[self.size + position]
+
+    def set(self, position: int, free: int):
+        node = self.size + position
+        self.total += free - self.tree[node]
+        self.tree[node] = free
+        node //= 2
+        while node:
+            self.tree[node] = max(self.tree[2 * node], self.tree[2 * node + 1])
+            node //= 2
+
+    def _after(self, node, lo, hi, start, need):
+        if hi < start or self.tree[node] < need:
+            return None
+        if lo == hi:
+            return lo
+        mid = (lo + hi) // 2
+        found = self._after(2 * node, lo, mid, start, need)
+        return found if found is not None else self._after(2 * node + 1, mid + 1, hi, start, need)
+
+    def _before(self, node, lo, hi, end, need):
+        if lo > end or self.tree[node] < need:
+            return None
+        if lo == hi:
+            return lo
+        mid = (lo + hi) // 2
+        found = self._before(2 * node + 1, mid + 1, hi, end, need)
+        return found if found is not None else self._before(2 * node, lo, mid, end, need)
+
+    def nearest(self, anchor: int, need: int) -> Optional[int]:
+        """Position of the bin closest to `anchor` with at least `need` free; ties go forward."""
+        after = self._after(1, 0, self.size - 1, anchor, need)
+        before = self._before(1, 0, self.size - 1, anchor - 1, need) if anchor > 0 else None
+        if before is None:
+            return after
+        if after is None or anchor - before < after - anchor:
+            return before
+        return after
+
+
+class CapacityIndex:
+    """Free units per bin, grouped into walk-ordered zones. Thread-safe; loaded lazily."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded_at: Optional[float] = None
+        self._zones: Dict[Tuple[int, bool], _Zone] = {}
+        self._where: Dict[int, Tuple[Tuple[int, bool], int]] = {}  # bin_id -> (zone key, position)
+        self._codes: Dict[int, str] = {}
+        self._capacity: Dict[int, int] = {}
+        self._used: Dict[int, int] = {}
+        self._held: Dict[int, int] = {}  # bin_id -> units held for receipts not yet committed
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def _ensure(self, db: Session):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > get_settings().putaway_index_ttl_seconds:
+            self._load(db)
+
+    def _load(self, db: Session):
+        # Two queries: the bins, and units per bin (served by ix_stocks_bin)
+        bins = {
+            row.bin_code: row for row in db.query(
+                models.Bin.id, models.Bin.bin_code, models.Bin.warehouse_id,
+                models.Bin.is_cold_storage, models.Bin.capacity
+            )
+        }
+        used = dict(
+            db.query(models.Stock.bin_id, func.sum(models.Stock.quantity))
+            .group_by(models.Stock.bin_id)
+        )
+        default_capacity = get_settings().default_bin_capacity
+        members: Dict[Tuple[int, bool], List[int]] = {}
+        self._where, self._codes, self._capacity, self._used = {}, {}, {}, {}
+        for _, code in route((row.warehouse_id, code) for code, row in bins.items()):
+            row = bins[code]
+            key = (row.warehouse_id, bool(row.is_cold_storage))
+            self._where[row.id] = (key, len(members.setdefault(key, [])))
+            members[key].append(row.id)
+            self._codes[row.id] = code
+            self._capacity[row.id] = row.capacity or default_capacity
+            self._used[row.id] = used.get(row.id) or 0
+        self._zones = {
+            key: _Zone(bin_ids, [self._free(b) for b in bin_ids])
+            for key, bin_ids in members.items()
+        }
+        self._loaded_at = time.monotonic()
+
+    def _free(self, bin_id: int) -> int:
+        return self._capacity[bin_id] - self._used[bin_id] - self._held.get(bin_id, 0)
+
+    def _refresh(self, bin_id: int):
+        key, position = self._where[bin_id]
+        self._zones[key].set(position, self._free(bin_id))
+
+    def apply(self, changes: Dict[int, int]):
+        """Committed per-bin unit deltas (from the ledger)."""
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            for bin_id, delta in changes.items():
+                if bin_id not in self._where:
+                    self._loaded_at = None  # A bin we haven't seen: rebuild on next use
+                    return
+                self._used[bin_id] += delta
+                self._refresh(bin_id)
+
+    def release(self, holds: Dict[int, int]):
+        """Gives back space held by suggest(hold=...) once that transaction has ended."""
+        with self._lock:
+            for bin_id, units in holds.items():
+                left = self._held.get(bin_id, 0) - units
+                if left > 0:
+                    self._held[bin_id] = left
+                else:
+                    self._held.pop(bin_id, None)
+                if self._loaded_at is not None and bin_id in self._where:
+                    self._refresh(bin_id)
+
+    def summary(self, db: Session, warehouse_id: Optional[int] = None) -> List[dict]:
+        with self._lock:
+            self._ensure(db)
+            out = []
+            for (wh, cold), zone in sorted(self._zones.items()):
+                if warehouse_id is not None and wh != warehouse_id:
+                    continue
+                capacity = sum(self._capacity[b] for b in zone.bin_ids)
+                used = sum(self._used[b] for b in zone.bin_ids)
+                out.append({
+                    "warehouse_id": wh, "is_cold_storage": cold, "bins": len(zone.bin_ids),
+                    "capacity": capacity, "used": used, "free": max(capacity - used, 0)
+                })
+            return out
+
+    def suggest(self, db: Session, lines, warehouse_id: Optional[int] = None,
+                split: bool = True, hold: bool = False) -> List[schemas.PutawaySuggestion]:
+        """
+        One suggestion per line (anything with product_id, batch_number, quantity and optionally
+        warehouse_id). Lines are planned in order against the free space left by earlier lines.
+        Nothing is reserved once the call returns, unless `hold`: then the placements stay held
+        until `db`'s transaction ends (commit or rollback), for receipts that act on them.
+        """
+        products = master_cache.products(db, {line.product_id for line in lines})
+        holdings = _holdings(db, set(products))
+        with self._lock:
+            self._ensure(db)
+            reserved = []
+            try:
+                return [
+                    self._place(index, line, products.get(line.product_id), holdings,
+                                getattr(line, "warehouse_id", None) or warehouse_id, split, reserved)
+                    for index, line in enumerate(lines)
+                ]
+            finally:
+                if hold:
+                    held = db.info.setdefault("putaway_holds", {})
+                    for zone, position, taken in reserved:
+                        bin_id = zone.bin_ids[position]
+                        self._held[bin_id] = self._held.get(bin_id, 0) + taken
+                        held[bin_id] = held.get(bin_id, 0) + taken
+                else:
+                    for zone, position, taken in reversed(reserved):
+                        zone.set(position, zone.free(position) + taken)
+
+    def hold(self, db: Session, requests: List[Tuple[int, int]]) -> List[bool]:
+        """
+        Receipts into bins the operator chose: [(bin_id, quantity)] in line order, each held
+        (True) if the bin still has room for it after the earlier ones, like suggest(hold=True).
+        """
+        with self._lock:
+            self._ensure(db)
+            held = db.info.setdefault("putaway_holds", {})
+            accepted = []
+            for bin_id, quantity in requests:
+                if bin_id not in self._where:
+                    self._load(db)  # A bin created since the last load (or by another worker)
+                fits = bin_id in self._where and self._free(bin_id) >= quantity
+                if fits:
+                    self._held[bin_id] = self._held.get(bin_id, 0) + quantity
+                    held[bin_id] = held.get(bin_id, 0) + quantity
+                    self._refresh(bin_id)
+                accepted.append(fits)
+            return accepted
+
+    def _place(self, index, line, product, holdings, warehouse_id, split, reserved) -> schemas.PutawaySuggestion:
+        suggestion = schemas.PutawaySuggestion(index=index, product_id=line.product_id, placements=[])
+        if product is None:
+            suggestion.unplaced, suggestion.detail = line.quantity, "Product ID not found"
+            return suggestion
+        cold = bool(product.requires_cold_chain)
+
+        # 1. Existing stock of the batch / product, in zones of the right temperature
+        batch_bins = [
+            b for b in holdings.get((line.product_id, line.batch_number), ()) if self._fits_zone(b, cold)
+        ] if line.batch_number else []
+        product_bins = [b for b in holdings.get((line.product_id, None), ()) if self._fits_zone(b, cold)]
+
+        # 2. Warehouse: asked for, else where the batch / product already is, else the zone with most free space
+        if warehouse_id is None:
+            known = batch_bins or product_bins
+            if known:
+                warehouse_id = Counter(self._where[b][0][0] for b in known).most_common(1)[0][0]
+            else:
+                zones = [(zone.total, -key[0], key[0]) for key, zone in self._zones.items() if key[1] == cold]
+                warehouse_id = max(zones)[2] if zones else None
+        suggestion.warehouse_id = warehouse_id
+        zone = self._zones.get((warehouse_id, cold))
+        if zone is None:
+            suggestion.unplaced = line.quantity
+            suggestion.detail = f"No {'cold-storage' if cold else 'ambient'} bins in warehouse {warehouse_id}"
+            return suggestion
+        batch_positions = [self._where[b][1] for b in batch_bins if self._where[b][0][0] == warehouse_id]
+        product_positions = sorted(self._where[b][1] for b in product_bins if self._where[b][0][0] == warehouse_id)
+
+        def take(position, quantity, reason):
+            zone.set(position, zone.free(position) - quantity)
+            reserved.append((zone, position, quantity))
+            bin_id = zone.bin_ids[position]
+            suggestion.placements.append(schemas.PutawayPlacement(
+                bin_id=bin_id, bin_code=self._codes[bin_id], quantity=quantity, reason=reason
+            ))
+            # Later lines of the same batch / product consolidate with this one
+            for key in ((line.product_id, line.batch_number), (line.product_id, None)):
+                holdings.setdefault(key, []).append(bin_id)
+
+        # 3. Whole line into a bin already holding the batch
+        for position in batch_positions:
+            if zone.free(position) >= line.quantity:
+                take(position, line.quantity, "CONSOLIDATE")
+                return suggestion
+
+        # 4. Nearest bin with room, around the batch, the product, or from the start of the walk
+        if batch_positions:
+            anchor, reason = batch_positions[0], "NEAR_BATCH"
+        elif product_positions:
+            anchor, reason = product_positions[len(product_positions) // 2], "NEAR_PRODUCT"
+        else:
+            anchor, reason = 0, "FIRST_FREE"
+        position = zone.nearest(anchor, line.quantity)
+        if position is not None:
+            take(position, line.quantity, reason)
+            return suggestion
+
+        # 5. Split: each piece at least an even share of what's left, so it stays within MAX_SPLITS
+        remaining = line.quantity
+        while split and remaining and len(suggestion.placements) < MAX_SPLITS:
+            need = -(-remaining // (MAX_SPLITS - len(suggestion.placements)))
+            position = zone.nearest(anchor, need)
+            if position is None:
+                break
+            quantity = min(zone.free(position), remaining)
+            take(position, quantity, reason)
+            remaining -= quantity
+        if remaining:
+            suggestion.unplaced = remaining
+            suggestion.detail = "No bin with room for the whole line" if not split else "Not enough free space"
+        return suggestion
+
+    def _fits_zone(self, bin_id: int, cold: bool) -> bool:
+        where = self._where.get(bin_id)
+        return where is not None and where[0][1] == cold
+
+
+def _holdings(db: Session, product_ids) -> Dict[tuple, List[int]]:
+    """(product_id, batch_number) and (product_id, None) -> bins holding stock of it (one query)."""
+    holdings: Dict[tuple, List[int]] = {}
+    if not product_ids:
+        return holdings
+    rows = db.query(models.Batch.product_id, models.Batch.batch_number, models.Stock.bin_id)\
+        .join(models.Stock, models.Stock.batch_id == models.Batch.id)\
+        .filter(models.Batch.product_id.in_(product_ids))\
+        .filter(models.Stock.quantity > 0)
+    for product_id, batch_number, bin_id in rows:
+        holdings.setdefault((product_id, batch_number), []).append(bin_id)
+        holdings.setdefault((product_id, None), []).append(bin_id)
+    return holdings
+
+
+index = CapacityIndex()
+
+
+# --- TRANSACTION HOOKS ---
+
+def record_changes(db: Session, changes: Dict[int, int]):
+    """Per-bin unit deltas to apply to the index when `db` commits (called by ledger.post)."""
+    pending = db.info.setdefault("putaway_changes", {})
+    for bin_id, delta in changes.items():
+        pending[bin_id] = pending.get(bin_id, 0) + delta
+
+@sa_event.listens_for(Session, "after_commit")
+def _apply_on_commit(session):
+    changes = session.info.pop("putaway_changes", None)
+    if changes:
+        index.apply(changes)
+
+@sa_event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop("putaway_changes", None)
+
+@sa_event.listens_for(Session, "after_transaction_end")
+def _release_holds(session, transaction):
+    # Outermost transaction only; after a commit the ledger deltas above already count the units
+    if transaction.parent is None:
+        holds = session.info.pop("putaway_holds", None)
+        if holds:
+            index.release(holds)
@@ -0,0 +1,70 @@
+from datetime import date
+from typing import Optional
+from sqlalchemy.orm import Session
+from app.domains.inventory import models
+from app.domains.master.models import Product
+
+# Column order shared by the paginated view and the exports
+LIVE_STOCK_COLUMNS = (
+    "stock_id", "product_name", "sku", "batch_number", "expiry_date",
+    "bin_code", "is_cold_chain", "quantity", "is_quarantined"
+)
+
+
+class StockFilters:
+    """Server-side filters for the live stock view (used as a FastAPI dependency)."""
+
+    def __init__(
+        self,
+        warehouse_id: Optional[int] = None,
+        bin_prefix: Optional[str] = None,
+        product_id: Optional[int] = None,
+        sku: Optional[str] = None,
+        cold_chain: Optional[bool] = None,
+        quarantined: Optional[bool] = None,
+        expiring_before: Optional[date] = None
+    ):
+        self.warehouse_id = warehouse_id
+        self.bin_prefix = bin_prefix
+        self.product_id = product_id
+        self.sku = sku
+        self.cold_chain = cold_chain
+        self.quarantined = quarantined
+        self.expiring_before = expiring_before
+
+
+def live_stock_query(db: Session, filters: StockFilters, after_id: Optional[int] = None):
+    """Positive stock rows joined to product/batch/bin, ordered by stock id for keyset paging."""
+    query = db.query(
+        models.Stock.id.label("stock_id"),
+        Product.name.label("product_name"),
+        Product.sku_code.label("sku"),
+        models.Batch.batch_number,
+        models.Batch.expiry_date,
+        models.Bin.bin_code,
+        models.Bin.is_cold_storage.label("is_cold_chain"),
+        models.Stock.quantity,
+        models.Stock.is_quarantined
+    ).join(models.Batch, models.Stock.batch_id == models.Batch.id)\
+     .join(Product, models.Batch.product_id == Product.id)\
+     .join(models.Bin, models.Stock.bin_id == models.Bin.id)\
+     .filter(models.Stock.quantity > 0)
+
+    if filters.warehouse_id is not None:
+        query = query.filter(models.Bin.warehouse_id == filters.warehouse_id)
+    if filters.bin_prefix:
+        query = query.filter(models.Bin.bin_code.startswith(filters.bin_prefix, autoescape=True))
+    if filters.product_id is not None:
+        query = query.filter(models.Batch.product_id == filters.product_id)
+    if filters.sku:
+        query = query.filter(Product.sku_code == filters.sku)
+    if filters.cold_chain is not None:
+        query = query.filter(models.Bin.is_cold_storage == filters.cold_chain)
+    if filters.quarantined is not None:
+        query = query.filter(models.Stock.is_quarantined == filters.quarantined)
+    if filters.expiring_before is not None:
+        query = query.filter(models.Batch.expiry_date < filters.expiring_before)
+
+    if after_id is not None:
+        query = query.filter(models.Stock.id > after_id)
+    return query.order_by(models.Stock.id)
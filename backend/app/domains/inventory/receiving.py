@@ -0,0 +1,175 @@
+"""
+Inbound receiving (GRN) engine, shared by the single-line and bulk receive routes.
+
+A receipt is validated against the master data cache, then batches and stock are
+upserted with INSERT ... ON CONFLICT on their unique keys (ux_batches_product_number,
+ux_stocks_batch_bin). Everything lands in the caller's single transaction: no orphan
+batches if the stock write fails. Lines without a target bin are given one by putaway.
+"""
+from typing import List, Optional, Set, Tuple
+from sqlalchemy.orm import Session
+from app.core import events
+from app.core.database import dialect_insert
+from app.domains.inventory import models, schemas, telemetry, ledger, putaway
+from app.domains.inventory.models import MovementType
+from app.domains.master.cache import cache as master_cache
+
+# REJECTED line reasons
+NOT_FOUND = "NOT_FOUND"        # Unknown product or bin
+INCOMPATIBLE = "INCOMPATIBLE"  # Cold-chain product / ambient bin, or the other way round
+NO_CAPACITY = "NO_CAPACITY"    # No bin with room for the line
+
+
+def receive_lines(db: Session, lines: List[schemas.InboundTransaction],
+                  reference: Optional[str] = None) -> Tuple[List[schemas.InboundLineResult], Set[int]]:
+    """
+    Receives every valid line. A line is REJECTED (with a `reason`) for an unknown product or
+    bin (NOT_FOUND), a bin of the wrong temperature for the product (INCOMPATIBLE), or no room:
+    the chosen bin can't take it, or without a bin no single bin can (NO_CAPACITY). The rest go
+    through. Returns (per-line results, touched bin ids); the caller commits, then calls
+    `after_commit` with the bin ids.
+    Repeated (product, batch_number) lines share one Batch; the first line's dates/MRP win,
+    as does an existing Batch's.
+    """
+    results = {}
+
+    def reject(index, reason, detail):
+        results[index] = schemas.InboundLineResult(index=index, status="REJECTED", reason=reason, detail=detail)
+
+    # 0. Master data through the cache (one IN query per table for the misses)
+    products = master_cache.products(db, {line.product_id for line in lines})
+    for index, line in enumerate(lines):
+        if line.product_id not in products:
+            reject(index, NOT_FOUND, "Product ID not found")
+
+    # 1. Lines without a bin: putaway picks one that takes the whole line
+    unassigned = [index for index, line in enumerate(lines) if not line.target_bin_code and index not in results]
+    if unassigned:
+        lines = list(lines)
+        # Held until this transaction ends: concurrent receipts see the space as taken
+        suggestions = putaway.index.suggest(db, [lines[index] for index in unassigned], split=False, hold=True)
+        for index, suggestion in zip(unassigned, suggestions):
+            if suggestion.unplaced:
+                reject(index, NO_CAPACITY, suggestion.detail)
+            else:
+                lines[index] = lines[index].model_copy(update={"target_bin_code": suggestion.placements[0].bin_code})
+
+    # 2. Operator-chosen bins: must exist, match the product's cold chain and have room
+    bins = master_cache.bins(db, {line.target_bin_code for line in lines if line.target_bin_code})
+    chosen = []
+    for index, line in enumerate(lines):
+        if index in results or index in unassigned:
+            continue
+        target_bin = bins.get(line.target_bin_code)
+        if target_bin is None:
+            reject(index, NOT_FOUND, f"Bin {line.target_bin_code} not found")
+        elif bool(products[line.product_id].requires_cold_chain) != bool(target_bin.is_cold_storage):
+            reject(index, INCOMPATIBLE, (
+                f"Bin {target_bin.bin_code} is {'cold storage' if target_bin.is_cold_storage else 'ambient'}; "
+                f"product {line.product_id} {'requires' if products[line.product_id].requires_cold_chain else 'must not use'} cold chain"
+            ))
+        else:
+            chosen.append(index)
+    if chosen:
+        # Held like putaway's picks, so concurrent receipts can't overfill the bin
+        fits = putaway.index.hold(db, [(bins[lines[index].target_bin_code].id, lines[index].quantity) for index in chosen])
+        for index, ok in zip(chosen, fits):
+            if not ok:
+                reject(index, NO_CAPACITY, f"Bin {lines[index].target_bin_code} has no room for {lines[index].quantity} units")
+
+    accepted = [(index, line) for index, line in enumerate(lines) if index not in results]
+    if not accepted:
+        return [results[index] for index in sorted(results)], set()
+
+    insert = dialect_insert(db)
+
+    # 2. Upsert batches; the no-op update makes RETURNING include existing rows
+    batch_rows = {}
+    for _, line in accepted:
+        batch_rows.setdefault((line.product_id, line.batch_number), {
+            "product_id": line.product_id,
+            "batch_number": line.batch_number,
+            "expiry_date": line.expiry_date,
+            "mfg_date": line.mfg_date,
+            "mrp": line.mrp
+        })
+    stmt = insert(models.Batch)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["product_id", "batch_number"],
+        set_={"batch_number": stmt.excluded.batch_number}
+    ).returning(models.Batch.id, models.Batch.product_id, models.Batch.batch_number, models.Batch.expiry_date)
+    batches = {(row.product_id, row.batch_number): row for row in db.execute(stmt, list(batch_rows.values()))}
+
+    # 3. Upsert stock, adding to whatever is already in the bin
+    received = {}
+    for _, line in accepted:
+        key = (batches[(line.product_id, line.batch_number)].id, bins[line.target_bin_code].id)
+        received[key] = received.get(key, 0) + line.quantity
+    stocks = models.Stock.__table__
+    stmt = insert(models.Stock)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["batch_id", "bin_id"],
+        set_={"quantity": stocks.c.quantity + stmt.excluded.quantity}
+    ).returning(models.Stock.id, models.Stock.batch_id, models.Stock.bin_id, models.Stock.quantity, models.Stock.is_quarantined)
+    stock_rows = {
+        (row.batch_id, row.bin_id): row for row in db.execute(stmt, [
+            {"batch_id": batch_id, "bin_id": bin_id, "quantity": quantity, "is_quarantined": False}
+            for (batch_id, bin_id), quantity in received.items()
+        ])
+    }
+
+    # 4. Ledger (plus rollups and expiry calendar); receiving into a quarantined row stays quarantined
+    batch_by_id = {row.id: row for row in batches.values()}
+    bins_by_id = {row.id: row for row in bins.values()}
+    movements = []
+    for (batch_id, bin_id), quantity in received.items():
+        stock, batch = stock_rows[(batch_id, bin_id)], batch_by_id[batch_id]
+        movements.append(ledger.Movement(
+            MovementType.RECEIPT, stock.id, batch.product_id, bins_by_id[bin_id].warehouse_id, batch.expiry_date,
+            quantity_delta=quantity, quarantined_delta=quantity if stock.is_quarantined else 0, reference=reference,
+            bin_id=bin_id
+        ))
+    ledger.post(db, movements)
+
+    # 5. Live feed: full rows, a receipt may create stock lines the dashboards haven't seen
+    feed = []
+    for stock in stock_rows.values():
+        batch, target_bin = batch_by_id[stock.batch_id], bins_by_id[stock.bin_id]
+        product = products[batch.product_id]
+        feed.append({
+            "type": "stock.received",
+            "warehouse_id": target_bin.warehouse_id,
+            "stock_id": stock.id,
+            "row": {
+                "stock_id": stock.id,
+                "product_name": product.name,
+                "sku": product.sku_code,
+                "batch_number": batch.batch_number,
+                "expiry_date": batch.expiry_date,
+                "bin_code": target_bin.bin_code,
+                "is_cold_chain": target_bin.is_cold_storage,
+                "quantity": stock.quantity,
+                "is_quarantined": stock.is_quarantined
+            }
+        })
+    events.stage(db, *feed)
+
+    for index, line in accepted:
+        target_bin = bins[line.target_bin_code]
+        batch = batches[(line.product_id, line.batch_number)]
+        stock = stock_rows[(batch.id, target_bin.id)]
+        results[index] = schemas.InboundLineResult(
+            index=index,
+            status="RECEIVED",
+            batch_id=batch.id,
+            stock_id=stock.id,
+            bin=target_bin.bin_code,
+            new_quantity=stock.quantity
+        )
+    return [results[index] for index in sorted(results)], {bin_id for _, bin_id in received}
+
+
+def after_commit(bin_ids: Set[int]):
+    # New stock may bring a cold-chain product into these bins
+    for bin_id in bin_ids:
+        telemetry.cache.invalidate_bin(bin_id)
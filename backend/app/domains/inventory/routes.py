@@ -1,15 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-from app.core.database import get_db
-from app.domains.inventory import models, schemas
-from app.domains.master.models import Product  # <--- CRITICAL IMPORT
+from typing import List, Optional
+from datetime import datetime, timedelta
+import asyncio
+import json
+from app.core import events
+from app.core.database import get_db, get_read_db, ReadSessionLocal
+from app.core.encoding import FastJSONResponse
+from app.core.metrics import ProfiledRoute
+from app.domains.inventory import models, schemas, telemetry, queries, receiving, expiry, ledger, putaway, exports
+from app.domains.master.cache import cache as master_cache
 
 router = APIRouter(
     prefix="/inventory",
-    tags=["Inventory & WMS"]
+    tags=["Inventory & WMS"],
+    route_class=ProfiledRoute
 )
 
+EVENT_KEEPALIVE_SECONDS = 15
+
+# Single-line receipt: a missing product / bin is a 404, a line the floor can't take is not
+REJECTION_STATUS = {
+    receiving.NOT_FOUND: 404,
+    receiving.INCOMPATIBLE: 422,
+    receiving.NO_CAPACITY: 409,
+}
+
 # --- STANDARD WMS ROUTES ---
 
 @router.post("/warehouses/")
@@ -26,125 +43,294 @@ def create_bin(bin_data: schemas.BinCreate, db: Session = Depends(get_db)):
     db.add(db_bin)
     db.commit()
     db.refresh(db_bin)
+    master_cache.invalidate_bin(db_bin.bin_code)
+    putaway.index.invalidate()
     return db_bin
 
 @router.post("/inbound/receive/")
 def receive_stock(tx: schemas.InboundTransaction, db: Session = Depends(get_db)):
-    # 1. Validate Product
-    product = db.query(Product).filter(Product.id == tx.product_id).first()
-    if not product:
-        raise HTTPException(status_code=404, detail="Product ID not found")
-
-    # 2. Validate Bin
-    target_bin = db.query(models.Bin).filter(models.Bin.bin_code == tx.target_bin_code).first()
-    if not target_bin:
-        raise HTTPException(status_code=404, detail=f"Bin {tx.target_bin_code} not found")
-
-    # 3. Check/Create Batch
-    batch = db.query(models.Batch).filter(
-        models.Batch.batch_number == tx.batch_number,
-        models.Batch.product_id == tx.product_id
-    ).first()
-
-    if not batch:
-        batch = models.Batch(
-            batch_number=tx.batch_number,
-            product_id=tx.product_id,
-            expiry_date=tx.expiry_date,
-            mfg_date=tx.mfg_date,
-            mrp=tx.mrp
-        )
-        db.add(batch)
-        db.commit()
-        db.refresh(batch)
-
-    # 4. Add Stock
-    stock_record = db.query(models.Stock).filter(
-        models.Stock.batch_id == batch.id,
-        models.Stock.bin_id == target_bin.id
-    ).first()
-
-    if stock_record:
-        stock_record.quantity += tx.quantity
-        # Reset quarantine on new receipt? Usually no, but for MVP we assume new stock is clean.
-        # stock_record.is_quarantined = False 
-    else:
-        stock_record = models.Stock(
-            batch_id=batch.id,
-            bin_id=target_bin.id,
-            quantity=tx.quantity
-        )
-        db.add(stock_record)
-    
+    # Same engine as the bulk GRN: batch + stock upserted, one commit
+    (result,), bin_ids = receiving.receive_lines(db, [tx])
+    if result.status == "REJECTED":
+        raise HTTPException(status_code=REJECTION_STATUS[result.reason], detail=result.detail)
+    db.commit()
+    receiving.after_commit(bin_ids)
+    return {"status": "Stock Received", "new_quantity": result.new_quantity, "bin": result.bin}
+
+@router.post("/inbound/receive/bulk", response_model=schemas.InboundReceiptResponse)
+def receive_stock_bulk(grn: schemas.GoodsReceivedNote, db: Session = Depends(get_db)):
+    # Whole goods-received note: one IN query per master table, two upserts, one commit
+    results, bin_ids = receiving.receive_lines(db, grn.lines, reference=grn.reference)
     db.commit()
-    return {"status": "Stock Received", "new_quantity": stock_record.quantity, "bin": target_bin.bin_code}
+    receiving.after_commit(bin_ids)
+
+    received = sum(1 for r in results if r.status == "RECEIVED")
+    return schemas.InboundReceiptResponse(
+        reference=grn.reference, received=received, rejected=len(results) - received, results=results
+    )
+
+# --- PUTAWAY ROUTES ---
+
+@router.post("/putaway/suggest", response_model=List[schemas.PutawaySuggestion])
+def suggest_putaway(request: schemas.PutawayRequest, db: Session = Depends(get_db)):
+    # Free space comes from the in-memory capacity index; one stock query for consolidation
+    return putaway.index.suggest(db, request.lines, warehouse_id=request.warehouse_id)
+
+@router.get("/putaway/capacity", response_model=List[schemas.BinCapacitySummary])
+def get_putaway_capacity(warehouse_id: Optional[int] = None, db: Session = Depends(get_db)):
+    return putaway.index.summary(db, warehouse_id)
 
 # --- IOT & SENSOR ROUTES (NEW) ---
 
 @router.post("/iot/telemetry/")
 def receive_telemetry(data: schemas.TelemetryData, db: Session = Depends(get_db)):
-    # 1. Find the Bin
-    bin_obj = db.query(models.Bin).filter(models.Bin.bin_code == data.bin_code).first()
-    if not bin_obj:
+    result = telemetry.process_readings(db, [data])
+    if result["unknown_bins"]:
         raise HTTPException(status_code=404, detail="Bin not found")
-
-    # 2. Get all stock in this bin
-    stocks = db.query(models.Stock).filter(models.Stock.bin_id == bin_obj.id).all()
-    
-    impacted_batches = []
-
-    for stock in stocks:
-        # Get Product limits
-        product = db.query(Product).filter(Product.id == stock.batch.product_id).first()
-        
-        # Cold Chain Check
-        if product.requires_cold_chain:
-            max_temp = product.max_temp if product.max_temp else 8.0 # Default 8°C
-            
-            if data.temperature > max_temp:
-                # VIOLATION! Lock the stock.
-                stock.is_quarantined = True
-                stock.quarantine_reason = f"Temp Spike: {data.temperature}°C (Limit: {max_temp}°C)"
-                impacted_batches.append(stock.batch.batch_number)
-    
     db.commit()
 
+    impacted_batches = [batch for entry in result["quarantined"] for batch in entry["batches"]]
     if impacted_batches:
         return {"status": "ALERT", "action": "QUARANTINED", "batches": impacted_batches}
+    elif result["watching"]:
+        # Out of range, but not for long enough to be an excursion yet
+        return {"status": "WARNING", "action": "MONITORING", "since": min(w["since"] for w in result["watching"])}
     else:
         return {"status": "NOMINAL", "action": "NONE"}
 
+@router.post("/iot/telemetry/batch")
+def receive_telemetry_batch(readings: List[schemas.TelemetryData], db: Session = Depends(get_db)):
+    # Many sensors, one call: nominal readings are answered from the cache
+    result = telemetry.process_readings(db, readings)
+    db.commit()
+    return {
+        "status": "ALERT" if result["quarantined"] else "NOMINAL",
+        "readings": len(readings),
+        "quarantined": result["quarantined"],
+        "watching": result["watching"],
+        "unknown_bins": result["unknown_bins"]
+    }
+
+@router.get("/iot/telemetry/{bin_code}/history", response_model=schemas.TelemetryHistory)
+def get_telemetry_history(
+    bin_code: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: str = Query("auto", pattern="^(auto|raw|1m|1h)$"),
+    db: Session = Depends(get_read_db)
+):
+    bin_ids = telemetry.cache.bin_ids(db, [bin_code])
+    if bin_code not in bin_ids:
+        raise HTTPException(status_code=404, detail="Bin not found")
+
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(days=1)
+    resolution, points = telemetry.history(db, bin_ids[bin_code], start, end, resolution)
+    return {"bin_code": bin_code, "resolution": resolution, "points": points}
+
+# --- EXPIRY ROUTES ---
+
+@router.get("/expiry/", response_model=schemas.ExpirySummary)
+def get_expiry_summary(
+    warehouse_id: Optional[int] = None,
+    thresholds: str = Query("30,90,180", pattern=r"^\d+(,\d+)*$", description="Days, comma separated"),
+    db: Session = Depends(get_read_db)
+):
+    # Expired / near-expiry units straight from the expiry calendar (no stock scan)
+    return expiry.summary(db, warehouse_id, [int(days) for days in thresholds.split(",")])
+
+@router.get("/expiry/calendar", response_model=List[schemas.ExpiryMonth])
+def get_expiry_calendar(
+    warehouse_id: Optional[int] = None,
+    months: int = Query(12, ge=1, le=120),
+    db: Session = Depends(get_read_db)
+):
+    return expiry.monthly(db, warehouse_id, months)
+
+@router.get("/expiry/products", response_model=List[schemas.ExpiringProduct])
+def get_expiring_products(
+    within_days: int = Query(90, ge=0, le=3650),
+    warehouse_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_read_db)
+):
+    return expiry.expiring_products(db, within_days, warehouse_id, limit)
+
+@router.post("/expiry/sweep", response_model=schemas.ExpirySweepResult)
+def sweep_expired_stock(db: Session = Depends(get_db)):
+    # Same sweep the app runs on a timer; one UPDATE however many rows expired
+    result = expiry.sweep(db)
+    db.commit()
+    return result
+
+# --- STOCK LEDGER ROUTES ---
+
+@router.post("/stock/{stock_id}/adjust", response_model=schemas.StockAdjustmentResult)
+def adjust_stock(stock_id: int, adjustment: schemas.StockAdjustment, db: Session = Depends(get_db)):
+    # Cycle count: the difference is journalled as an ADJUSTMENT movement
+    try:
+        result = ledger.adjust(db, stock_id, adjustment.counted_quantity, adjustment.reason)
+    except ledger.ConcurrentChange as exc:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=str(exc))
+    if result is None:
+        raise HTTPException(status_code=404, detail="Stock not found")
+    db.commit()
+    return result
+
+@router.get("/stock/at", response_model=schemas.StockAt)
+def get_stock_at(
+    at: datetime,
+    warehouse_id: Optional[int] = None,
+    product_id: Optional[int] = None,
+    db: Session = Depends(get_read_db)
+):
+    # Point in time: nearest snapshot before `at` + the movements after it
+    return ledger.stock_at(db, at, warehouse_id, product_id)
+
+@router.get("/ledger/", response_model=List[schemas.StockMovementOut])
+def read_movements(
+    response: Response,
+    stock_id: Optional[int] = None,
+    product_id: Optional[int] = None,
+    cursor: Optional[int] = Query(None, description="X-Next-Cursor from the previous page"),
+    limit: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_read_db)
+):
+    query = db.query(models.StockMovement)
+    if stock_id is not None:
+        query = query.filter(models.StockMovement.stock_id == stock_id)
+    if product_id is not None:
+        query = query.filter(models.StockMovement.product_id == product_id)
+    if cursor is not None:
+        query = query.filter(models.StockMovement.id > cursor)
+    rows = query.order_by(models.StockMovement.id).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = str(rows[-1].id)
+    return rows
+
+@router.post("/ledger/snapshot")
+def take_ledger_snapshot(db: Session = Depends(get_db)):
+    snapshot = ledger.take_snapshot(db)
+    if snapshot is None:
+        return {"status": "UNCHANGED"}
+    return {"status": "CREATED", "snapshot_id": snapshot.id, "as_of": snapshot.as_of, "rows": snapshot.rows}
+
+@router.get("/ledger/reconcile", response_model=List[schemas.LedgerDrift])
+def reconcile_ledger(full: bool = False, db: Session = Depends(get_read_db)):
+    # Empty list: every stock row matches the ledger
+    return ledger.reconcile(db, full=full)
+
 # --- DASHBOARD ROUTES ---
 
 @router.get("/stock/live/", response_model=List[schemas.StockView])
-def get_live_stock(db: Session = Depends(get_db)):
-    results = []
-    
-    # Query now includes is_quarantined
-    data = db.query(
-        Product.name, 
-        Product.sku_code, 
-        models.Batch.batch_number, 
-        models.Batch.expiry_date,
-        models.Bin.bin_code, 
-        models.Bin.is_cold_storage,
-        models.Stock.quantity,
-        models.Stock.is_quarantined # <--- Fetch this
-    ).join(models.Batch, models.Batch.product_id == Product.id)\
-     .join(models.Stock, models.Stock.batch_id == models.Batch.id)\
-     .join(models.Bin, models.Stock.bin_id == models.Bin.id)\
-     .filter(models.Stock.quantity > 0).all()
-
-    for row in data:
-        results.append({
-            "product_name": row[0],
-            "sku": row[1],
-            "batch_number": row[2],
-            "expiry_date": row[3],
-            "bin_code": row[4],
-            "is_cold_chain": row[5],
-            "quantity": row[6],
-            "is_quarantined": row[7] # <--- Map this
-        })
-    
-    return results
\ No newline at end of file
+def get_live_stock(
+    filters: queries.StockFilters = Depends(),
+    cursor: Optional[int] = Query(None, description="X-Next-Cursor from the previous page"),
+    limit: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_read_db)
+):
+    # Sequence of the change feed BEFORE reading: resume the event stream from here
+    headers = {"X-Event-Seq": str(events.bus.head())}
+
+    # Keyset pagination on stock id: every page costs the same, however deep
+    rows = queries.live_stock_query(db, filters, after_id=cursor).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = str(rows[-1].stock_id)
+
+    # Rows are the response shape already: straight to JSON, no per-row validation
+    return FastJSONResponse([row._asdict() for row in rows], headers=headers)
+
+@router.get("/stock/live/export")
+def export_live_stock(
+    filters: queries.StockFilters = Depends(),
+    format: str = Query("ndjson", pattern="^(ndjson|csv|arrow|parquet)$")
+):
+    """
+    Full filtered dump, streamed from a server-side cursor so memory stays flat; arrow (IPC
+    stream) and parquet are built a record batch at a time (need pyarrow).
+    The stream owns its session: it outlives the request dependency.
+    """
+    try:
+        exports.check_format(format)
+    except exports.Unavailable as exc:
+        raise HTTPException(status_code=501, detail=str(exc))
+
+    def stream():
+        db = ReadSessionLocal()
+        try:
+            yield from exports.live_stock(db, filters, format)
+        finally:
+            db.close()
+
+    return StreamingResponse(stream(), media_type=exports.MEDIA_TYPES[format], headers={
+        "Content-Disposition": f"attachment; filename=live_stock.{format}"
+    })
+
+@router.get("/stock/live/events")
+async def stream_stock_events(
+    request: Request,
+    warehouse_id: Optional[int] = None,
+    since: Optional[int] = Query(None, description="X-Event-Seq of the snapshot, or the last seq seen")
+):
+    """
+    Server-Sent Events with row-level deltas (stock.received, stock.quantity, stock.quarantined).
+    Each event's id is its seq; a `reset` event means the gap can't be replayed: re-snapshot.
+    """
+    # EventSource reconnects to the same URL with the last id it saw; that one wins
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        since = int(last_event_id)
+
+    # Subscribe before replaying so nothing falls between the two
+    subscription = events.bus.subscribe(warehouse_id)
+
+    def frame(payload):
+        return f"id: {payload['seq']}\nevent: {payload['type']}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+    def reset():
+        head = events.bus.head()
+        return head, f"event: reset\ndata: {json.dumps({'seq': head})}\n\n"
+
+    async def stream():
+        try:
+            last_seq = events.bus.head()
+            if since is not None:
+                backlog, complete = events.bus.replay(since)
+                if complete:
+                    for payload in backlog:
+                        if subscription.wants(payload):
+                            yield frame(payload)
+                        last_seq = payload["seq"]
+                    last_seq = max(last_seq, since)
+                else:
+                    last_seq, message = reset()
+                    yield message
+
+            while True:
+                if subscription.lagged:
+                    # Too slow to keep up: drop what's queued and make the client re-snapshot
+                    while not subscription.queue.empty():
+                        subscription.queue.get_nowait()
+                    subscription.lagged = False
+                    last_seq, message = reset()
+                    yield message
+                try:
+                    payload = await asyncio.wait_for(subscription.queue.get(), EVENT_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                if payload["seq"] > last_seq:
+                    last_seq = payload["seq"]
+                    yield frame(payload)
+        finally:
+            events.bus.unsubscribe(subscription)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
@@ -1,12 +1,13 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
-from datetime import date
+from datetime import date, datetime
 
 # --- Warehouse/Bin ---
 class BinCreate(BaseModel):
     bin_code: str
     is_cold_storage: bool = False
     warehouse_id: int
+    capacity: Optional[int] = Field(default=None, gt=0) # Units; default settings.default_bin_capacity
 
 class WarehouseCreate(BaseModel):
     name: str
@@ -23,8 +24,30 @@ class InboundTransaction(BaseModel):
     expiry_date: date
     mfg_date: Optional[date] = None
     mrp: float
-    quantity: int
-    target_bin_code: str # Operator scans the bin code
+    quantity: int = Field(gt=0)
+    target_bin_code: Optional[str] = None # Operator scans the bin code; empty = putaway picks one
+    warehouse_id: Optional[int] = None    # Only for putaway: where to look for a bin
+
+class GoodsReceivedNote(BaseModel):
+    """A whole truck: every line is received in one transaction."""
+    reference: Optional[str] = None # Supplier GRN / invoice number
+    lines: List[InboundTransaction] = Field(min_length=1, max_length=5000)
+
+class InboundLineResult(BaseModel):
+    index: int                      # Position of the line in the note
+    status: str                     # RECEIVED / REJECTED
+    batch_id: Optional[int] = None
+    stock_id: Optional[int] = None
+    bin: Optional[str] = None
+    new_quantity: Optional[int] = None
+    detail: Optional[str] = None
+    reason: Optional[str] = None    # Why REJECTED: NOT_FOUND / INCOMPATIBLE / NO_CAPACITY
+
+class InboundReceiptResponse(BaseModel):
+    reference: Optional[str] = None
+    received: int
+    rejected: int
+    results: List[InboundLineResult]
 
 class StockOut(BaseModel):
     id: int
@@ -39,9 +62,131 @@ class StockOut(BaseModel):
 class TelemetryData(BaseModel):
     bin_code: str
     temperature: float
+    recorded_at: Optional[datetime] = None # Sensor clock (UTC); defaults to time of receipt
+
+class TelemetryPoint(BaseModel):
+    t: datetime
+    min: float
+    max: float
+    avg: float
+    samples: int
+
+class TelemetryHistory(BaseModel):
+    bin_code: str
+    resolution: str # raw / 1m / 1h
+    points: List[TelemetryPoint]
+
+# --- Expiry (read from the expiry calendar) ---
+class ExpiryUnits(BaseModel):
+    sellable_units: int
+    quarantined_units: int
+
+class ExpiryBucket(ExpiryUnits):
+    within_days: int # Cumulative: expiring between today and today + within_days
+
+class ExpirySummary(BaseModel):
+    as_of: date
+    warehouse_id: Optional[int] = None
+    expired: ExpiryUnits
+    expiring: List[ExpiryBucket]
+
+class ExpiryMonth(BaseModel):
+    month: str # YYYY-MM, or "expired"
+    on_hand: int
+    quarantined: int
+
+class ExpiringProduct(BaseModel):
+    product_id: int
+    sku: Optional[str] = None
+    name: Optional[str] = None
+    earliest_expiry: date
+    days_left: int
+    sellable_units: int
+
+class ExpirySweepResult(BaseModel):
+    as_of: date
+    quarantined_rows: int
+    quarantined_units: int
+
+# --- Stock Ledger ---
+class StockAdjustment(BaseModel):
+    counted_quantity: int = Field(ge=0) # What the cycle count found
+    reason: str
+
+class StockAdjustmentResult(BaseModel):
+    stock_id: int
+    previous_quantity: int
+    quantity: int
+    delta: int
+
+class StockMovementOut(BaseModel):
+    id: int
+    created_at: datetime
+    movement_type: str # OPENING / RECEIPT / ALLOCATION / QUARANTINE / ADJUSTMENT
+    stock_id: int
+    product_id: int
+    warehouse_id: int
+    quantity_delta: int
+    quarantined_delta: int
+    reference: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class StockAtLine(BaseModel):
+    warehouse_id: int
+    product_id: int
+    sku: Optional[str] = None
+    name: Optional[str] = None
+    on_hand: int
+    quarantined: int
+
+class StockAt(BaseModel):
+    at: datetime
+    snapshot_id: Optional[int] = None # Snapshot the answer started from (None: whole journal)
+    snapshot_as_of: Optional[datetime] = None
+    lines: List[StockAtLine]
+
+class LedgerDrift(BaseModel):
+    stock_id: int
+    stock: dict
+    ledger: dict
+
+# --- Putaway ---
+class PutawayLine(BaseModel):
+    product_id: int
+    batch_number: Optional[str] = None # Consolidates with this batch's bins when given
+    quantity: int = Field(gt=0)
+
+class PutawayRequest(BaseModel):
+    warehouse_id: Optional[int] = None # Default: where the product already is, else the emptiest warehouse
+    lines: List[PutawayLine] = Field(min_length=1, max_length=5000)
+
+class PutawayPlacement(BaseModel):
+    bin_id: int
+    bin_code: str
+    quantity: int
+    reason: str # CONSOLIDATE / NEAR_BATCH / NEAR_PRODUCT / FIRST_FREE
+
+class PutawaySuggestion(BaseModel):
+    index: int
+    product_id: int
+    warehouse_id: Optional[int] = None
+    placements: List[PutawayPlacement]
+    unplaced: int = 0 # Units no bin had room for
+    detail: Optional[str] = None
+
+class BinCapacitySummary(BaseModel):
+    warehouse_id: int
+    is_cold_storage: bool
+    bins: int
+    capacity: int
+    used: int
+    free: int
 
 # --- UPDATED STOCK VIEW ---
 class StockView(BaseModel):
+    stock_id: int # Keyset cursor / delta key
     product_name: str
     sku: str
     batch_number: str
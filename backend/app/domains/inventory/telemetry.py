@@ -0,0 +1,484 @@
+"""
+Cold-chain telemetry: sensor readings in, audit history and excursion quarantines out.
+
+`process_readings` resolves bin codes through a per-process cache of bin profiles (bin id
+and the cold-chain limits of what it holds), feeds each reading to the excursion detector,
+and hands the raw points to the write buffer. The buffer writes them, plus 1m / 1h rollups,
+in batches in a session of its own; a point that fails to write stays buffered for the next
+flush. `history` serves raw points for short ranges and rollups for longer ones.
+
+Excursions: a breach is confirmed once it lasts EXCURSION_MIN_SECONDS, and the stock of the
+product in that bin is quarantined. The detector's open breaches live in process memory, so
+they assume one worker sees all readings of a bin. With several workers behind a load
+balancer, route a bin's sensors to one worker (sticky by bin code); otherwise a sustained
+breach whose readings alternate between workers may never be confirmed.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect, update, insert, bindparam, func
+from app.core.database import SessionLocal, dialect_insert
+from app.core import events
+from app.domains.inventory import models, ledger
+from app.domains.inventory.models import MovementType
+from app.domains.master.models import Product
+from app.domains.master.cache import cache as master_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_TEMP = 8.0     # °C, used when a cold-chain product has no max_temp
+PROFILE_TTL_SECONDS = 60   # Upper bound on staleness when another worker changed a bin
+
+# Excursions: quarantine only when a breach lasts this long (a single spike is ignored)
+EXCURSION_MIN_SECONDS = 300
+# A breach with no readings for this long is treated as over (sensor went quiet)
+EXCURSION_MAX_GAP_SECONDS = 600
+
+# Raw points are buffered and written in batches
+FLUSH_SIZE = 500
+FLUSH_SECONDS = 5.0
+
+ROLLUP_RESOLUTIONS = {"1m": timedelta(minutes=1), "1h": timedelta(hours=1)}
+
+
+@dataclass(frozen=True)
+class ColdChainLimit:
+    product_id: int
+    max_temp: float
+    min_temp: Optional[float]
+
+
+@dataclass(frozen=True)
+class BinProfile:
+    bin_id: int
+    limits: Tuple[ColdChainLimit, ...]  # Cold-chain products with sellable stock in the bin
+    max_safe: float                     # Readings inside [min_safe, max_safe] can't breach anything
+    min_safe: float
+    loaded_at: float
+
+
+class TelemetryCache:
+    """
+    Per-process cache for the telemetry hot path: bin_id -> cold-chain products stored
+    there with their limits (bin codes resolve through the master data cache).
+    Write paths that change what sits in a bin (or a product's limits) must invalidate it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._profiles: Dict[int, BinProfile] = {}
+
+    # --- Lookups ---
+
+    def bin_ids(self, db: Session, bin_codes) -> Dict[str, int]:
+        return {code: record.id for code, record in master_cache.bins(db, bin_codes).items()}
+
+    def profile(self, db: Session, bin_id: int) -> BinProfile:
+        cached = self._profiles.get(bin_id)
+        if cached and time.monotonic() - cached.loaded_at < PROFILE_TTL_SECONDS:
+            return cached
+
+        rows = db.query(Product.id, Product.max_temp, Product.min_temp)\
+            .join(models.Batch, models.Batch.product_id == Product.id)\
+            .join(models.Stock, models.Stock.batch_id == models.Batch.id)\
+            .filter(models.Stock.bin_id == bin_id)\
+            .filter(models.Stock.quantity > 0)\
+            .filter(models.Stock.is_quarantined == False)\
+            .filter(Product.requires_cold_chain == True)\
+            .distinct().all()
+
+        limits = tuple(
+            ColdChainLimit(product_id, max_temp or DEFAULT_MAX_TEMP, min_temp)
+            for product_id, max_temp, min_temp in rows
+        )
+        profile = BinProfile(
+            bin_id=bin_id,
+            limits=limits,
+            max_safe=min((limit.max_temp for limit in limits), default=float("inf")),
+            min_safe=max((limit.min_temp for limit in limits if limit.min_temp is not None), default=float("-inf")),
+            loaded_at=time.monotonic()
+        )
+        with self._lock:
+            self._profiles[bin_id] = profile
+        return profile
+
+    # --- Invalidation ---
+
+    def invalidate_bin(self, bin_id: int):
+        with self._lock:
+            self._profiles.pop(bin_id, None)
+
+    def invalidate_product(self, product_id: int):
+        with self._lock:
+            for bin_id, profile in list(self._profiles.items()):
+                if any(limit.product_id == product_id for limit in profile.limits):
+                    del self._profiles[bin_id]
+
+    def clear(self):
+        with self._lock:
+            self._profiles = {}
+
+
+cache = TelemetryCache()
+
+
+@event.listens_for(Product, "after_update")
+def _product_limits_changed(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[attr].history.has_changes() for attr in ("max_temp", "min_temp", "requires_cold_chain")):
+        cache.invalidate_product(target.id)
+
+
+# --- EXCURSION DETECTOR ---
+
+@dataclass
+class _OpenExcursion:
+    kind: str          # HIGH / LOW
+    limit_temp: float
+    started_at: datetime
+    last_seen: datetime
+    peak_temp: float
+
+
+class ExcursionDetector:
+    """
+    Tracks breaches per (bin, product) in memory. A breach becomes an excursion once it
+    has lasted EXCURSION_MIN_SECONDS; any in-range reading for the bin ends it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._open: Dict[Tuple[int, int], _OpenExcursion] = {}
+
+    def observe(self, bin_id: int, limit: ColdChainLimit, temperature: float, at: datetime) -> Optional[_OpenExcursion]:
+        """Feeds one reading for one product; returns the excursion once it is confirmed."""
+        key = (bin_id, limit.product_id)
+        if temperature > limit.max_temp:
+            kind, limit_temp = "HIGH", limit.max_temp
+        elif limit.min_temp is not None and temperature < limit.min_temp:
+            kind, limit_temp = "LOW", limit.min_temp
+        else:
+            with self._lock:
+                self._open.pop(key, None)
+            return None
+
+        with self._lock:
+            current = self._open.get(key)
+            if (current is None or current.kind != kind
+                    or (at - current.last_seen).total_seconds() > EXCURSION_MAX_GAP_SECONDS):
+                current = _OpenExcursion(kind, limit_temp, at, at, temperature)
+                self._open[key] = current
+            current.last_seen = max(current.last_seen, at)
+            current.peak_temp = max(current.peak_temp, temperature) if kind == "HIGH" else min(current.peak_temp, temperature)
+
+            if (current.last_seen - current.started_at).total_seconds() >= EXCURSION_MIN_SECONDS:
+                del self._open[key]
+                return current
+        return None
+
+    def clear_bin(self, bin_id: int):
+        with self._lock:
+            for key in [key for key in self._open if key[0] == bin_id]:
+                del self._open[key]
+
+    def watching(self, bin_id: int):
+        with self._lock:
+            return [
+                {"product_id": product_id, "kind": exc.kind, "since": exc.started_at}
+                for (b, product_id), exc in self._open.items() if b == bin_id
+            ]
+
+
+detector = ExcursionDetector()
+
+
+# --- TIME-SERIES WRITER ---
+
+def _bucket(at: datetime, resolution: str) -> datetime:
+    if resolution == "1m":
+        return at.replace(second=0, microsecond=0)
+    return at.replace(minute=0, second=0, microsecond=0)
+
+
+class TelemetryBuffer:
+    """
+    Collects raw points and writes them (plus 1m/1h rollups) in batches, in a session of
+    its own so sensor history never rides on the request's transaction. Ingestion flushes
+    when a batch is due; the flusher thread covers sensors that went quiet.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._points: List[Tuple[int, datetime, float]] = []
+        self._oldest: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Per process: the buffer is in memory, so every worker flushes its own."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._flush_loop, name="telemetry-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops the flusher and writes whatever is left."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def _flush_loop(self):
+        while not self._stop.wait(FLUSH_SECONDS):
+            self.flush_if_due()
+
+    def add(self, points):
+        with self._lock:
+            if not self._points:
+                self._oldest = time.monotonic()
+            self._points.extend(points)
+
+    def flush_if_due(self):
+        with self._lock:
+            due = self._points and (
+                len(self._points) >= FLUSH_SIZE or time.monotonic() - self._oldest >= FLUSH_SECONDS
+            )
+        if due:
+            try:
+                self.flush()
+            except Exception:
+                # The points stay buffered; ingestion carries on and the next flush retries
+                logger.exception("Telemetry flush failed, %s point(s) kept for retry", len(self._points))
+
+    def flush(self):
+        with self._lock:
+            points, self._points = self._points, []
+        if not points:
+            return
+
+        db = SessionLocal()
+        try:
+            write_points(db, points)
+            db.commit()
+        except Exception:
+            # Audit history: keep the points (ahead of newer ones) for the next flush
+            with self._lock:
+                self._points = points + self._points
+                self._oldest = time.monotonic()
+            raise
+        finally:
+            db.close()
+
+
+buffer = TelemetryBuffer()
+
+
+def write_points(db: Session, points):
+    """Appends raw points and merges them into the rollup buckets (INSERT ... ON CONFLICT)."""
+    db.execute(insert(models.TelemetryReading), [
+        {"bin_id": bin_id, "recorded_at": at, "temperature": temperature}
+        for bin_id, at, temperature in points
+    ])
+
+    buckets = {}
+    for bin_id, at, temperature in points:
+        for resolution in ROLLUP_RESOLUTIONS:
+            key = (bin_id, resolution, _bucket(at, resolution))
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = [temperature, temperature, temperature, 1]
+            else:
+                bucket[0] = min(bucket[0], temperature)
+                bucket[1] = max(bucket[1], temperature)
+                bucket[2] += temperature
+                bucket[3] += 1
+
+    is_postgres = db.get_bind().dialect.name == "postgresql"
+    lowest = func.least if is_postgres else func.min
+    highest = func.greatest if is_postgres else func.max
+
+    table = models.TelemetryRollup.__table__
+    stmt = dialect_insert(db)(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.bin_id, table.c.resolution, table.c.bucket_start],
+        set_={
+            "min_temp": lowest(table.c.min_temp, stmt.excluded.min_temp),
+            "max_temp": highest(table.c.max_temp, stmt.excluded.max_temp),
+            "sum_temp": table.c.sum_temp + stmt.excluded.sum_temp,
+            "samples": table.c.samples + stmt.excluded.samples
+        }
+    )
+    db.execute(stmt, [
+        {
+            "bin_id": bin_id, "resolution": resolution, "bucket_start": start,
+            "min_temp": lo, "max_temp": hi, "sum_temp": total, "samples": samples
+        }
+        for (bin_id, resolution, start), (lo, hi, total, samples) in buckets.items()
+    ])
+
+
+def _utc(at: Optional[datetime]) -> datetime:
+    if at is None:
+        return datetime.utcnow()
+    if at.tzinfo is not None:
+        return at.astimezone(timezone.utc).replace(tzinfo=None)
+    return at
+
+
+# --- INGESTION ---
+
+def process_readings(db: Session, readings) -> dict:
+    """
+    Evaluates a batch of readings. In-range readings only touch in-memory state (cache,
+    detector, write buffer); sustained excursions are quarantined with one executemany
+    UPDATE and recorded in telemetry_excursions. The caller commits.
+    """
+    # 1. Resolve bins from the cache
+    bin_ids = cache.bin_ids(db, list({reading.bin_code for reading in readings}))
+    unknown_bins = sorted({reading.bin_code for reading in readings if reading.bin_code not in bin_ids})
+
+    per_bin = {}
+    for reading in readings:
+        if reading.bin_code in bin_ids:
+            per_bin.setdefault(bin_ids[reading.bin_code], []).append((_utc(reading.recorded_at), reading.temperature))
+
+    # 2. History goes to the batch writer
+    buffer.add((bin_id, at, temperature) for bin_id, points in per_bin.items() for at, temperature in points)
+
+    # 3. Feed the detector in time order; nominal readings never reach the DB
+    breaches = {}     # (bin_id, product_id) -> reason
+    excursions = []
+    for bin_id, points in per_bin.items():
+        profile = cache.profile(db, bin_id)
+        for at, temperature in sorted(points):
+            if profile.min_safe <= temperature <= profile.max_safe:
+                detector.clear_bin(bin_id)
+                continue
+            for limit in profile.limits:
+                if (bin_id, limit.product_id) in breaches:
+                    continue  # Already confirmed in this batch
+                confirmed = detector.observe(bin_id, limit, temperature, at)
+                if confirmed:
+                    seconds = int((confirmed.last_seen - confirmed.started_at).total_seconds())
+                    breaches[(bin_id, limit.product_id)] = (
+                        f"Temp Excursion: {confirmed.kind} {confirmed.peak_temp}°C for {seconds}s "
+                        f"(Limit: {confirmed.limit_temp}°C)"
+                    )
+                    excursions.append({
+                        "bin_id": bin_id,
+                        "product_id": limit.product_id,
+                        "kind": confirmed.kind,
+                        "limit_temp": confirmed.limit_temp,
+                        "peak_temp": confirmed.peak_temp,
+                        "started_at": confirmed.started_at,
+                        "confirmed_at": confirmed.last_seen
+                    })
+
+    buffer.flush_if_due()
+
+    codes = {bin_id: code for code, bin_id in bin_ids.items()}
+    watching = [
+        {"bin_code": codes[bin_id], **entry}
+        for bin_id in per_bin for entry in detector.watching(bin_id)
+    ]
+    if not breaches:
+        return {"quarantined": [], "watching": watching, "unknown_bins": unknown_bins}
+
+    # 4. Affected stock rows for every breached (bin, product) pair in one query
+    breached_bins = {bin_id for bin_id, _ in breaches}
+    breached_products = {product_id for _, product_id in breaches}
+    rows = db.query(
+        models.Stock.id, models.Stock.bin_id, models.Bin.warehouse_id, models.Stock.quantity,
+        models.Batch.product_id, models.Batch.batch_number, models.Batch.expiry_date
+    ).join(models.Batch, models.Stock.batch_id == models.Batch.id)\
+     .join(models.Bin, models.Stock.bin_id == models.Bin.id)\
+     .filter(models.Stock.bin_id.in_(breached_bins))\
+     .filter(models.Batch.product_id.in_(breached_products))\
+     .filter(models.Stock.is_quarantined == False)\
+     .all()
+    rows = [row for row in rows if (row.bin_id, row.product_id) in breaches]
+
+    # 5. Lock them all in one statement, keep the audit record
+    if rows:
+        stocks = models.Stock.__table__
+        db.execute(
+            update(stocks)
+            .where(stocks.c.id == bindparam("stock_id"))
+            .values(is_quarantined=True, quarantine_reason=bindparam("reason")),
+            [{"stock_id": row.id, "reason": breaches[(row.bin_id, row.product_id)]} for row in rows]
+        )
+        ledger.post(db, (
+            ledger.Movement(
+                MovementType.QUARANTINE, row.id, row.product_id, row.warehouse_id, row.expiry_date,
+                quarantined_delta=row.quantity, reference=breaches[(row.bin_id, row.product_id)]
+            )
+            for row in rows
+        ))
+        events.stage(db, *(
+            {
+                "type": "stock.quarantined",
+                "warehouse_id": row.warehouse_id,
+                "stock_id": row.id,
+                "reason": breaches[(row.bin_id, row.product_id)]
+            }
+            for row in rows
+        ))
+    db.execute(insert(models.TelemetryExcursion), excursions)
+
+    for bin_id in breached_bins:
+        cache.invalidate_bin(bin_id)
+
+    quarantined = {}
+    for row in rows:
+        quarantined.setdefault(codes[row.bin_id], []).append(row.batch_number)
+    return {
+        "quarantined": [{"bin_code": code, "batches": batches} for code, batches in quarantined.items()],
+        "watching": watching,
+        "unknown_bins": unknown_bins
+    }
+
+
+# --- QUERIES ---
+
+def history(db: Session, bin_id: int, start: datetime, end: datetime, resolution: str = "auto"):
+    """
+    Reads the cheapest series for the span: raw points for short windows, 1m buckets up to
+    two weeks, 1h buckets beyond. Points still in the write buffer (a few seconds) are not included.
+    """
+    start, end = _utc(start), _utc(end)
+    if resolution == "auto":
+        span = end - start
+        if span <= timedelta(hours=6):
+            resolution = "raw"
+        elif span <= timedelta(days=14):
+            resolution = "1m"
+        else:
+            resolution = "1h"
+
+    if resolution == "raw":
+        rows = db.query(models.TelemetryReading.recorded_at, models.TelemetryReading.temperature)\
+            .filter(models.TelemetryReading.bin_id == bin_id)\
+            .filter(models.TelemetryReading.recorded_at >= start)\
+            .filter(models.TelemetryReading.recorded_at < end)\
+            .order_by(models.TelemetryReading.recorded_at).all()
+        points = [{"t": at, "min": temp, "max": temp, "avg": temp, "samples": 1} for at, temp in rows]
+        return resolution, points
+
+    rollup = models.TelemetryRollup
+    rows = db.query(rollup.bucket_start, rollup.min_temp, rollup.max_temp, rollup.sum_temp, rollup.samples)\
+        .filter(rollup.bin_id == bin_id)\
+        .filter(rollup.resolution == resolution)\
+        .filter(rollup.bucket_start >= _bucket(start, resolution))\
+        .filter(rollup.bucket_start < end)\
+        .order_by(rollup.bucket_start).all()
+    points = [
+        {"t": bucket, "min": lo, "max": hi, "avg": round(total / samples, 3), "samples": samples}
+        for bucket, lo, hi, total, samples in rows
+    ]
+    return resolution, points
@@ -0,0 +1,52 @@
+from sqlalchemy import Column, Integer, String, Float, Text, Boolean, DateTime, LargeBinary, Index, ForeignKey
+from app.core.database import Base
+import enum
+
+class JobStatus(str, enum.Enum):
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    SUCCEEDED = "SUCCEEDED"
+    FAILED = "FAILED"
+    CANCELLED = "CANCELLED"
+
+class Job(Base):
+    """One run of a registered task (see jobs/runner.py). Params are JSON; the result is in job_result_chunks."""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_id", "status", "id"),  # Claiming: oldest QUEUED first
+        Index("ix_jobs_kind_finished", "kind", "finished_at"),  # Latest result of a kind
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)
+    status = Column(String, default=JobStatus.QUEUED, nullable=False)
+    params = Column(Text, nullable=False, default="{}")
+    schedule = Column(String, nullable=True)  # Schedule that enqueued it; NULL = submitted through the API
+    worker = Column(String, nullable=True)    # host:pid of the process running it
+    progress = Column(Float, nullable=False, default=0.0)  # 0..1
+    progress_message = Column(String, nullable=True)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    content_type = Column(String, nullable=True)  # Of the result; JSON unless the task returned an Output
+    result_bytes = Column(Integer, nullable=True)  # Uncompressed size
+    error = Column(Text, nullable=True)
+    # All UTC
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)  # Progress reports; stale RUNNING jobs are failed
+    finished_at = Column(DateTime, nullable=True)
+
+class JobResultChunk(Base):
+    """A job's result as one zlib stream split over rows, written and served a chunk at a time."""
+    __tablename__ = "job_result_chunks"
+
+    job_id = Column(Integer, ForeignKey("jobs.id"), primary_key=True)
+    seq = Column(Integer, primary_key=True)
+    data = Column(LargeBinary, nullable=False)
+
+class JobSchedule(Base):
+    """Next due time per schedule. Workers race on an UPDATE of next_run_at, so each run is enqueued once."""
+    __tablename__ = "job_schedules"
+
+    name = Column(String, primary_key=True)
+    next_run_at = Column(DateTime, nullable=False)  # UTC
+    last_job_id = Column(Integer, nullable=True)
@@ -0,0 +1,86 @@
+import json
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from app.core.database import get_db, get_read_db
+from app.core.metrics import ProfiledRoute
+from app.domains.inventory import exports
+from app.domains.jobs import schemas, tasks  # tasks: registers the job kinds
+from app.domains.jobs.models import Job, JobStatus
+from app.domains.jobs.runner import runner, submit, cancel, kinds, result_chunks
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["Background Jobs"],
+    route_class=ProfiledRoute
+)
+
+EXTENSIONS = {"application/json": "json", **{media_type: name for name, media_type in exports.MEDIA_TYPES.items()}}
+
+
+def _out(job: Job) -> schemas.JobOut:
+    return schemas.JobOut(
+        id=job.id, kind=job.kind, status=job.status, params=json.loads(job.params), schedule=job.schedule,
+        progress=job.progress, progress_message=job.progress_message, cancel_requested=job.cancel_requested,
+        content_type=job.content_type, result_bytes=job.result_bytes, error=job.error,
+        created_at=job.created_at, started_at=job.started_at, finished_at=job.finished_at
+    )
+
+@router.get("/kinds")
+def list_kinds():
+    return kinds()
+
+@router.post("/", response_model=schemas.JobOut, status_code=202)
+def submit_job(request: schemas.JobSubmit, db: Session = Depends(get_db)):
+    # Queued for the worker pool; poll GET /jobs/{id}, then fetch /jobs/{id}/result
+    try:
+        job = submit(db, request.kind, request.params)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    db.commit()
+    runner.wake()
+    return _out(job)
+
+@router.get("/", response_model=List[schemas.JobOut])
+def list_jobs(
+    kind: Optional[str] = None,
+    status: Optional[JobStatus] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_read_db)
+):
+    query = db.query(Job)
+    if kind:
+        query = query.filter(Job.kind == kind)
+    if status:
+        query = query.filter(Job.status == status)
+    return [_out(job) for job in query.order_by(Job.id.desc()).limit(limit)]
+
+@router.get("/{job_id}", response_model=schemas.JobOut)
+def get_job(job_id: int, db: Session = Depends(get_db)):
+    # Primary, not replica: pollers expect to see progress as soon as it is written
+    job = db.get(Job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _out(job)
+
+@router.get("/{job_id}/result")
+def get_job_result(job_id: int, db: Session = Depends(get_db)):
+    job = db.get(Job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status != JobStatus.SUCCEEDED:
+        raise HTTPException(status_code=409, detail={"message": "Job has no result", "status": job.status})
+    extension = EXTENSIONS.get(job.content_type, "bin")
+    return StreamingResponse(
+        result_chunks(job.id), media_type=job.content_type,
+        headers={"Content-Disposition": f'inline; filename="{job.kind}-{job.id}.{extension}"'}
+    )
+
+@router.post("/{job_id}/cancel", response_model=schemas.JobOut)
+def cancel_job(job_id: int, db: Session = Depends(get_db)):
+    job = cancel(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    db.commit()
+    return _out(job)
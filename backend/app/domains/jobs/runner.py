@@ -0,0 +1,503 @@
+"""
+Background jobs: heavy or periodic work runs here instead of inside an API request.
+
+A job is a row in `jobs` naming a registered task and its JSON params. Workers claim QUEUED
+rows with a conditional UPDATE (so several processes can share the table), run the task in a
+thread pool, and store the result as a compressed stream in `job_result_chunks`, written as the
+task produces it and served from there by `/jobs/{id}/result` a chunk at a time.
+Tasks report progress through their JobContext; each report doubles as a heartbeat and a
+cancellation point. RUNNING jobs whose heartbeat goes quiet for PHARMA_JOB_STALE_SECONDS
+(a worker that died) are marked FAILED.
+
+Schedules enqueue jobs on a cron expression (`*/15 * * * *`, UTC) or a fixed interval. The
+next due time lives in `job_schedules`; the worker that moves it forward enqueues the run,
+so a schedule fires once however many processes run workers. A run is skipped while the
+previous one of the same schedule is still queued or running.
+
+Threads, not processes: tasks spend their time in SQL and numpy (both release the GIL) and
+share the process's caches. PHARMA_JOB_WORKERS=0 turns the runner off in a process that
+should only serve requests.
+"""
+import inspect
+import json
+import logging
+import os
+import socket
+import threading
+import traceback
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Set, Union
+from sqlalchemy import update, delete, insert, select, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.config import get_settings
+from app.core.encoding import dumps
+from app.core.database import SessionLocal
+from app.domains.jobs.models import Job, JobResultChunk, JobSchedule, JobStatus
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_INTERVAL_SECONDS = 1.0  # Progress writes are throttled to one per interval
+HEARTBEAT_SECONDS = 15           # Runner refreshes heartbeat_at of its jobs at least this often
+MAX_ERROR_LENGTH = 4000
+RESULT_CHUNK_BYTES = 256 * 1024  # Compressed bytes per job_result_chunks row
+JSON = "application/json"
+
+FINISHED = (JobStatus.SUCCEEDED, JobStatus.FAILED, JobStatus.CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised from JobContext.progress once a cancel was requested."""
+
+
+class _ShuttingDown(Exception):
+    """Raised from JobContext.progress when the runner stops; the job goes back to the queue."""
+
+
+@dataclass
+class Output:
+    """A non-JSON result (e.g. a CSV export); chunks are compressed as they are produced."""
+    content_type: str
+    chunks: Iterable[Union[bytes, str]]
+
+
+# --- REGISTRY ---
+
+_tasks: Dict[str, Callable] = {}
+
+def task(kind: str):
+    """Registers `fn(ctx, **params)` as the task for `kind`."""
+    def register(fn):
+        _tasks[kind] = fn
+        return fn
+    return register
+
+def kinds() -> Dict[str, str]:
+    return {kind: (inspect.getdoc(fn) or "").split("\n")[0] for kind, fn in sorted(_tasks.items())}
+
+def _params_json(kind: str, params: Optional[dict]) -> str:
+    """Validates params against the task signature; canonical JSON (defaults filled in) so equal params compare equal."""
+    if kind not in _tasks:
+        raise ValueError(f"Unknown job kind {kind!r}")
+    try:
+        bound = inspect.signature(_tasks[kind]).bind(None, **(params or {}))
+    except TypeError as exc:
+        raise ValueError(f"Bad params for {kind}: {exc}")
+    bound.apply_defaults()
+    return json.dumps(dict(list(bound.arguments.items())[1:]), sort_keys=True, default=str)
+
+
+# --- CONTEXT ---
+
+class JobContext:
+    """Handed to the task: progress reporting (heartbeat + cancellation point)."""
+
+    def __init__(self, job_id: int, stopping: Optional[threading.Event] = None):
+        self.job_id = job_id
+        self._stopping = stopping
+        self._last_report = 0.0
+
+    def progress(self, fraction: float, message: Optional[str] = None, force: bool = False):
+        if self._stopping is not None and self._stopping.is_set():
+            raise _ShuttingDown()
+        now = datetime.utcnow()
+        if not force and (now.timestamp() - self._last_report) < PROGRESS_INTERVAL_SECONDS:
+            return
+        self._last_report = now.timestamp()
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(Job).where(Job.id == self.job_id)
+                .values(progress=max(0.0, min(1.0, fraction)), progress_message=message, heartbeat_at=now)
+            )
+            cancelled = db.query(Job.cancel_requested).filter(Job.id == self.job_id).scalar()
+            db.commit()
+        finally:
+            db.close()
+        if cancelled:
+            raise JobCancelled()
+
+
+# --- QUEUE ---
+
+def submit(db: Session, kind: str, params: Optional[dict] = None, schedule: Optional[str] = None) -> Job:
+    """Queues a job (ValueError for an unknown kind or bad params). The caller commits, then calls runner.wake()."""
+    job = Job(
+        kind=kind, params=_params_json(kind, params), schedule=schedule,
+        status=JobStatus.QUEUED, created_at=datetime.utcnow()
+    )
+    db.add(job)
+    db.flush()
+    return job
+
+def cancel(db: Session, job_id: int) -> Optional[Job]:
+    """QUEUED jobs are cancelled at once; RUNNING ones at their next progress report. The caller commits."""
+    job = db.get(Job, job_id)
+    if job is None:
+        return None
+    if job.status == JobStatus.QUEUED:
+        cancelled = db.execute(
+            update(Job).where(Job.id == job_id).where(Job.status == JobStatus.QUEUED)
+            .values(status=JobStatus.CANCELLED, finished_at=datetime.utcnow())
+        ).rowcount
+        if cancelled:
+            db.refresh(job)
+            return job
+    if job.status == JobStatus.RUNNING:
+        job.cancel_requested = True
+        db.flush()
+    return job
+
+def latest_result(db: Session, kind: str, params: Optional[dict] = None) -> Optional[Job]:
+    """Most recent SUCCEEDED job of `kind` with exactly these params."""
+    return db.query(Job)\
+        .filter(Job.kind == kind, Job.status == JobStatus.SUCCEEDED, Job.params == _params_json(kind, params))\
+        .order_by(Job.finished_at.desc())\
+        .first()
+
+def result_chunks(job_id: int, rows_per_read: int = 8) -> Iterable[bytes]:
+    """
+    The stored result, decompressed a chunk at a time. Reads in a session of its own (a
+    streaming response outlives the request's), a few rows per query.
+    """
+    inflate = zlib.decompressobj()
+    db = SessionLocal()
+    try:
+        last_seq = -1
+        while True:
+            rows = db.execute(
+                select(JobResultChunk.seq, JobResultChunk.data)
+                .where(JobResultChunk.job_id == job_id, JobResultChunk.seq > last_seq)
+                .order_by(JobResultChunk.seq)
+                .limit(rows_per_read)
+            ).all()
+            for last_seq, data in rows:
+                yield inflate.decompress(data)
+            if len(rows) < rows_per_read:
+                break
+    finally:
+        db.close()
+    yield inflate.flush()
+
+def counts(db: Session) -> Dict[str, int]:
+    return dict(db.query(Job.status, func.count(Job.id)).group_by(Job.status))
+
+def _claim(db: Session, worker: str) -> Optional[Job]:
+    """Oldest QUEUED job, claimed with a conditional UPDATE (another worker may win the row)."""
+    candidates = db.query(Job.id)\
+        .filter(Job.status == JobStatus.QUEUED)\
+        .order_by(Job.id)\
+        .limit(5).all()
+    now = datetime.utcnow()
+    for (job_id,) in candidates:
+        claimed = db.execute(
+            update(Job).where(Job.id == job_id).where(Job.status == JobStatus.QUEUED)
+            .values(status=JobStatus.RUNNING, worker=worker, started_at=now, heartbeat_at=now)
+        ).rowcount
+        db.commit()
+        if claimed:
+            return db.get(Job, job_id)
+    return None
+
+def _finish(job_id: int, status: str, values: Optional[dict] = None, error: Optional[str] = None):
+    values = dict(values or {}, status=status, error=error)
+    if status == JobStatus.QUEUED:
+        values.update(worker=None, started_at=None, heartbeat_at=None, progress=0.0, progress_message=None)
+    else:
+        values["finished_at"] = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        db.execute(update(Job).where(Job.id == job_id).values(**values))
+        db.commit()
+    finally:
+        db.close()
+
+def _discard_result(db: Session, job_ids) -> None:
+    db.execute(delete(JobResultChunk).where(JobResultChunk.job_id.in_(job_ids)))
+
+def _store_result(job_id: int, output) -> dict:
+    """
+    Compresses the task's output into job_result_chunks as it is produced, so a large export
+    never sits in memory whole. Each row commits on its own (a long write transaction would
+    block progress reports on SQLite); a failed or requeued run drops its partial rows.
+    """
+    if isinstance(output, Output):
+        content_type, chunks = output.content_type, output.chunks
+    else:
+        content_type, chunks = JSON, [dumps(output)]
+    db = SessionLocal()
+    try:
+        _discard_result(db, [job_id])  # Left by an earlier attempt
+        db.commit()
+        deflate, pending, seq, size = zlib.compressobj(6), bytearray(), 0, 0
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            size += len(chunk)
+            pending += deflate.compress(chunk)
+            if len(pending) >= RESULT_CHUNK_BYTES:
+                db.execute(insert(JobResultChunk).values(job_id=job_id, seq=seq, data=bytes(pending)))
+                db.commit()
+                pending, seq = bytearray(), seq + 1
+        pending += deflate.flush()
+        db.execute(insert(JobResultChunk).values(job_id=job_id, seq=seq, data=bytes(pending)))
+        db.commit()
+    except Exception:
+        db.rollback()
+        _discard_result(db, [job_id])
+        db.commit()
+        raise
+    finally:
+        db.close()
+    return {"content_type": content_type, "result_bytes": size}
+
+
+# --- SCHEDULES ---
+
+class Cron:
+    """Five-field cron expression (minute hour day-of-month month day-of-week), UTC; `*`, `*/n`, `a-b`, `a-b/n` and lists."""
+
+    RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            self._field(text, lo, hi) for text, (lo, hi) in zip(fields, self.RANGES)
+        )
+        self.weekdays = {0 if day == 7 else day for day in self.weekdays}
+        # Classic cron: when both day fields are restricted, either one matching is enough
+        self._any_day = fields[2] == "*" or fields[4] == "*"
+
+    @staticmethod
+    def _field(text: str, lo: int, hi: int) -> Set[int]:
+        values = set()
+        for part in text.split(","):
+            span, _, step = part.partition("/")
+            if span == "*":
+                start, end = lo, hi
+            elif "-" in span:
+                start, end = (int(value) for value in span.split("-"))
+            else:
+                start = end = int(span)
+                if step:
+                    end = hi
+            if start < lo or end > (7 if hi == 6 else hi) or start > end:
+                raise ValueError(f"Cron field {text!r} out of range {lo}-{hi}")
+            values.update(range(start, end + 1, int(step or 1)))
+        return values
+
+    def _day_matches(self, day: datetime) -> bool:
+        in_month = day.day in self.days
+        in_week = (day.weekday() + 1) % 7 in self.weekdays  # cron: 0 = Sunday
+        return (in_month and in_week) if self._any_day else (in_month or in_week)
+
+    def next_after(self, after: datetime) -> datetime:
+        start = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = start.replace(hour=0, minute=0)
+        for _ in range(366 * 5):
+            if day.month in self.months and self._day_matches(day):
+                for hour in sorted(self.hours):
+                    for minute in sorted(self.minutes):
+                        at = day.replace(hour=hour, minute=minute)
+                        if at >= start:
+                            return at
+            day += timedelta(days=1)
+        raise ValueError(f"Cron expression never fires: {self.expression!r}")
+
+
+@dataclass
+class Schedule:
+    name: str
+    kind: str
+    cron: Optional[Cron] = None
+    every: Optional[int] = None  # Seconds; the first run is due at once
+    params: dict = field(default_factory=dict)
+
+    def first_run(self, now: datetime) -> datetime:
+        return self.cron.next_after(now) if self.cron else now
+
+    def next_run(self, now: datetime) -> datetime:
+        # From now, not from the missed due time: no catch-up storm after downtime
+        return self.cron.next_after(now) if self.cron else now + timedelta(seconds=self.every)
+
+
+def _enqueue_due(db: Session, schedules: List[Schedule], now: datetime) -> List[int]:
+    queued = []
+    for schedule in schedules:
+        row = db.get(JobSchedule, schedule.name)
+        if row is None:
+            db.add(JobSchedule(name=schedule.name, next_run_at=schedule.first_run(now)))
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()  # Another worker registered it first
+            row = db.get(JobSchedule, schedule.name)
+        if row.next_run_at > now:
+            continue
+        moved = db.execute(
+            update(JobSchedule)
+            .where(JobSchedule.name == schedule.name)
+            .where(JobSchedule.next_run_at == row.next_run_at)
+            .values(next_run_at=schedule.next_run(now))
+        ).rowcount
+        if not moved:
+            db.rollback()
+            continue
+        busy = db.query(Job.id)\
+            .filter(Job.schedule == schedule.name, Job.status.in_((JobStatus.QUEUED, JobStatus.RUNNING)))\
+            .first()
+        if busy is None:
+            job = submit(db, schedule.kind, schedule.params, schedule=schedule.name)
+            db.execute(update(JobSchedule).where(JobSchedule.name == schedule.name).values(last_job_id=job.id))
+            queued.append(job.id)
+        else:
+            logger.info("Schedule %s: previous run %s still active, skipped", schedule.name, busy.id)
+        db.commit()
+    db.expire_all()
+    return queued
+
+def _fail_stale(db: Session, now: datetime) -> int:
+    cutoff = now - timedelta(seconds=get_settings().job_stale_seconds)
+    failed = db.execute(
+        update(Job)
+        .where(Job.status == JobStatus.RUNNING)
+        .where(Job.heartbeat_at < cutoff)
+        .values(status=JobStatus.FAILED, finished_at=now, error="Worker lost (no heartbeat)")
+    ).rowcount
+    db.commit()
+    return failed
+
+def prune(db: Session, now: Optional[datetime] = None) -> int:
+    """Deletes finished jobs older than PHARMA_JOB_RETENTION_DAYS. The caller commits."""
+    cutoff = (now or datetime.utcnow()) - timedelta(days=get_settings().job_retention_days)
+    expired = select(Job.id).where(Job.status.in_(FINISHED)).where(Job.finished_at < cutoff)
+    _discard_result(db, expired)
+    return db.execute(delete(Job).where(Job.id.in_(expired))).rowcount
+
+
+# --- RUNNER ---
+
+class Runner:
+    """Scheduler + claim loop in one thread, tasks in a thread pool."""
+
+    def __init__(self):
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        self.schedules: Dict[str, Schedule] = {}
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._running: Dict[int, Future] = {}  # job_id -> future, claimed by this process
+        self._workers = 0
+        self._last_heartbeat = datetime.min
+        self._last_prune = datetime.min
+
+    def add_schedule(self, name: str, kind: str, cron: Optional[str] = None, every: Optional[int] = None,
+                     params: Optional[dict] = None):
+        """Adds (or replaces) a schedule; an empty cron / non-positive interval disables it."""
+        if not cron and not (every and every > 0):
+            self.schedules.pop(name, None)
+            return
+        _params_json(kind, params)
+        self.schedules[name] = Schedule(name, kind, Cron(cron) if cron else None, every, params or {})
+
+    def start(self, workers: int):
+        if workers <= 0 or self._thread is not None:
+            return
+        self._workers = workers
+        self._stop.clear()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._thread = threading.Thread(target=self._loop, name="job-runner", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops claiming. Claimed jobs that haven't started go straight back to the queue;
+        running tasks are requeued at their next progress report.
+        """
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=5)
+        with self._lock:
+            waiting = [job_id for job_id, future in self._running.items() if future.cancel()]
+            for job_id in waiting:
+                del self._running[job_id]
+        for job_id in waiting:
+            _finish(job_id, JobStatus.QUEUED)
+        self._pool.shutdown(wait=False)
+        self._thread, self._pool = None, None
+
+    def wake(self):
+        """Check for work now (a job was just submitted)."""
+        self._wake.set()
+
+    def _loop(self):
+        poll = get_settings().job_poll_seconds
+        while not self._stop.is_set():
+            try:
+                self._tick()
+            except Exception:
+                logger.exception("Job runner tick failed")
+            self._wake.wait(poll)
+            self._wake.clear()
+
+    def _tick(self):
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            _enqueue_due(db, list(self.schedules.values()), now)
+            if (now - self._last_heartbeat).total_seconds() >= HEARTBEAT_SECONDS:
+                self._heartbeat(db, now)
+                _fail_stale(db, now)
+            if (now - self._last_prune).total_seconds() >= 3600:
+                self._last_prune = now
+                if prune(db, now):
+                    db.commit()
+            while len(self._running) < self._workers and not self._stop.is_set():
+                job = _claim(db, self.worker)
+                if job is None:
+                    break
+                with self._lock:
+                    self._running[job.id] = self._pool.submit(self._execute, job.id, job.kind, json.loads(job.params))
+        finally:
+            db.close()
+
+    def _heartbeat(self, db: Session, now: datetime):
+        self._last_heartbeat = now
+        with self._lock:
+            running = list(self._running)
+        if running:
+            db.execute(update(Job).where(Job.id.in_(running)).values(heartbeat_at=now))
+            db.commit()
+
+    def _execute(self, job_id: int, kind: str, params: dict):
+        try:
+            # Storing consumes Output chunks, so a failing export fails here too
+            result = _store_result(job_id, _tasks[kind](JobContext(job_id, self._stop), **params))
+        except JobCancelled:
+            _finish(job_id, JobStatus.CANCELLED)
+            logger.info("Job %s (%s) cancelled", job_id, kind)
+        except _ShuttingDown:
+            _finish(job_id, JobStatus.QUEUED)
+        except Exception:
+            logger.exception("Job %s (%s) failed", job_id, kind)
+            _finish(job_id, JobStatus.FAILED, error=traceback.format_exc()[-MAX_ERROR_LENGTH:])
+        else:
+            _finish(job_id, JobStatus.SUCCEEDED, dict(result, progress=1.0))
+            logger.info("Job %s (%s) done", job_id, kind)
+        finally:
+            with self._lock:
+                self._running.pop(job_id, None)
+            self.wake()
+
+
+runner = Runner()
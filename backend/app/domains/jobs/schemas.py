@@ -0,0 +1,23 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
+
+class JobSubmit(BaseModel):
+    kind: str                              # See GET /jobs/kinds
+    params: dict = Field(default_factory=dict)
+
+class JobOut(BaseModel):
+    id: int
+    kind: str
+    status: str                            # QUEUED / RUNNING / SUCCEEDED / FAILED / CANCELLED
+    params: dict
+    schedule: Optional[str] = None
+    progress: float
+    progress_message: Optional[str] = None
+    cancel_requested: bool
+    content_type: Optional[str] = None
+    result_bytes: Optional[int] = None     # Uncompressed size of the stored result
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
@@ -0,0 +1,97 @@
+"""
+Registered job kinds. Each task opens its own session(s), like the `run_*` scheduler entry
+points, and reports progress through `ctx` at its batch / phase boundaries: those reports are
+where a job can be cancelled, or requeued when the runner stops.
+"""
+from datetime import date
+from typing import List, Optional
+from sqlalchemy import func
+from app.core.database import ReadSessionLocal
+from app.domains.analytics import engine, forecast
+from app.domains.compliance import trace
+from app.domains.inventory import models as inv_models, queries, expiry, ledger, exports
+from app.domains.master.models import Product
+from app.domains.jobs.runner import task, JobContext, Output
+
+TRACE_CHUNK_SIZE = 1000
+
+
+@task("insights")
+def insights(ctx: JobContext, window_days: int = 30):
+    """Analytics insights for the whole catalog (served by /analytics/insights/?stored=true)."""
+    db = ReadSessionLocal()
+    try:
+        products = db.query(func.count(Product.id)).scalar() or 1
+        return engine.compute_insights(
+            db, window_days=window_days,
+            progress=lambda done: ctx.progress(done / products, f"{done} of {products} products")
+        )
+    finally:
+        db.close()
+
+@task("expiry_sweep")
+def expiry_sweep(ctx: JobContext):
+    """Quarantines stock whose batch has expired."""
+    ctx.progress(0.0, "Sweeping", force=True)
+    # Last check before the commit: a cancel here rolls the sweep back
+    return expiry.run_sweep(
+        progress=lambda result: ctx.progress(0.9, f"{result['quarantined_rows']} rows to quarantine", force=True)
+    )
+
+@task("ledger_snapshot")
+def ledger_snapshot(ctx: JobContext):
+    """Stock ledger snapshot, then reconciliation against it."""
+    ctx.progress(0.0, "Snapshot", force=True)
+    return ledger.run_snapshot(
+        progress=lambda snapshot: ctx.progress(0.5, "Reconciling", force=True)
+    )
+
+@task("forecast_refresh")
+def forecast_refresh(ctx: JobContext, full: bool = False):
+    """Demand forecast refresh (incremental unless full)."""
+    return forecast.run_refresh(
+        full=full, progress=lambda done, products: ctx.progress(done / products, f"{done} of {products} products")
+    )
+
+@task("stock_export")
+def stock_export(ctx: JobContext, format: str = "csv", warehouse_id: Optional[int] = None,
+                 bin_prefix: Optional[str] = None, product_id: Optional[int] = None, sku: Optional[str] = None,
+                 cold_chain: Optional[bool] = None, quarantined: Optional[bool] = None,
+                 expiring_before: Optional[str] = None):
+    """Full live stock dump (csv / ndjson / arrow / parquet) with the /inventory/stock/live/ filters."""
+    exports.check_format(format)
+    filters = queries.StockFilters(
+        warehouse_id=warehouse_id, bin_prefix=bin_prefix, product_id=product_id, sku=sku,
+        cold_chain=cold_chain, quarantined=quarantined,
+        expiring_before=date.fromisoformat(expiring_before) if expiring_before else None
+    )
+
+    def chunks():
+        db = ReadSessionLocal()
+        try:
+            # Rows come in stock id order, so the id reached is the progress
+            last_id = db.query(func.max(inv_models.Stock.id)).scalar() or 1
+            yield from exports.live_stock(
+                db, filters, format, progress=lambda stock_id, rows: ctx.progress(stock_id / last_id, f"{rows} rows")
+            )
+        finally:
+            db.close()
+
+    return Output(exports.MEDIA_TYPES[format], chunks())
+
+@task("recall_trace")
+def recall_trace(ctx: JobContext, batches: List[dict]):
+    """Forward trace of many batches ([{batch_number, product_id?}]), as POST /compliance/trace/."""
+    refs = list(dict.fromkeys((ref.get("product_id"), ref["batch_number"]) for ref in batches))
+    merged = {"results": [], "not_found": [], "ambiguous": []}
+    db = ReadSessionLocal()
+    try:
+        for start in range(0, len(refs), TRACE_CHUNK_SIZE):
+            part = trace.recall(db, refs[start:start + TRACE_CHUNK_SIZE])
+            for key in merged:
+                merged[key].extend(part[key])
+            done = min(start + TRACE_CHUNK_SIZE, len(refs))
+            ctx.progress(done / len(refs), f"{done} of {len(refs)} batches")
+    finally:
+        db.close()
+    return merged
@@ -0,0 +1,45 @@
+from typing import List
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.domains.master import models, schemas
+from app.domains.master.cache import cache
+
+
+def import_products(db: Session, products: List[schemas.ProductCreate]) -> List[schemas.ProductImportResult]:
+    """
+    Validates a catalog import with one query per check (manufacturers, existing SKUs),
+    then bulk-INSERTs the valid rows. Bad rows are REJECTED individually; the caller commits.
+    """
+    # 1. Manufacturers (through the master cache) and SKUs already in the catalog
+    manufacturers = cache.manufacturers(db, {p.manufacturer_id for p in products})
+    existing_skus = {
+        sku for (sku,) in db.query(models.Product.sku_code)
+        .filter(models.Product.sku_code.in_({p.sku_code for p in products})).all()
+    }
+
+    results = {}
+    accepted = []
+    seen_skus = set()
+    for index, product in enumerate(products):
+        if product.manufacturer_id not in manufacturers:
+            detail = f"Manufacturer {product.manufacturer_id} not found"
+        elif product.sku_code in existing_skus:
+            detail = f"SKU {product.sku_code} already exists"
+        elif product.sku_code in seen_skus:
+            detail = f"SKU {product.sku_code} is repeated in this import"
+        else:
+            seen_skus.add(product.sku_code)
+            accepted.append((index, product))
+            continue
+        results[index] = schemas.ProductImportResult(index=index, status="REJECTED", detail=detail)
+
+    # 2. One bulk INSERT for the rest
+    if accepted:
+        product_ids = db.execute(
+            insert(models.Product).returning(models.Product.id, sort_by_parameter_order=True),
+            [product.dict() for _, product in accepted]
+        ).scalars().all()
+        for product_id, (index, _) in zip(product_ids, accepted):
+            results[index] = schemas.ProductImportResult(index=index, status="CREATED", product_id=product_id)
+
+    return [results[index] for index in sorted(results)]
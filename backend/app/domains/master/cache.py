@@ -0,0 +1,215 @@
+"""
+Read-through cache for master data (products, manufacturers, bins).
+
+Master rows change a few times a day and are read on every write path, so lookups go
+through `cache` instead of ad-hoc queries. Entries are small immutable records (never ORM
+instances, which belong to a session), kept in a per-process LRU with a TTL.
+
+Invalidation: the create routes call the `invalidate_*` hooks explicitly, and ORM
+updates/deletes of the underlying rows invalidate through mapper events. Misses are not
+cached, so a row created by another worker is found on the next lookup; the TTL bounds how
+long an update made by another worker can go unseen.
+
+For multi-worker deployments set PHARMA_MASTER_CACHE_BACKEND=package.module:Class to a
+shared backend with the same interface as LRUBackend (get_many / set_many / delete / clear).
+"""
+import importlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app.core.config import get_settings
+from app.domains.master import models
+from app.domains.inventory.models import Bin
+
+CACHE_MAX_ENTRIES = 50000
+CACHE_TTL_SECONDS = 300
+
+
+@dataclass(frozen=True)
+class ProductRecord:
+    id: int
+    sku_code: str
+    name: str
+    manufacturer_id: int
+    requires_cold_chain: bool
+    min_temp: Optional[float]
+    max_temp: Optional[float]
+
+
+@dataclass(frozen=True)
+class ManufacturerRecord:
+    id: int
+    name: str
+    is_active: bool
+
+
+@dataclass(frozen=True)
+class BinRecord:
+    id: int
+    bin_code: str
+    warehouse_id: int
+    is_cold_storage: bool
+
+
+# --- BACKENDS ---
+
+class LRUBackend:
+    """Per-process LRU with a TTL per entry."""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+
+    def get_many(self, keys) -> dict:
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if entry[0] <= now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = entry[1]
+        return found
+
+    def set_many(self, values: dict):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for key, value in values.items():
+                self._entries[key] = (expires_at, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# --- CACHE ---
+
+class MasterDataCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def _read_through(self, kind: str, keys: Iterable, load) -> dict:
+        """`load(missing_keys)` returns {key: record} for the keys that exist."""
+        keys = set(keys)
+        cached = self.backend.get_many([(kind, key) for key in keys])
+        found = {key: cached[(kind, key)] for key in keys if (kind, key) in cached}
+        missing = keys - set(found)
+        self.hits += len(found)
+        self.misses += len(missing)
+        if missing:
+            loaded = load(missing)
+            self.backend.set_many({(kind, key): record for key, record in loaded.items()})
+            found.update(loaded)
+        return found
+
+    # --- Lookups ---
+
+    def products(self, db: Session, product_ids: Iterable[int]) -> Dict[int, ProductRecord]:
+        def load(ids):
+            rows = db.query(
+                models.Product.id, models.Product.sku_code, models.Product.name, models.Product.manufacturer_id,
+                models.Product.requires_cold_chain, models.Product.min_temp, models.Product.max_temp
+            ).filter(models.Product.id.in_(ids)).all()
+            return {row.id: ProductRecord(*row) for row in rows}
+        return self._read_through("product", product_ids, load)
+
+    def product(self, db: Session, product_id: int) -> Optional[ProductRecord]:
+        return self.products(db, [product_id]).get(product_id)
+
+    def manufacturers(self, db: Session, manufacturer_ids: Iterable[int]) -> Dict[int, ManufacturerRecord]:
+        def load(ids):
+            rows = db.query(models.Manufacturer.id, models.Manufacturer.name, models.Manufacturer.is_active)\
+                .filter(models.Manufacturer.id.in_(ids)).all()
+            return {row.id: ManufacturerRecord(*row) for row in rows}
+        return self._read_through("manufacturer", manufacturer_ids, load)
+
+    def manufacturer(self, db: Session, manufacturer_id: int) -> Optional[ManufacturerRecord]:
+        return self.manufacturers(db, [manufacturer_id]).get(manufacturer_id)
+
+    def bins(self, db: Session, bin_codes: Iterable[str]) -> Dict[str, BinRecord]:
+        """Bins by bin_code (what operators and sensors send)."""
+        def load(codes):
+            rows = db.query(Bin.id, Bin.bin_code, Bin.warehouse_id, Bin.is_cold_storage)\
+                .filter(Bin.bin_code.in_(codes)).all()
+            return {row.bin_code: BinRecord(*row) for row in rows}
+        return self._read_through("bin", bin_codes, load)
+
+    def bin(self, db: Session, bin_code: str) -> Optional[BinRecord]:
+        return self.bins(db, [bin_code]).get(bin_code)
+
+    # --- Invalidation ---
+
+    def invalidate_product(self, product_id: int):
+        self.backend.delete([("product", product_id)])
+
+    def invalidate_manufacturer(self, manufacturer_id: int):
+        self.backend.delete([("manufacturer", manufacturer_id)])
+
+    def invalidate_bin(self, bin_code: str):
+        self.backend.delete([("bin", bin_code)])
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend) if hasattr(self.backend, "__len__") else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None
+        }
+
+
+def _load_backend():
+    path = get_settings().master_cache_backend
+    if not path:
+        return LRUBackend()
+    module_name, class_name = path.split(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+cache = MasterDataCache(_load_backend())
+
+
+# ORM writes elsewhere (admin scripts, future edit routes) must not leave stale records
+@event.listens_for(models.Product, "after_update")
+@event.listens_for(models.Product, "after_delete")
+def _product_changed(mapper, connection, target):
+    cache.invalidate_product(target.id)
+
+@event.listens_for(models.Manufacturer, "after_update")
+@event.listens_for(models.Manufacturer, "after_delete")
+def _manufacturer_changed(mapper, connection, target):
+    cache.invalidate_manufacturer(target.id)
+
+@event.listens_for(Bin, "after_update")
+@event.listens_for(Bin, "after_delete")
+def _bin_changed(mapper, connection, target):
+    # A renamed bin must drop its old code too
+    for code in [target.bin_code, *inspect(target).attrs.bin_code.history.deleted]:
+        cache.invalidate_bin(code)
@@ -0,0 +1,53 @@
+import hashlib
+from typing import List, Optional, Set
+from fastapi import HTTPException, Request, Response
+from app.core.encoding import dumps
+
+# Keyset page sizes for the master data listings
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def reject_offset(skip: Optional[int]):
+    """The listings used to page with ?skip=; silently ignoring it would serve page 1 forever."""
+    if skip is not None:
+        raise HTTPException(
+            status_code=400,
+            detail="skip is no longer supported: page with ?cursor= (the X-Next-Cursor of the previous page)"
+        )
+
+
+def parse_fields(fields: Optional[str], schema) -> Optional[Set[str]]:
+    """`?fields=id,name` -> {"id", "name"}; None means every field of the schema."""
+    if not fields:
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - set(schema.model_fields)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown field(s): {', '.join(sorted(unknown))}")
+    return requested
+
+
+def columns(model, schema, fields: Optional[Set[str]]) -> List[str]:
+    """Schema fields that are columns of `model` (all, or those in `fields`), in schema order."""
+    table = model.__table__.c
+    return [name for name in schema.model_fields if (fields is None or name in fields) and name in table]
+
+
+def page_response(request: Request, items: List[dict], next_cursor: Optional[int]) -> Response:
+    """
+    Serialises one page of items (already projected dicts built from column rows, no
+    per-row model validation) with a content ETag.
+    A client sending the same ETag in If-None-Match gets 304 without the body.
+    """
+    body = dumps(items)
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if next_cursor is not None:
+        headers["X-Next-Cursor"] = str(next_cursor)
+
+    # Weak comparison: compression hands the client W/"<etag>"
+    if etag in [tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,13 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
-from app.core.database import get_db
-from app.domains.master import models, schemas
+from app.core.database import get_db, get_read_db
+from app.core.metrics import ProfiledRoute
+from app.domains.master import models, schemas, listing, bulk, search
+from app.domains.master.cache import cache
 
 router = APIRouter(
     prefix="/master",
-    tags=["Master Data (Product & Vendor)"]
+    tags=["Master Data (Product & Vendor)"],
+    route_class=ProfiledRoute
 )
 
 # --- MANUFACTURER ENDPOINTS ---
@@ -17,26 +20,99 @@ def create_manufacturer(manufacturer: schemas.ManufacturerCreate, db: Session =
     db.add(db_manufacturer)
     db.commit()
     db.refresh(db_manufacturer)
+    cache.invalidate_manufacturer(db_manufacturer.id)
     return db_manufacturer
 
 @router.get("/manufacturers/", response_model=List[schemas.ManufacturerOut])
-def read_manufacturers(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return db.query(models.Manufacturer).offset(skip).limit(limit).all()
+def read_manufacturers(
+    request: Request,
+    cursor: Optional[int] = Query(None, description="X-Next-Cursor from the previous page"),
+    limit: int = Query(listing.DEFAULT_PAGE_SIZE, ge=1, le=listing.MAX_PAGE_SIZE),
+    fields: Optional[str] = Query(None, description="Comma-separated subset of fields, e.g. id,name"),
+    skip: Optional[int] = Query(None, include_in_schema=False),
+    db: Session = Depends(get_read_db)
+):
+    listing.reject_offset(skip)
+    projection = listing.parse_fields(fields, schemas.ManufacturerOut)
+    names = listing.columns(models.Manufacturer, schemas.ManufacturerOut, projection)
+    query = db.query(models.Manufacturer.id, *(getattr(models.Manufacturer, name) for name in names))
+    if cursor is not None:
+        query = query.filter(models.Manufacturer.id > cursor)
+    rows = query.order_by(models.Manufacturer.id).limit(limit + 1).all()
+
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+    items = [dict(zip(names, row[1:])) for row in rows[:limit]]
+    return listing.page_response(request, items, next_cursor)
 
 # --- PRODUCT ENDPOINTS ---
 @router.post("/products/", response_model=schemas.ProductOut)
 def create_product(product: schemas.ProductCreate, db: Session = Depends(get_db)):
     # Check if manufacturer exists
-    manuf = db.query(models.Manufacturer).filter(models.Manufacturer.id == product.manufacturer_id).first()
-    if not manuf:
+    if not cache.manufacturer(db, product.manufacturer_id):
         raise HTTPException(status_code=404, detail="Manufacturer not found")
     
     db_product = models.Product(**product.dict())
     db.add(db_product)
     db.commit()
     db.refresh(db_product)
+    cache.invalidate_product(db_product.id)
     return db_product
 
+@router.post("/products/bulk", response_model=schemas.ProductImportResponse)
+def import_products(catalog: schemas.ProductImport, db: Session = Depends(get_db)):
+    # Catalog onboarding: one query per validation, one bulk INSERT, one commit
+    results = bulk.import_products(db, catalog.products)
+    db.commit()
+    created = sum(1 for r in results if r.status == "CREATED")
+    return schemas.ProductImportResponse(created=created, rejected=len(results) - created, results=results)
+
+@router.get("/products/search", response_model=List[schemas.ProductSearchHit])
+def search_products(
+    q: str = Query(..., min_length=search.MIN_QUERY_LENGTH, max_length=100, description="Brand, SKU prefix or molecule"),
+    limit: int = Query(20, ge=1, le=search.MAX_RESULTS),
+    db: Session = Depends(get_read_db)
+):
+    # Type-ahead: index-backed, ranked, with sellable stock from the rollups
+    return search.search_products(db, q, limit=limit)
+
 @router.get("/products/", response_model=List[schemas.ProductOut])
-def read_products(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return db.query(models.Product).offset(skip).limit(limit).all()
\ No newline at end of file
+def read_products(
+    request: Request,
+    cursor: Optional[int] = Query(None, description="X-Next-Cursor from the previous page"),
+    limit: int = Query(listing.DEFAULT_PAGE_SIZE, ge=1, le=listing.MAX_PAGE_SIZE),
+    fields: Optional[str] = Query(None, description="Comma-separated subset of fields, e.g. id,sku_code,name"),
+    skip: Optional[int] = Query(None, include_in_schema=False),
+    db: Session = Depends(get_read_db)
+):
+    listing.reject_offset(skip)
+    projection = listing.parse_fields(fields, schemas.ProductOut)
+    names = listing.columns(models.Product, schemas.ProductOut, projection)
+    nested = projection is None or "manufacturer" in projection
+    maker = listing.columns(models.Manufacturer, schemas.ManufacturerOut, None) if nested else []
+    # Plain columns (no ORM objects); the nested manufacturer comes from the same SELECT
+    query = db.query(
+        models.Product.id,
+        *(getattr(models.Product, name) for name in names),
+        *(getattr(models.Manufacturer, name) for name in maker)
+    )
+    if nested:
+        query = query.outerjoin(models.Manufacturer, models.Product.manufacturer_id == models.Manufacturer.id)
+    if cursor is not None:
+        query = query.filter(models.Product.id > cursor)
+    rows = query.order_by(models.Product.id).limit(limit + 1).all()
+
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+    split = 1 + len(names)
+    items = []
+    for row in rows[:limit]:
+        item = dict(zip(names, row[1:split]))
+        if nested:
+            manufacturer = dict(zip(maker, row[split:]))
+            item["manufacturer"] = manufacturer if manufacturer["id"] is not None else None
+        items.append(item)
+    return listing.page_response(request, items, next_cursor)
+
+# --- CACHE ---
+@router.get("/cache/stats")
+def read_cache_stats():
+    return cache.stats()
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 
 # --- Manufacturer Schemas ---
@@ -38,4 +38,28 @@ class ProductOut(ProductBase):
     manufacturer: Optional[ManufacturerOut] # Nested JSON response
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# --- Search ---
+class ProductSearchHit(BaseModel):
+    id: int
+    sku_code: str
+    name: str
+    composition: Optional[str] = None
+    requires_cold_chain: bool = False
+    available: int                  # Sellable units (on hand - quarantined)
+
+# --- Bulk Catalog Import ---
+class ProductImport(BaseModel):
+    products: List[ProductCreate] = Field(min_length=1, max_length=5000)
+
+class ProductImportResult(BaseModel):
+    index: int                      # Position of the product in the import
+    status: str                     # CREATED / REJECTED
+    product_id: Optional[int] = None
+    detail: Optional[str] = None
+
+class ProductImportResponse(BaseModel):
+    created: int
+    rejected: int
+    results: List[ProductImportResult]
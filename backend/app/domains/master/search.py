@@ -0,0 +1,121 @@
+"""
+Ranked type-ahead search over product name, SKU and composition.
+
+Backed by the index from migration 0005: an FTS5 table plus NOCASE prefix indexes (SQLite,
+kept in sync by triggers) or a pg_trgm GIN index (Postgres). Other databases fall back to
+LIKE scans. Available stock comes from the per-product rollups, so a hit costs no stock scan.
+"""
+import re
+from typing import List
+from sqlalchemy import inspect, or_, text
+from sqlalchemy.orm import Session
+from app.domains.master import models
+from app.domains.analytics.models import ProductStockRollup
+
+MIN_QUERY_LENGTH = 2
+MAX_RESULTS = 50
+# bm25 is computed for every match: above this many, relevance ranking costs more than it
+# tells (a two-letter prefix over 200k SKUs), so matches are returned in index order instead
+MAX_RANKED_MATCHES = 5000
+
+# Must match the expression of ix_products_search_trgm exactly for Postgres to use it
+PG_SEARCH_TEXT = "(coalesce(p.name, '') || ' ' || coalesce(p.sku_code, '') || ' ' || coalesce(p.composition, ''))"
+
+_fts_available = {}  # engine url -> bool
+
+
+def _tokens(q: str) -> List[str]:
+    return re.findall(r"\w+", q.lower())
+
+def _has_fts(db: Session) -> bool:
+    bind = db.get_bind()
+    key = str(bind.url)
+    if key not in _fts_available:
+        _fts_available[key] = inspect(bind).has_table("product_search")
+    return _fts_available[key]
+
+def _with_stock(db: Session, product_ids: List[int]) -> List[dict]:
+    rows = db.query(
+        models.Product.id, models.Product.sku_code, models.Product.name, models.Product.composition,
+        models.Product.requires_cold_chain,
+        (ProductStockRollup.on_hand - ProductStockRollup.quarantined).label("available")
+    ).outerjoin(ProductStockRollup, ProductStockRollup.product_id == models.Product.id)\
+     .filter(models.Product.id.in_(product_ids)).all()
+    by_id = {row.id: row for row in rows}
+    return [_hit(by_id[pid]) for pid in product_ids if pid in by_id]
+
+def _hit(row) -> dict:
+    return {
+        "id": row.id,
+        "sku_code": row.sku_code,
+        "name": row.name,
+        "composition": row.composition,
+        "requires_cold_chain": row.requires_cold_chain,
+        "available": row.available or 0
+    }
+
+
+def _search_sqlite(db: Session, q: str, terms: List[str], limit: int) -> List[dict]:
+    ids = []
+
+    # 1. Starts-with on SKU, then name: index range scans (ix_products_*_nocase)
+    prefix = re.sub(r"[%_]", "", q.strip()) + "%"
+    for column in ("sku_code", "name"):
+        rows = db.execute(text(
+            f"SELECT id FROM products WHERE {column} LIKE :prefix ORDER BY {column} COLLATE NOCASE LIMIT :limit"
+        ), {"prefix": prefix, "limit": limit}).scalars()
+        ids += [pid for pid in rows if pid not in ids]
+        if len(ids) >= limit:
+            return _with_stock(db, ids[:limit])
+
+    # 2. Full-text (every term, prefix match anywhere): bm25 name > SKU > composition
+    match = " ".join(f'"{term}"*' for term in terms)
+    matches = db.execute(text(
+        "SELECT count(*) FROM (SELECT rowid FROM product_search WHERE product_search MATCH :match LIMIT :cap)"
+    ), {"match": match, "cap": MAX_RANKED_MATCHES + 1}).scalar()
+    order = "bm25(product_search, 10.0, 5.0, 1.0)" if matches <= MAX_RANKED_MATCHES else "rowid"
+    rows = db.execute(text(
+        f"SELECT rowid FROM product_search WHERE product_search MATCH :match ORDER BY {order} LIMIT :limit"
+    ), {"match": match, "limit": limit + len(ids)}).scalars()
+    ids += [pid for pid in rows if pid not in ids]
+    return _with_stock(db, ids[:limit])
+
+
+def _search_postgres(db: Session, q: str, terms: List[str], limit: int) -> List[dict]:
+    # Every term as a trigram-indexed substring; SKU-prefix hits first, then similarity
+    params = {f"term_{i}": f"%{term}%" for i, term in enumerate(terms)}
+    params.update({"q": q.strip(), "sku_prefix": q.strip().upper() + "%", "limit": limit})
+    where = " AND ".join(f"{PG_SEARCH_TEXT} ILIKE :term_{i}" for i in range(len(terms)))
+    rows = db.execute(text(f"""
+        SELECT p.id, p.sku_code, p.name, p.composition, p.requires_cold_chain,
+               coalesce(r.on_hand - r.quarantined, 0) AS available
+        FROM products p
+        LEFT JOIN product_stock_rollups r ON r.product_id = p.id
+        WHERE {where}
+        ORDER BY upper(p.sku_code) LIKE :sku_prefix DESC, similarity({PG_SEARCH_TEXT}, :q) DESC
+        LIMIT :limit
+    """), params)
+    return [_hit(row) for row in rows]
+
+
+def search_products(db: Session, q: str, limit: int = 20) -> List[dict]:
+    """Every term must match. Starts-with hits on SKU/name rank first, then relevance."""
+    terms = _tokens(q)
+    if not terms:
+        return []
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite" and _has_fts(db):
+        return _search_sqlite(db, q, terms, limit)
+    if dialect == "postgresql":
+        return _search_postgres(db, q, terms, limit)
+
+    # No search index: substring scans
+    query = db.query(models.Product.id)
+    for term in terms:
+        pattern = f"%{term}%"
+        query = query.filter(or_(
+            models.Product.name.ilike(pattern),
+            models.Product.sku_code.ilike(pattern),
+            models.Product.composition.ilike(pattern)
+        ))
+    return _with_stock(db, [pid for (pid,) in query.order_by(models.Product.name).limit(limit)])
@@ -0,0 +1,232 @@
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import update, bindparam, or_, and_
+from app.domains.inventory import models as inv_models, ledger
+from app.domains.inventory.models import MovementType
+from app.core import events
+
+# Candidate rows are pulled in small FEFO pages; most lines are covered by the first one or two
+PAGE_SIZE = 10
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_id: int, requested: int, available: int):
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available
+        if available <= 0:
+            message = f"Out of Stock for Product ID {product_id}"
+        else:
+            message = f"Not enough stock for Product ID {product_id} (requested {requested}, available {available})"
+        super().__init__(message)
+
+
+@dataclass
+class AllocationLine:
+    stock_id: int
+    batch_id: int
+    bin_id: int
+    expiry_date: date
+    quantity: int
+
+
+@dataclass
+class _Candidate:
+    product_id: int
+    stock_id: int
+    batch_id: int
+    bin_id: int
+    warehouse_id: int
+    expiry_date: date
+    remaining: int
+
+
+class FefoAllocator:
+    """
+    Allocates order lines against sellable stock (quantity > 0, not quarantined, not
+    expired) in FEFO order, splitting a line across batches and bins when needed.
+
+    Candidates are kept in an in-memory availability index per product for the
+    life of the allocator, so several lines for the same product only read the
+    stock rows once. Nothing is written until flush(); the caller commits.
+    """
+
+    def __init__(self, db: Session, page_size: int = PAGE_SIZE):
+        self.db = db
+        self.page_size = page_size
+        self.today = date.today()
+        self._is_postgres = db.get_bind().dialect.name == "postgresql"
+        self._candidates = {}   # product_id -> [_Candidate] in FEFO order
+        self._exhausted = set() # products with no more rows in the DB
+        self._by_stock = {}     # stock_id -> _Candidate
+        self._head = {}         # product_id -> index of the first candidate with stock left
+        self._taken = {}        # stock_id -> units to deduct
+
+    def lock(self):
+        """
+        SQLite has no row locks: take the write lock up front (BEGIN IMMEDIATE) so two
+        allocators can't read the same stock. Postgres locks rows as they are fetched.
+        """
+        if self.db.get_bind().dialect.name != "sqlite":
+            return
+        connection = self.db.connection()
+        if not connection.connection.driver_connection.in_transaction:
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+    def _fetch_page(self, product_id: int):
+        query = self.db.query(
+            inv_models.Stock.id,
+            inv_models.Stock.batch_id,
+            inv_models.Stock.bin_id,
+            inv_models.Bin.warehouse_id,
+            inv_models.Batch.expiry_date,
+            inv_models.Stock.quantity
+        ).join(inv_models.Batch, inv_models.Stock.batch_id == inv_models.Batch.id)\
+         .join(inv_models.Bin, inv_models.Stock.bin_id == inv_models.Bin.id)\
+         .filter(inv_models.Batch.product_id == product_id)\
+         .filter(inv_models.Batch.expiry_date >= self.today)\
+         .filter(inv_models.Stock.quantity > 0)\
+         .filter(inv_models.Stock.is_quarantined == False)
+
+        # Keyset: continue after the last row we already hold
+        loaded = self._candidates.get(product_id)
+        if loaded:
+            last = loaded[-1]
+            query = query.filter(or_(
+                inv_models.Batch.expiry_date > last.expiry_date,
+                and_(inv_models.Batch.expiry_date == last.expiry_date, inv_models.Stock.id > last.stock_id)
+            ))
+
+        query = query.order_by(inv_models.Batch.expiry_date.asc(), inv_models.Stock.id.asc())\
+                     .limit(self.page_size)
+        if self._is_postgres:
+            # Lock only the rows we are about to consider
+            query = query.with_for_update(of=inv_models.Stock)
+
+        rows = query.all()
+        if len(rows) < self.page_size:
+            self._exhausted.add(product_id)
+        for stock_id, batch_id, bin_id, warehouse_id, expiry, qty in rows:
+            self._add_candidate(product_id, _Candidate(product_id, stock_id, batch_id, bin_id, warehouse_id, expiry, qty))
+
+    def _add_candidate(self, product_id: int, candidate: _Candidate):
+        self._candidates.setdefault(product_id, []).append(candidate)
+        self._by_stock[candidate.stock_id] = candidate
+
+    def preload(self, product_ids):
+        """
+        Loads every sellable stock row for the given products in ONE query (bulk ingestion).
+        Those products are then allocated purely in memory.
+        """
+        product_ids = [pid for pid in set(product_ids) if pid not in self._candidates]
+        if not product_ids:
+            return
+        query = self.db.query(
+            inv_models.Batch.product_id,
+            inv_models.Stock.id,
+            inv_models.Stock.batch_id,
+            inv_models.Stock.bin_id,
+            inv_models.Bin.warehouse_id,
+            inv_models.Batch.expiry_date,
+            inv_models.Stock.quantity
+        ).join(inv_models.Batch, inv_models.Stock.batch_id == inv_models.Batch.id)\
+         .join(inv_models.Bin, inv_models.Stock.bin_id == inv_models.Bin.id)\
+         .filter(inv_models.Batch.product_id.in_(product_ids))\
+         .filter(inv_models.Batch.expiry_date >= self.today)\
+         .filter(inv_models.Stock.quantity > 0)\
+         .filter(inv_models.Stock.is_quarantined == False)\
+         .order_by(inv_models.Batch.product_id, inv_models.Batch.expiry_date.asc(), inv_models.Stock.id.asc())
+        if self._is_postgres:
+            query = query.with_for_update(of=inv_models.Stock)
+
+        for product_id, stock_id, batch_id, bin_id, warehouse_id, expiry, qty in query:
+            self._add_candidate(product_id, _Candidate(product_id, stock_id, batch_id, bin_id, warehouse_id, expiry, qty))
+        self._exhausted.update(product_ids)
+
+    def allocate(self, product_id: int, quantity: int):
+        """
+        Reserves `quantity` units of the product and returns the FEFO split.
+        Raises InsufficientStock without reserving anything if the line can't be filled.
+        """
+        plan = []
+        needed = quantity
+        index = self._head.get(product_id, 0)
+        while needed > 0:
+            candidates = self._candidates.get(product_id, [])
+            if index >= len(candidates):
+                if product_id in self._exhausted:
+                    raise InsufficientStock(product_id, quantity, quantity - needed)
+                self._fetch_page(product_id)
+                continue
+
+            candidate = candidates[index]
+            index += 1
+            if candidate.remaining <= 0:
+                continue
+            take = min(candidate.remaining, needed)
+            plan.append((candidate, take))
+            needed -= take
+
+        # Line is fully covered: reserve it in the index
+        lines = []
+        for candidate, take in plan:
+            candidate.remaining -= take
+            self._taken[candidate.stock_id] = self._taken.get(candidate.stock_id, 0) + take
+            lines.append(AllocationLine(
+                stock_id=candidate.stock_id,
+                batch_id=candidate.batch_id,
+                bin_id=candidate.bin_id,
+                expiry_date=candidate.expiry_date,
+                quantity=take
+            ))
+
+        # Skip fully drained candidates next time
+        candidates = self._candidates[product_id]
+        head = self._head.get(product_id, 0)
+        while head < len(candidates) and candidates[head].remaining <= 0:
+            head += 1
+        self._head[product_id] = head
+        return lines
+
+    def release(self, product_id: int, lines):
+        """Gives back a reservation made by allocate() (e.g. a later line of the same order failed)."""
+        for line in lines:
+            self._by_stock[line.stock_id].remaining += line.quantity
+            self._taken[line.stock_id] -= line.quantity
+            if not self._taken[line.stock_id]:
+                del self._taken[line.stock_id]
+        self._head[product_id] = 0
+
+    def flush(self, reference: Optional[str] = None):
+        """Writes all reserved deductions in one executemany UPDATE (plus ledger movements and live-feed deltas)."""
+        if not self._taken:
+            return
+        stocks = inv_models.Stock.__table__
+        self.db.execute(
+            update(stocks)
+            .where(stocks.c.id == bindparam("stock_id"))
+            .values(quantity=stocks.c.quantity - bindparam("taken")),
+            [{"stock_id": stock_id, "taken": taken} for stock_id, taken in self._taken.items()]
+        )
+        ledger.post(self.db, (
+            ledger.Movement(
+                MovementType.ALLOCATION, stock_id, self._by_stock[stock_id].product_id,
+                self._by_stock[stock_id].warehouse_id, self._by_stock[stock_id].expiry_date,
+                quantity_delta=-taken, reference=reference, bin_id=self._by_stock[stock_id].bin_id
+            )
+            for stock_id, taken in self._taken.items()
+        ))
+        # Rows are locked, so the remaining count is the committed quantity
+        events.stage(self.db, *(
+            {
+                "type": "stock.quantity",
+                "warehouse_id": self._by_stock[stock_id].warehouse_id,
+                "stock_id": stock_id,
+                "quantity": self._by_stock[stock_id].remaining
+            }
+            for stock_id in self._taken
+        ))
+
+        self._taken = {}
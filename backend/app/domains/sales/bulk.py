@@ -0,0 +1,160 @@
+import json
+from typing import List, Tuple
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+from sqlalchemy import insert
+from app.domains.sales import models as sales_models, schemas
+from app.domains.sales.allocation import FefoAllocator, InsufficientStock
+from app.domains.analytics import rollups
+from app.domains.compliance import trace
+from app.domains.master.cache import cache as master_cache
+
+MAX_BULK_ORDERS = 10000
+
+
+def parse_orders(body: bytes, content_type: str) -> Tuple[List[Tuple[int, schemas.SalesOrderCreate]], List[schemas.BulkOrderResult]]:
+    """
+    Accepts a JSON array or NDJSON (one order per line).
+    Returns the valid orders with their batch index, plus REJECTED results for bad entries.
+    """
+    if "ndjson" in content_type:
+        raw = [line for line in body.decode("utf-8").splitlines() if line.strip()]
+    else:
+        raw = json.loads(body or b"[]")
+        if not isinstance(raw, list):
+            raise ValueError("Expected a JSON array of orders")
+
+    if len(raw) > MAX_BULK_ORDERS:
+        raise ValueError(f"At most {MAX_BULK_ORDERS} orders per request")
+
+    orders, rejected = [], []
+    for index, entry in enumerate(raw):
+        try:
+            if isinstance(entry, str):
+                entry = json.loads(entry)
+            if not isinstance(entry, dict):
+                raise TypeError("Expected an order object")
+            orders.append((index, schemas.SalesOrderCreate(**entry)))
+        except ValidationError as exc:
+            rejected.append(schemas.BulkOrderResult(index=index, status="REJECTED", detail=_short_errors(exc)))
+        except (ValueError, TypeError) as exc:
+            rejected.append(schemas.BulkOrderResult(index=index, status="REJECTED", detail=str(exc)))
+    return orders, rejected
+
+
+def _short_errors(exc: ValidationError) -> str:
+    # "items.0.quantity: Input should be greater than 0; ..." without echoing the input back
+    return "; ".join(
+        f"{'.'.join(map(str, error['loc']))}: {error['msg']}" if error["loc"] else error["msg"]
+        for error in exc.errors(include_url=False, include_input=False)
+    )
+
+
+def ingest_orders(db: Session, orders: List[Tuple[int, schemas.SalesOrderCreate]]) -> List[schemas.BulkOrderResult]:
+    """
+    Allocates a whole batch of orders in memory, then writes every header, line and
+    allocation slice with bulk INSERTs in one transaction (the caller's db.commit()).
+    Orders are all-or-nothing individually; a short order is REJECTED, the rest go through.
+    """
+    results = {}
+    products = master_cache.products(db, {item.product_id for _, order in orders for item in order.items})
+    known_orders = []
+    for index, order in orders:
+        unknown = next((item.product_id for item in order.items if item.product_id not in products), None)
+        if unknown is not None:
+            results[index] = schemas.BulkOrderResult(index=index, status="REJECTED", detail=f"Product ID {unknown} not found")
+        else:
+            known_orders.append((index, order))
+
+    allocator = FefoAllocator(db)
+    allocator.lock()
+
+    # 1. One query for the candidate stock of every product in the batch
+    allocator.preload(products)
+
+    # 2. Allocate in memory, in submission order (deterministic priority)
+    accepted = []  # (index, order, [lines per item])
+    for index, order in known_orders:
+        reserved = []
+        try:
+            for item in order.items:
+                reserved.append((item.product_id, allocator.allocate(item.product_id, item.quantity)))
+        except InsufficientStock as exc:
+            for product_id, lines in reserved:
+                allocator.release(product_id, lines)
+            results[index] = schemas.BulkOrderResult(index=index, status="REJECTED", detail=str(exc))
+            continue
+        accepted.append((index, order, [lines for _, lines in reserved]))
+
+    if not accepted:
+        return [results[index] for index in sorted(results)]
+
+    # 3. Bulk INSERT headers, then lines, then allocation slices
+    headers = db.execute(
+        insert(sales_models.SalesOrder).returning(
+            sales_models.SalesOrder.id, sales_models.SalesOrder.created_at, sort_by_parameter_order=True
+        ),
+        [
+            {
+                "customer_name": order.customer_name,
+                "total_amount": sum(item.quantity * item.unit_price for item in order.items),
+                "status": "ALLOCATED"
+            }
+            for _, order, _ in accepted
+        ]
+    ).all()
+    order_ids = [order_id for order_id, _ in headers]
+
+    item_rows, item_lines = [], []
+    sold = {}
+    for (order_id, created_at), (_, order, lines_per_item) in zip(headers, accepted):
+        for item, lines in zip(order.items, lines_per_item):
+            item_rows.append({
+                "order_id": order_id,
+                "product_id": item.product_id,
+                "quantity": item.quantity,
+                "unit_price": item.unit_price,
+                "allocated_batch_id": lines[0].batch_id
+            })
+            item_lines.append((order_id, created_at, order.customer_name, item.product_id, lines))
+            sold[item.product_id] = sold.get(item.product_id, 0) + item.quantity
+
+    item_ids = db.execute(
+        insert(sales_models.SalesOrderItem).returning(sales_models.SalesOrderItem.id, sort_by_parameter_order=True),
+        item_rows
+    ).scalars().all()
+
+    db.execute(insert(sales_models.SalesOrderAllocation), [
+        {
+            "order_item_id": item_id,
+            "stock_id": line.stock_id,
+            "batch_id": line.batch_id,
+            "bin_id": line.bin_id,
+            "quantity": line.quantity
+        }
+        for item_id, (_, _, _, _, lines) in zip(item_ids, item_lines)
+        for line in lines
+    ])
+    trace.record_sales(db, [
+        {
+            "batch_id": line.batch_id,
+            "product_id": product_id,
+            "order_id": order_id,
+            "order_item_id": item_id,
+            "customer_name": customer_name,
+            "order_date": created_at,
+            "quantity": line.quantity
+        }
+        for item_id, (order_id, created_at, customer_name, product_id, lines) in zip(item_ids, item_lines)
+        for line in lines
+    ])
+
+    # 4. Stock deductions + rollups, aggregated per stock row / product
+    # One ledger movement per stock row for the whole burst; the per-order split is in the allocations
+    allocator.flush(reference=f"orders:{order_ids[0]}-{order_ids[-1]}")
+    for product_id, quantity in sold.items():
+        rollups.record_sale(db, product_id, quantity)
+
+    for order_id, (index, _, _) in zip(order_ids, accepted):
+        results[index] = schemas.BulkOrderResult(index=index, status="ALLOCATED", order_id=order_id)
+    return [results[index] for index in sorted(results)]
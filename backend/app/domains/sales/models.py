@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Float, ForeignKey, DateTime, Enum
+from sqlalchemy import Column, Integer, String, Boolean, Float, ForeignKey, DateTime, Enum, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -7,10 +7,18 @@ import enum
 class OrderStatus(str, enum.Enum):
     PENDING = "PENDING"
     ALLOCATED = "ALLOCATED" # Stock is reserved
+    PICKING = "PICKING"     # In a pick wave
+    DISPATCHED = "DISPATCHED"
+
+class WaveStatus(str, enum.Enum):
+    PICKING = "PICKING"
     DISPATCHED = "DISPATCHED"
 
 class SalesOrder(Base):
     __tablename__ = "sales_orders"
+    __table_args__ = (
+        Index("ix_sales_orders_status", "status"), # Wave planning picks up ALLOCATED orders
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     customer_name = Column(String)
@@ -22,6 +30,11 @@ class SalesOrder(Base):
 
 class SalesOrderItem(Base):
     __tablename__ = "sales_order_items"
+    __table_args__ = (
+        Index("ix_sales_order_items_order", "order_id"),
+        Index("ix_sales_order_items_product", "product_id"),
+        Index("ix_sales_order_items_allocated_batch", "allocated_batch_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     order_id = Column(Integer, ForeignKey("sales_orders.id"))
@@ -30,6 +43,59 @@ class SalesOrderItem(Base):
     unit_price = Column(Float)
     
     # This field is crucial: It tells us WHICH batch was allocated
+    # (the first FEFO batch when the line is split; see SalesOrderAllocation for the full split)
     allocated_batch_id = Column(Integer, nullable=True) 
     
-    order = relationship("SalesOrder", back_populates="items")
\ No newline at end of file
+    order = relationship("SalesOrder", back_populates="items")
+    allocations = relationship("SalesOrderAllocation", back_populates="item")
+
+class SalesOrderAllocation(Base):
+    """One slice of an order line taken from a specific Stock row (batch + bin)."""
+    __tablename__ = "sales_order_allocations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    order_item_id = Column(Integer, ForeignKey("sales_order_items.id"), index=True)
+    stock_id = Column(Integer, ForeignKey("stocks.id"))
+    batch_id = Column(Integer, ForeignKey("batches.id"), index=True)
+    bin_id = Column(Integer, ForeignKey("bins.id"))
+    quantity = Column(Integer, nullable=False)
+
+    item = relationship("SalesOrderItem", back_populates="allocations")
+
+
+# --- PICK WAVES ---
+
+class PickWave(Base):
+    """A group of ALLOCATED orders picked together (see sales/waves.py)."""
+    __tablename__ = "pick_waves"
+
+    id = Column(Integer, primary_key=True, index=True)
+    status = Column(String, default=WaveStatus.PICKING, nullable=False)
+    order_count = Column(Integer, nullable=False, default=0)
+    line_count = Column(Integer, nullable=False, default=0)  # Allocation slices
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    dispatched_at = Column(DateTime(timezone=True), nullable=True)
+
+class PickWaveOrder(Base):
+    """Wave membership; an order is in at most one wave."""
+    __tablename__ = "pick_wave_orders"
+
+    order_id = Column(Integer, ForeignKey("sales_orders.id"), primary_key=True)
+    wave_id = Column(Integer, ForeignKey("pick_waves.id"), nullable=False, index=True)
+
+class PickTask(Base):
+    """One stop on the pick route: every unit of a stock row (batch in a bin) the wave needs."""
+    __tablename__ = "pick_tasks"
+    __table_args__ = (
+        Index("ix_pick_tasks_wave_sequence", "wave_id", "sequence"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    wave_id = Column(Integer, ForeignKey("pick_waves.id"), nullable=False)
+    sequence = Column(Integer, nullable=False)  # Walking order within the wave
+    warehouse_id = Column(Integer, ForeignKey("warehouses.id"))
+    bin_id = Column(Integer, ForeignKey("bins.id"))
+    stock_id = Column(Integer, ForeignKey("stocks.id"))
+    batch_id = Column(Integer, ForeignKey("batches.id"))
+    product_id = Column(Integer)
+    quantity = Column(Integer, nullable=False)
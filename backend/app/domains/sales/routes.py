@@ -1,18 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.core.database import get_db
-from app.domains.sales import models as sales_models, schemas
-from app.domains.inventory import models as inv_models # Accessing Inventory Domain
-from app.domains.inventory.models import Batch # Explicit import for joining
+from app.core.metrics import ProfiledRoute
+from app.domains.sales import models as sales_models, schemas, bulk, waves
+from app.domains.sales.allocation import FefoAllocator, InsufficientStock
+from app.domains.analytics import rollups
+from app.domains.compliance import trace
+from app.domains.master.cache import cache as master_cache
 
 router = APIRouter(
     prefix="/sales",
-    tags=["Sales & Allocation"]
+    tags=["Sales & Allocation"],
+    route_class=ProfiledRoute
 )
 
 @router.post("/orders/", response_model=schemas.OrderOut)
 def create_sales_order(order: schemas.SalesOrderCreate, db: Session = Depends(get_db)):
-    # 1. Create the Order Header
+    # Unknown products are a 404, not "out of stock"
+    products = master_cache.products(db, {item.product_id for item in order.items})
+    for item in order.items:
+        if item.product_id not in products:
+            raise HTTPException(status_code=404, detail=f"Product ID {item.product_id} not found")
+
+    allocator = FefoAllocator(db)
+    allocator.lock()
+
+    # 1. Create the Order Header (flushed for its id, committed together with the lines)
     total = sum(item.quantity * item.unit_price for item in order.items)
     db_order = sales_models.SalesOrder(
         customer_name=order.customer_name,
@@ -20,50 +34,124 @@ def create_sales_order(order: schemas.SalesOrderCreate, db: Session = Depends(ge
         status="PENDING"
     )
     db.add(db_order)
+    db.flush()
+
+    # 2. Process Items & Run FEFO Logic (a line may be split across batches/bins)
+    try:
+        for item in order.items:
+            lines = allocator.allocate(item.product_id, item.quantity)
+
+            db_item = sales_models.SalesOrderItem(
+                order_id=db_order.id,
+                product_id=item.product_id,
+                quantity=item.quantity,
+                unit_price=item.unit_price,
+                allocated_batch_id=lines[0].batch_id
+            )
+            db_item.allocations = [
+                sales_models.SalesOrderAllocation(
+                    stock_id=line.stock_id,
+                    batch_id=line.batch_id,
+                    bin_id=line.bin_id,
+                    quantity=line.quantity
+                )
+                for line in lines
+            ]
+            db.add(db_item)
+            rollups.record_sale(db, item.product_id, item.quantity)
+    except InsufficientStock as exc:
+        # Nothing was written yet: drop the header too
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    # 3. Deduct stock, index the batches for recalls, finalize in one commit
+    allocator.flush(reference=f"order:{db_order.id}")
+    db.flush()
+    trace.record_sales(db, [
+        {
+            "batch_id": allocation.batch_id,
+            "product_id": db_item.product_id,
+            "order_id": db_order.id,
+            "order_item_id": db_item.id,
+            "customer_name": db_order.customer_name,
+            "order_date": db_order.created_at,
+            "quantity": allocation.quantity
+        }
+        for db_item in db_order.items
+        for allocation in db_item.allocations
+    ])
+    db_order.status = "ALLOCATED"
     db.commit()
     db.refresh(db_order)
+    return db_order
 
-    # 2. Process Items & Run FEFO Logic
-    for item in order.items:
-        # FEFO ALGORITHM: Find stock for this product, sorted by expiry date
-        available_stock = (
-            db.query(inv_models.Stock)
-            .join(inv_models.Batch)
-            .filter(inv_models.Batch.product_id == item.product_id)
-            .filter(inv_models.Stock.quantity > 0)
-            .order_by(inv_models.Batch.expiry_date.asc()) # <--- THIS IS FEFO
-            .all()
-        )
-
-        qty_needed = item.quantity
-        allocated_batch_id = None
-        
-        # Simple Allocation: Just take from the first available batch (Simplification for MVP)
-        # In production, we would split lines across multiple batches if needed.
-        if not available_stock:
-            raise HTTPException(status_code=400, detail=f"Out of Stock for Product ID {item.product_id}")
-            
-        # Grab the best batch (first one because we sorted by expiry)
-        best_stock = available_stock[0]
-        
-        if best_stock.quantity < qty_needed:
-             raise HTTPException(status_code=400, detail=f"Not enough stock in Batch {best_stock.batch.batch_number}")
-
-        # DEDUCT STOCK (Real-time update)
-        best_stock.quantity -= qty_needed
-        allocated_batch_id = best_stock.batch_id
-
-        # Create Order Line
-        db_item = sales_models.SalesOrderItem(
-            order_id=db_order.id,
-            product_id=item.product_id,
-            quantity=item.quantity,
-            unit_price=item.unit_price,
-            allocated_batch_id=allocated_batch_id
-        )
-        db.add(db_item)
-
-    # 3. Finalize
-    db_order.status = "ALLOCATED"
+@router.post("/orders/bulk", response_model=schemas.BulkOrderResponse)
+async def create_sales_orders_bulk(request: Request, db: Session = Depends(get_db)):
+    """
+    Marketplace bursts: a JSON array of SalesOrderCreate, or NDJSON (application/x-ndjson).
+    Each order is allocated or rejected on its own; the accepted ones are committed together.
+    """
+    body = await request.body()
+    try:
+        orders, results = bulk.parse_orders(body, request.headers.get("content-type", ""))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    if orders:
+        # Allocation is blocking DB work; keep it off the event loop
+        results += await run_in_threadpool(_ingest_and_commit, db, orders)
+
+    results.sort(key=lambda r: r.index)
+    accepted = sum(1 for r in results if r.status == "ALLOCATED")
+    return schemas.BulkOrderResponse(accepted=accepted, rejected=len(results) - accepted, results=results)
+
+def _ingest_and_commit(db: Session, orders):
+    results = bulk.ingest_orders(db, orders)
+    db.commit()
+    return results
+
+
+# --- PICK WAVES ---
+
+def _wave_detail(db: Session, wave: sales_models.PickWave) -> schemas.WaveDetail:
+    return schemas.WaveDetail(**schemas.WaveOut.model_validate(wave).model_dump(), tasks=waves.pick_list(db, wave))
+
+def _get_wave(db: Session, wave_id: int) -> sales_models.PickWave:
+    wave = db.get(sales_models.PickWave, wave_id)
+    if wave is None:
+        raise HTTPException(status_code=404, detail="Wave not found")
+    return wave
+
+@router.post("/waves/", response_model=schemas.WaveDetail)
+def plan_wave(plan: schemas.WavePlanRequest, db: Session = Depends(get_db)):
+    # Claims the oldest ALLOCATED orders and returns the routed, consolidated pick list
+    wave = waves.plan_wave(db, plan.max_orders, plan.max_lines, plan.warehouse_id, plan.order_ids)
+    if wave is None:
+        raise HTTPException(status_code=404, detail="No allocated orders waiting for a wave")
+    db.commit()
+    db.refresh(wave)
+    return _wave_detail(db, wave)
+
+@router.get("/waves/{wave_id}", response_model=schemas.WaveDetail)
+def read_wave(wave_id: int, db: Session = Depends(get_db)):
+    return _wave_detail(db, _get_wave(db, wave_id))
+
+@router.post("/waves/{wave_id}/replan", response_model=schemas.WaveDetail)
+def replan_wave(wave_id: int, db: Session = Depends(get_db)):
+    wave = _get_wave(db, wave_id)
+    if wave.status != sales_models.WaveStatus.PICKING:
+        raise HTTPException(status_code=409, detail=f"Wave is {wave.status}")
+    waves.replan_wave(db, wave)
+    db.commit()
+    db.refresh(wave)
+    return _wave_detail(db, wave)
+
+@router.post("/waves/{wave_id}/dispatch", response_model=schemas.WaveOut)
+def dispatch_wave(wave_id: int, db: Session = Depends(get_db)):
+    wave = _get_wave(db, wave_id)
+    if wave.status != sales_models.WaveStatus.PICKING:
+        raise HTTPException(status_code=409, detail=f"Wave is {wave.status}")
+    waves.dispatch_wave(db, wave)
     db.commit()
-    return db_order
\ No newline at end of file
+    db.refresh(wave)
+    return wave
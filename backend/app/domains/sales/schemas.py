@@ -1,9 +1,10 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
+from datetime import date, datetime
 
 class OrderItemCreate(BaseModel):
     product_id: int
-    quantity: int
+    quantity: int = Field(gt=0)
     unit_price: float
 
 class SalesOrderCreate(BaseModel):
@@ -16,4 +17,53 @@ class OrderOut(BaseModel):
     total_amount: float
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# --- Bulk Ingestion ---
+class BulkOrderResult(BaseModel):
+    index: int                      # Position of the order in the submitted batch
+    status: str                     # ALLOCATED / REJECTED
+    order_id: Optional[int] = None
+    detail: Optional[str] = None
+
+class BulkOrderResponse(BaseModel):
+    accepted: int
+    rejected: int
+    results: List[BulkOrderResult]
+
+# --- Pick Waves ---
+class WavePlanRequest(BaseModel):
+    max_orders: int = Field(500, ge=1, le=5000)
+    max_lines: int = Field(5000, ge=1, le=20000)  # Allocation slices in the wave
+    warehouse_id: Optional[int] = None            # Only orders picked entirely in this warehouse
+    order_ids: Optional[List[int]] = None         # Restrict to these orders (still ALLOCATED only)
+
+class PickOrderSplit(BaseModel):
+    order_id: int
+    quantity: int
+
+class PickTaskOut(BaseModel):
+    sequence: int
+    warehouse_id: int
+    bin_code: str
+    product_id: int
+    sku: Optional[str] = None
+    product_name: Optional[str] = None
+    batch_number: str
+    expiry_date: date
+    quantity: int
+    orders: List[PickOrderSplit]
+
+class WaveOut(BaseModel):
+    id: int
+    status: str
+    order_count: int
+    line_count: int
+    created_at: Optional[datetime] = None
+    dispatched_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class WaveDetail(WaveOut):
+    tasks: List[PickTaskOut]
@@ -0,0 +1,178 @@
+"""
+Wave planning: ALLOCATED orders are grouped into waves, their allocation slices consolidated
+per stock row (batch in a bin) and ordered along a serpentine route over the bin codes.
+
+Stops are ordered by the serpentine walk in `inventory.locations`: up one aisle and down the
+next, codes that don't parse last.
+
+Orders move ALLOCATED -> PICKING (claimed by a wave) -> DISPATCHED. Orders from before
+allocation slices existed (no bin recorded) can't be routed and are left out of waves.
+"""
+from typing import List, Optional
+from sqlalchemy import func, update, insert, delete, select
+from sqlalchemy.orm import Session
+from app.domains.sales import models
+from app.domains.inventory import models as inv_models
+from app.domains.inventory.locations import route
+from app.domains.master.cache import cache as master_cache
+
+DEFAULT_WAVE_ORDERS = 500
+DEFAULT_WAVE_LINES = 5000
+
+
+# --- PLANNING ---
+
+def _select_orders(db: Session, max_orders: int, max_lines: int, warehouse_id: Optional[int],
+                   order_ids: Optional[List[int]]) -> List[int]:
+    """Oldest ALLOCATED orders first, as many as fit in max_orders / max_lines (one query)."""
+    query = db.query(models.SalesOrder.id, func.count(models.SalesOrderAllocation.id))\
+        .join(models.SalesOrderItem, models.SalesOrderItem.order_id == models.SalesOrder.id)\
+        .join(models.SalesOrderAllocation, models.SalesOrderAllocation.order_item_id == models.SalesOrderItem.id)\
+        .filter(models.SalesOrder.status == models.OrderStatus.ALLOCATED)
+    if order_ids:
+        query = query.filter(models.SalesOrder.id.in_(order_ids))
+    query = query.group_by(models.SalesOrder.id)
+    if warehouse_id is not None:
+        # Only orders picked entirely in this warehouse
+        query = query.join(inv_models.Bin, inv_models.Bin.id == models.SalesOrderAllocation.bin_id)\
+            .having(func.min(inv_models.Bin.warehouse_id) == warehouse_id)\
+            .having(func.max(inv_models.Bin.warehouse_id) == warehouse_id)
+
+    selected, lines = [], 0
+    for order_id, slices in query.order_by(models.SalesOrder.id).limit(max_orders):
+        if selected and lines + slices > max_lines:
+            break
+        selected.append(order_id)
+        lines += slices
+    return selected
+
+def _build_tasks(db: Session, wave: models.PickWave):
+    """(Re)writes the wave's pick tasks from its orders' allocation slices."""
+    wave_orders = select(models.PickWaveOrder.order_id).where(models.PickWaveOrder.wave_id == wave.id)
+    slices = db.query(
+        models.SalesOrderAllocation.stock_id,
+        models.SalesOrderAllocation.batch_id,
+        models.SalesOrderAllocation.bin_id,
+        models.SalesOrderAllocation.quantity,
+        models.SalesOrderItem.product_id,
+        inv_models.Bin.bin_code,
+        inv_models.Bin.warehouse_id
+    ).join(models.SalesOrderItem, models.SalesOrderAllocation.order_item_id == models.SalesOrderItem.id)\
+     .join(inv_models.Bin, inv_models.Bin.id == models.SalesOrderAllocation.bin_id)\
+     .filter(models.SalesOrderItem.order_id.in_(wave_orders))\
+     .all()
+
+    # Consolidate: one stop per stock row, however many orders need it
+    tasks = {}
+    for row in slices:
+        task = tasks.get(row.stock_id)
+        if task is None:
+            tasks[row.stock_id] = task = {
+                "wave_id": wave.id, "warehouse_id": row.warehouse_id, "bin_id": row.bin_id,
+                "stock_id": row.stock_id, "batch_id": row.batch_id, "product_id": row.product_id,
+                "quantity": 0, "bin_code": row.bin_code
+            }
+        task["quantity"] += row.quantity
+
+    by_stop = {}
+    for task in tasks.values():
+        by_stop.setdefault((task["warehouse_id"], task["bin_code"]), []).append(task)
+    ordered = []
+    for stop in route(by_stop):
+        ordered += sorted(by_stop[stop], key=lambda task: (task["product_id"], task["stock_id"]))
+    for sequence, task in enumerate(ordered, start=1):
+        task["sequence"] = sequence
+        del task["bin_code"]
+
+    db.execute(delete(models.PickTask).where(models.PickTask.wave_id == wave.id))
+    if ordered:
+        db.execute(insert(models.PickTask), ordered)
+    wave.line_count = len(slices)
+
+def plan_wave(db: Session, max_orders: int = DEFAULT_WAVE_ORDERS, max_lines: int = DEFAULT_WAVE_LINES,
+              warehouse_id: Optional[int] = None, order_ids: Optional[List[int]] = None) -> Optional[models.PickWave]:
+    """
+    Claims ALLOCATED orders for a new wave and writes its routed pick tasks.
+    Returns None when no order is waiting. The caller commits.
+    """
+    # 1. Candidates, then claim them; the status guard drops orders another planner just took
+    candidates = _select_orders(db, max_orders, max_lines, warehouse_id, order_ids)
+    if not candidates:
+        return None
+    orders = models.SalesOrder.__table__
+    claimed = db.execute(
+        update(orders)
+        .where(orders.c.id.in_(candidates))
+        .where(orders.c.status == models.OrderStatus.ALLOCATED)
+        .values(status=models.OrderStatus.PICKING)
+        .returning(orders.c.id)
+    ).scalars().all()
+    if not claimed:
+        return None
+
+    # 2. The wave and its membership
+    wave = models.PickWave(status=models.WaveStatus.PICKING, order_count=len(claimed))
+    db.add(wave)
+    db.flush()
+    db.execute(insert(models.PickWaveOrder), [{"order_id": order_id, "wave_id": wave.id} for order_id in claimed])
+
+    # 3. Consolidated, routed pick list
+    _build_tasks(db, wave)
+    return wave
+
+def replan_wave(db: Session, wave: models.PickWave):
+    """Re-routes a wave that is still being picked (e.g. after bins were re-slotted). The caller commits."""
+    _build_tasks(db, wave)
+
+def dispatch_wave(db: Session, wave: models.PickWave):
+    """Every order in the wave -> DISPATCHED in one UPDATE. The caller commits."""
+    wave_orders = select(models.PickWaveOrder.order_id).where(models.PickWaveOrder.wave_id == wave.id)
+    orders = models.SalesOrder.__table__
+    db.execute(
+        update(orders)
+        .where(orders.c.id.in_(wave_orders))
+        .values(status=models.OrderStatus.DISPATCHED)
+    )
+    wave.status = models.WaveStatus.DISPATCHED
+    wave.dispatched_at = func.now()
+
+
+# --- PICK LIST ---
+
+def pick_list(db: Session, wave: models.PickWave) -> List[dict]:
+    """Tasks in walking order, with the per-order split for sorting at the pack station."""
+    tasks = db.query(
+        models.PickTask.sequence, models.PickTask.stock_id, models.PickTask.product_id,
+        models.PickTask.warehouse_id, models.PickTask.quantity,
+        inv_models.Bin.bin_code, inv_models.Batch.batch_number, inv_models.Batch.expiry_date
+    ).join(inv_models.Bin, inv_models.Bin.id == models.PickTask.bin_id)\
+     .join(inv_models.Batch, inv_models.Batch.id == models.PickTask.batch_id)\
+     .filter(models.PickTask.wave_id == wave.id)\
+     .order_by(models.PickTask.sequence)\
+     .all()
+
+    split = {}
+    wave_orders = select(models.PickWaveOrder.order_id).where(models.PickWaveOrder.wave_id == wave.id)
+    for stock_id, order_id, quantity in db.query(
+        models.SalesOrderAllocation.stock_id, models.SalesOrderItem.order_id, func.sum(models.SalesOrderAllocation.quantity)
+    ).join(models.SalesOrderItem, models.SalesOrderAllocation.order_item_id == models.SalesOrderItem.id)\
+     .filter(models.SalesOrderItem.order_id.in_(wave_orders))\
+     .group_by(models.SalesOrderAllocation.stock_id, models.SalesOrderItem.order_id):
+        split.setdefault(stock_id, []).append({"order_id": order_id, "quantity": int(quantity)})
+
+    products = master_cache.products(db, {task.product_id for task in tasks})
+    return [
+        {
+            "sequence": task.sequence,
+            "warehouse_id": task.warehouse_id,
+            "bin_code": task.bin_code,
+            "product_id": task.product_id,
+            "sku": products[task.product_id].sku_code if task.product_id in products else None,
+            "product_name": products[task.product_id].name if task.product_id in products else None,
+            "batch_number": task.batch_number,
+            "expiry_date": task.expiry_date,
+            "quantity": task.quantity,
+            "orders": sorted(split.get(task.stock_id, []), key=lambda entry: entry["order_id"])
+        }
+        for task in tasks
+    ]
@@ -1,19 +1,33 @@
+import logging
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
 from fastapi.middleware.cors import CORSMiddleware  # <--- IMPORT THIS
-from app.core.database import engine
-from app.domains.master import models as master_models, routes as master_routes
-from app.domains.inventory import models as inv_models, routes as inv_routes
-from app.domains.sales import models as sales_models, routes as sales_routes
+from app.core import migrations, metrics, events
+from app.core.idempotency import IdempotencyMiddleware
+from app.core.encoding import CompressionMiddleware, FastJSONResponse
+from app.core.database import engine, read_engine, settings, get_async_sessionmaker, SessionLocal
+from app.domains.master import routes as master_routes
+from app.domains.master.cache import cache as master_cache
+from app.domains.inventory import routes as inv_routes, telemetry
+from app.domains.sales import routes as sales_routes
 from app.domains.compliance import routes as compliance_routes # <--- Import
 from app.domains.analytics import routes as analytics_routes
+from app.domains.jobs import routes as jobs_routes, runner as jobs
 
+logger = logging.getLogger(__name__)
 
-# Database Init
-master_models.Base.metadata.create_all(bind=engine)
-inv_models.Base.metadata.create_all(bind=engine)
-sales_models.Base.metadata.create_all(bind=engine)
+# Database Init: schema is managed by `python -m app.core.migrations upgrade`, not at import
 
-app = FastAPI(title="Unified Pharma ERP-WMS", version="0.1.0")
+# orjson rendering for every JSON route; hot routes also skip validation (see core/encoding.py)
+app = FastAPI(title="Unified Pharma ERP-WMS", version="0.1.0", default_response_class=FastJSONResponse)
+
+# Scanner / client retries: POSTs with an Idempotency-Key run once.
+# Added first, so innermost: requests pass Metrics -> Compression -> CORS -> Idempotency.
+# Replayed responses are therefore CORS-decorated, compressed and metered like any other
+# (under route "unmatched", since a replay never reaches the router).
+app.add_middleware(IdempotencyMiddleware, prefixes=("/inventory/", "/master/", "/sales/", "/jobs/"))
 
 # --- CORS CONFIGURATION (NEW) ---
 origins = [
@@ -28,16 +42,108 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allow all methods (GET, POST, etc.)
     allow_headers=["*"],
+    # Keyset paging, change-feed resume, listing revalidation, idempotent retries, stored job results
+    expose_headers=["X-Next-Cursor", "X-Event-Seq", "ETag", "Idempotent-Replayed", "X-Job-Id", "X-Computed-At"],
 )
 # --------------------------------
 
+# gzip / brotli by Accept-Encoding; inside metrics so its latency includes compression
+app.add_middleware(CompressionMiddleware)
+
+# Outermost: latency / SQL per route, statement budget warnings, `?profile=1` for staff
+app.add_middleware(metrics.MetricsMiddleware)
+
 app.include_router(master_routes.router)
 app.include_router(inv_routes.router)
 app.include_router(sales_routes.router)
 app.include_router(compliance_routes.router)
 app.include_router(analytics_routes.router)
+app.include_router(jobs_routes.router)
+
+
+@app.on_event("startup")
+def check_schema():
+    todo = migrations.pending()
+    if todo:
+        logger.warning(
+            "Database schema is behind (%s pending migration(s), head %s). "
+            "Run: python -m app.core.migrations upgrade", len(todo), migrations.HEAD
+        )
+
+
+@app.on_event("startup")
+def start_job_runner():
+    # Maintenance runs as scheduled jobs: one run per schedule across all workers, history in /jobs/
+    if migrations.pending():
+        return
+    runner = jobs.runner
+    # Expired batches leave sellable stock without waiting for a manual sweep
+    runner.add_schedule("expiry-sweep", "expiry_sweep", every=settings.expiry_sweep_seconds)
+    # Keeps point-in-time queries to one snapshot + a bounded tail; reconciles stocks against it
+    runner.add_schedule("ledger-snapshot", "ledger_snapshot", every=settings.ledger_snapshot_seconds)
+    # Advances the demand forecasts once per completed day (incremental)
+    runner.add_schedule("demand-forecast", "forecast_refresh", every=settings.forecast_refresh_seconds)
+    # Dashboards read the stored insights instead of scanning the catalog per request
+    runner.add_schedule("insights", "insights", cron=settings.insights_cron)
+    # Full stock table for bulk consumers, fetched from /jobs/{id}/result
+    runner.add_schedule("stock-export", "stock_export", cron=settings.stock_export_cron,
+                        params={"format": settings.stock_export_format})
+    runner.start(settings.job_workers)
+
+
+@app.on_event("startup")
+def start_telemetry_flusher():
+    # Buffered sensor points reach the database within seconds even when sensors go quiet
+    telemetry.buffer.start()
+
+
+@app.on_event("shutdown")
+def flush_telemetry():
+    # Don't lose buffered sensor points on a clean shutdown
+    telemetry.buffer.stop()
+
+
+@app.on_event("shutdown")
+def stop_job_runner():
+    jobs.runner.stop()
 
 
 @app.get("/")
 def health_check():
-    return {"system": "Pharma Core", "status": "Ready for Frontend"}
\ No newline at end of file
+    return {"system": "Pharma Core", "status": "Ready for Frontend"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    # Prometheus text exposition (scrape target)
+    engines = {"primary": engine}
+    if read_engine is not engine:
+        engines["replica"] = read_engine
+    cache_stats = master_cache.stats()
+    db = SessionLocal()
+    try:
+        job_counts = jobs.counts(db)
+    finally:
+        db.close()
+    counters = {
+        "pharma_master_cache_hits_total": ("Master data cache hits.", [({}, cache_stats["hits"])]),
+        "pharma_master_cache_misses_total": ("Master data cache misses.", [({}, cache_stats["misses"])]),
+    }
+    extra = {
+        "pharma_master_cache_entries": ("Master data cache entries.", [({}, cache_stats["entries"])]),
+        "pharma_event_head_seq": ("Latest live stock event sequence.", [({}, events.bus.head())]),
+        "pharma_jobs": ("Background jobs by status.", [({"status": status}, count) for status, count in job_counts.items()]),
+    }
+    return PlainTextResponse(metrics.render(engines, extra, counters), media_type="text/plain; version=0.0.4")
+
+@app.get("/health/db")
+async def database_health():
+    # Readiness probe; goes through the async engine when it is enabled
+    if settings.async_enabled:
+        async with get_async_sessionmaker()() as session:
+            await session.execute(text("SELECT 1"))
+    else:
+        def ping():
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        await run_in_threadpool(ping)
+    return {"database": engine.dialect.name, "async": settings.async_enabled, "status": "OK"}
\ No newline at end of file
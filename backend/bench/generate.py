@@ -0,0 +1,431 @@
+"""
+Seeded synthetic data at configurable scale, for benchmarks (see bench/run.py).
+
+Fills a freshly migrated, empty database: manufacturers, products (Zipf popularity, ~8%
+cold chain), warehouses of AISLE-RACK-LEVEL bins (one cold aisle each), batches with
+realistic manufacture / shelf-life / expiry spread, stock rows spread over bins (fast movers
+near the aisle heads), and a year of dispatched orders with allocation slices. Derived
+tables are written to match, so the verify commands report no drift: opening ledger
+movements, the batch trace index, stock / sales rollups and the expiry calendar.
+
+    PHARMA_DATABASE_URL=sqlite:///./bench.db python -m app.core.migrations upgrade
+    PHARMA_DATABASE_URL=sqlite:///./bench.db python -m bench.generate --scale large
+    python -m bench.generate --scale small --products 8000 --seed 7
+
+The same seed and sizes always produce the same data. Stock rows whose batch has expired
+are already quarantined, as the expiry sweep would leave them.
+"""
+import argparse
+import bisect
+import math
+import random
+import sys
+import time
+from array import array
+from datetime import date, datetime, time as dtime, timedelta
+from itertools import accumulate
+from sqlalchemy import case, func, insert, select, text
+from sqlalchemy.orm import Session
+from app.core import migrations
+from app.core.database import engine
+from app.domains.master import models as master_models
+from app.domains.inventory import models as inv_models
+from app.domains.inventory.expiry import EXPIRED_REASON, rebuild_calendar
+from app.domains.sales import models as sales_models
+from app.domains.analytics.models import ProductStockRollup, ProductSalesDaily
+from app.domains.compliance.models import BatchSaleIndex
+
+SCALES = {
+    #          products  batches    stocks     order lines  warehouses aisles racks levels
+    "tiny":   (500,      2000,      5000,      20000,       2,         6,     10,   4),
+    "small":  (5000,     25000,     60000,     250000,      3,         10,    20,   4),
+    "medium": (50000,    500000,    1200000,   5000000,     4,         16,    30,   5),
+    "large":  (200000,   2000000,   5000000,   20000000,    6,         20,    40,   6),
+}
+CHUNK_SIZE = 20000
+HISTORY_DAYS = 365
+LINES_PER_ORDER = 4         # mean
+COLD_CHAIN_SHARE = 0.08
+EXCURSION_SHARE = 0.005     # of in-date stock rows, quarantined after a temperature excursion
+ZIPF_EXPONENT = 1.1
+OPEN_ORDER_SHARE = 0.005    # newest orders left ALLOCATED, so wave planning has work
+
+MOLECULES = [
+    ("Paracetamol", (500, 650, 1000)), ("Ibuprofen", (200, 400, 600)), ("Amoxicillin", (250, 500)),
+    ("Azithromycin", (250, 500)), ("Cetirizine", (5, 10)), ("Metformin", (500, 850, 1000)),
+    ("Atorvastatin", (10, 20, 40)), ("Amlodipine", (5, 10)), ("Pantoprazole", (20, 40)),
+    ("Omeprazole", (20, 40)), ("Losartan", (25, 50)), ("Telmisartan", (20, 40, 80)),
+    ("Levocetirizine", (5,)), ("Montelukast", (4, 10)), ("Diclofenac", (50, 75, 100)),
+    ("Aceclofenac", (100,)), ("Ciprofloxacin", (250, 500)), ("Ofloxacin", (200, 400)),
+    ("Doxycycline", (100,)), ("Cefixime", (100, 200)), ("Glimepiride", (1, 2, 4)),
+    ("Rosuvastatin", (5, 10, 20)), ("Clopidogrel", (75,)), ("Ondansetron", (4, 8)),
+    ("Domperidone", (10,)), ("Ranitidine", (150, 300)), ("Vitamin D3", (1000, 60000)),
+    ("Calcium Carbonate", (500,)), ("Folic Acid", (5,)), ("Prednisolone", (5, 10, 20)),
+]
+COLD_MOLECULES = [
+    ("Insulin Glargine", (100,)), ("Insulin Aspart", (100,)), ("Hepatitis B Vaccine", (20,)),
+    ("Rabies Vaccine", (2,)), ("Erythropoietin", (4000, 10000)), ("Enoxaparin", (40, 60)),
+]
+BRAND_HEADS = ["Cal", "Dol", "Cro", "Par", "Ben", "Zen", "Lio", "Nov", "Syn", "Max", "Ami", "Tel",
+               "Rex", "Vas", "Pan", "Oma", "Lev", "Mon", "Cip", "Dox", "Glu", "Ros", "Ond", "Fol"]
+BRAND_TAILS = ["pol", "zin", "max", "cort", "nex", "vit", "tab", "zole", "mox", "cin", "pril", "dine"]
+FORMS = [("TAB", "STRIP", 0.7), ("CAP", "STRIP", 0.15), ("SYP", "BOTTLE", 0.15)]
+SCHEDULES = [("H", 0.5), ("G", 0.2), ("H1", 0.1), (None, 0.18), ("X", 0.02)]
+CUSTOMERS = [f"{kind} {name}" for kind in ("Apollo", "City", "Care", "Wellness", "Life", "MedPlus", "Sai", "Om")
+             for name in ("Pharmacy", "Chemists", "Medicals", "Hospital", "Clinic", "Drug House")]
+
+
+def _log(message: str, started: float):
+    print(f"[{time.perf_counter() - started:7.1f}s] {message}", flush=True)
+
+def _weighted(rng: random.Random, options):
+    """options: (value, ..., weight) tuples; returns the value, or the tuple of values."""
+    option = rng.choices(options, weights=[option[-1] for option in options])[0]
+    return option[0] if len(option) == 2 else option[:-1]
+
+
+class _Writer:
+    """
+    Buffers rows per table and inserts them CHUNK_SIZE at a time (one executemany, one commit).
+    A full buffer flushes every table in first-use order, so referenced rows always land first.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.buffers = {}
+        self.counts = {}
+
+    def add(self, model, row: dict):
+        buffer = self.buffers.setdefault(model, [])
+        buffer.append(row)
+        if len(buffer) >= CHUNK_SIZE:
+            self.flush()
+
+    def flush(self):
+        for table, rows in self.buffers.items():
+            if rows:
+                self.conn.execute(insert(table), rows)
+                self.counts[table.__tablename__] = self.counts.get(table.__tablename__, 0) + len(rows)
+                rows.clear()
+        self.conn.commit()
+
+
+class Generator:
+    def __init__(self, products: int, batches: int, stocks: int, order_lines: int,
+                 warehouses: int, aisles: int, racks: int, levels: int, seed: int, today: date):
+        if not products <= batches <= stocks:
+            raise ValueError("need products <= batches <= stocks")
+        self.n_products, self.n_batches, self.n_stocks, self.n_lines = products, batches, stocks, order_lines
+        self.warehouses, self.aisles, self.racks, self.levels = warehouses, aisles, racks, levels
+        self.rng = random.Random(seed)
+        self.today = today
+
+        # Per-product / per-stock state kept as flat arrays: 5M stock rows stay ~50 MB
+        self.popularity = []                 # product index -> weight (Zipf over a shuffled rank)
+        self.rank = array("i")               # product index -> popularity rank (0 = best seller)
+        self.cold = bytearray(products)
+        self.price = array("d")
+        self.first_stock = array("i")        # product index -> first stock id (stock ids are contiguous per product)
+        self.stock_batch = array("i", [0])   # stock id -> batch id
+        self.stock_bin = array("i", [0])     # stock id -> bin id
+
+    # --- MASTER DATA ---
+
+    def manufacturers(self, writer: _Writer):
+        self.n_manufacturers = max(10, self.n_products // 250)
+        for i in range(1, self.n_manufacturers + 1):
+            writer.add(master_models.Manufacturer, {
+                "id": i, "name": f"{self.rng.choice(BRAND_HEADS)}{self.rng.choice(BRAND_TAILS)} Pharma {i}",
+                "address": f"Plot {self.rng.randint(1, 400)}, Industrial Area", "license_number": f"DL-{i:06d}",
+                "is_active": True
+            })
+        writer.flush()
+
+    def products(self, writer: _Writer):
+        ranks = list(range(self.n_products))
+        self.rng.shuffle(ranks)
+        self.rank = array("i", ranks)
+        self.popularity = [1.0 / (rank + 1) ** ZIPF_EXPONENT for rank in ranks]
+
+        for i in range(self.n_products):
+            cold = self.rng.random() < COLD_CHAIN_SHARE
+            self.cold[i] = cold
+            molecule, strengths = self.rng.choice(COLD_MOLECULES if cold else MOLECULES)
+            strength = self.rng.choice(strengths)
+            form, uom = ("INJ", "VIAL") if cold else _weighted(self.rng, FORMS)
+            brand = f"{self.rng.choice(BRAND_HEADS)}{self.rng.choice(BRAND_TAILS)}"
+            self.price.append(round(math.exp(self.rng.gauss(4.2, 0.8)), 2))  # median ~65
+            writer.add(master_models.Product, {
+                "id": i + 1,
+                "sku_code": f"{molecule[:4].upper()}-{strength}-{form}-{i + 1:06d}",
+                "name": f"{brand} {strength}",
+                "composition": f"{molecule} {strength}{'IU' if cold and 'Insulin' in molecule else 'mg'}",
+                "manufacturer_id": self.rng.randint(1, self.n_manufacturers),
+                "base_uom": uom,
+                "requires_cold_chain": cold,
+                "min_temp": 2.0 if cold else None,
+                "max_temp": 8.0 if cold else None,
+                "hsn_code": "3004" if not cold else "3002",
+                "schedule_type": _weighted(self.rng, SCHEDULES),
+            })
+        writer.flush()
+
+    # --- LOCATIONS ---
+
+    def _bin_id(self, warehouse: int, aisle: int, rack: int, level: int) -> int:
+        return 1 + ((warehouse * self.aisles + aisle) * self.racks + rack) * self.levels + level
+
+    def bins(self, writer: _Writer):
+        # Room for about three average fills (~150 units a stock row), so putaway meets full and empty bins
+        per_bin = self.n_stocks / (self.warehouses * self.aisles * self.racks * self.levels)
+        capacity = max(100, -(-int(3 * 150 * per_bin) // 100) * 100)
+        for w in range(self.warehouses):
+            writer.add(inv_models.Warehouse, {"id": w + 1, "name": f"Bench DC {w + 1}", "location_code": f"BDC-{w + 1:02d}"})
+            for a in range(self.aisles):
+                # Two-letter aisles keep codes unique across warehouses and parseable (AISLE-RACK-LEVEL)
+                aisle_code = chr(65 + w % 26) + chr(65 + a)
+                for r in range(self.racks):
+                    for level in range(self.levels):
+                        writer.add(inv_models.Bin, {
+                            "id": self._bin_id(w, a, r, level),
+                            "bin_code": f"{aisle_code}-{r + 1:02d}-{level + 1:02d}",
+                            "is_cold_storage": a == self.aisles - 1,  # last aisle is the cold room
+                            "warehouse_id": w + 1,
+                            "capacity": capacity
+                        })
+        writer.flush()
+
+    def _pick_bin(self, product: int) -> int:
+        rng = self.rng
+        warehouse = rng.randrange(self.warehouses)
+        if self.cold[product]:
+            aisle = self.aisles - 1
+        elif rng.random() < 0.7:
+            aisle = product % (self.aisles - 1)   # home aisle
+        else:
+            aisle = rng.randrange(self.aisles - 1)
+        # Fast movers are slotted near the head of the aisle
+        fast = self.rank[product] < self.n_products // 10
+        rack = min(self.racks - 1, int(rng.betavariate(1, 4 if fast else 1.2) * self.racks))
+        return self._bin_id(warehouse, aisle, rack, rng.randrange(self.levels))
+
+    # --- BATCHES & STOCK ---
+
+    def _spread(self, total: int, count: int, weights=None):
+        """`total` items over `count` slots, at least one each; proportional to weights when given."""
+        extra = total - count
+        if weights is None:
+            return [1 + extra * (i + 1) // count - extra * i // count for i in range(count)]
+        scale = extra / sum(weights)
+        shares = [int(w * scale) for w in weights]
+        leftover = extra - sum(shares)
+        for i in sorted(range(count), key=lambda i: -weights[i])[:leftover]:
+            shares[i] += 1
+        return [1 + share for share in shares]
+
+    def stock(self, writer: _Writer):
+        rng = self.rng
+        # Best sellers carry more batches (more frequent replenishment), sub-linearly
+        batches_per_product = self._spread(self.n_batches, self.n_products, [p ** 0.5 for p in self.popularity])
+        stocks_per_batch = self._spread(self.n_stocks, self.n_batches)
+        now = datetime.utcnow()
+        batch_id = stock_id = 0
+        self.expired_rows = 0
+
+        for product in range(self.n_products):
+            self.first_stock.append(stock_id + 1)
+            cold = self.cold[product]
+            for j in range(batches_per_product[product]):
+                batch_id += 1
+                # Recent batches dominate what is on hand; a tail is near or past expiry
+                mfg = self.today - timedelta(days=int(rng.betavariate(1.2, 3) * 1095))
+                shelf_months = rng.choice((12, 18) if cold else (18, 24, 24, 36))
+                expiry = mfg + timedelta(days=shelf_months * 30)
+                mrp = round(self.price[product] * (1 + 0.05 * (self.today - mfg).days / 365), 2)
+                writer.add(inv_models.Batch, {
+                    "id": batch_id, "batch_number": f"B{mfg:%y%m}{j + 1:04d}", "product_id": product + 1,
+                    "expiry_date": expiry, "mfg_date": mfg, "mrp": mrp, "purchase_rate": round(mrp * 0.7, 2)
+                })
+
+                expired = expiry < self.today
+                bins = set()
+                while len(bins) < stocks_per_batch[batch_id - 1]:
+                    bins.add(self._pick_bin(product))
+                for bin_id in sorted(bins):
+                    stock_id += 1
+                    quantity = 1 + int(rng.lognormvariate(4.5, 1.0))  # median ~90 units
+                    reason = EXPIRED_REASON if expired else (
+                        "Temp Excursion (synthetic)" if rng.random() < EXCURSION_SHARE else None
+                    )
+                    self.expired_rows += expired
+                    self.stock_batch.append(batch_id)
+                    self.stock_bin.append(bin_id)
+                    writer.add(inv_models.Stock, {
+                        "id": stock_id, "batch_id": batch_id, "bin_id": bin_id, "quantity": quantity,
+                        "is_quarantined": reason is not None, "quarantine_reason": reason
+                    })
+                    # Opening balance, so the ledger reconciles with the stock rows
+                    writer.add(inv_models.StockMovement, {
+                        "id": stock_id, "created_at": now, "movement_type": inv_models.MovementType.OPENING.value,
+                        "stock_id": stock_id, "product_id": product + 1,
+                        "warehouse_id": 1 + (bin_id - 1) // (self.aisles * self.racks * self.levels),
+                        "quantity_delta": quantity, "quarantined_delta": quantity if reason else 0,
+                        "reference": "bench"
+                    })
+        self.first_stock.append(stock_id + 1)
+        writer.flush()
+
+    # --- ORDER HISTORY ---
+
+    def orders(self, writer: _Writer):
+        rng = self.rng
+        n_orders = max(1, self.n_lines // LINES_PER_ORDER)
+        cum_weights = list(accumulate(self.popularity))
+        total_weight = cum_weights[-1]
+        # Mild growth over the year plus a weekly cycle (quiet Sundays)
+        day_weights = [
+            (1 + 0.3 * d / HISTORY_DAYS) * (0.4 if (self.today - timedelta(days=HISTORY_DAYS - d)).weekday() == 6 else 1.0)
+            for d in range(HISTORY_DAYS)
+        ]
+        days = sorted(rng.choices(range(HISTORY_DAYS), weights=day_weights, k=n_orders))
+        open_from = n_orders - int(n_orders * OPEN_ORDER_SHARE)
+
+        line_id, lines_left = 0, self.n_lines
+        for order in range(n_orders):
+            order_id = order + 1
+            day = self.today - timedelta(days=HISTORY_DAYS - days[order])
+            created = datetime.combine(day, dtime(8)) + timedelta(seconds=rng.randrange(12 * 3600))
+            customer = rng.choice(CUSTOMERS)
+            if order == n_orders - 1:
+                n_lines = lines_left
+            else:
+                n_lines = min(lines_left - (n_orders - order - 1), 1 + int(rng.expovariate(1 / (LINES_PER_ORDER - 1))))
+                n_lines = max(1, n_lines)
+            lines_left -= n_lines
+
+            total, lines = 0.0, []
+            for _ in range(n_lines):
+                line_id += 1
+                product = bisect.bisect_left(cum_weights, rng.random() * total_weight)
+                product = min(product, self.n_products - 1)
+                stock_id = rng.randrange(self.first_stock[product], self.first_stock[product + 1])
+                quantity = 1 + int(rng.expovariate(0.25))
+                unit_price = round(self.price[product] * 0.9, 2)
+                total += quantity * unit_price
+                lines.append((line_id, product + 1, stock_id, quantity, unit_price))
+
+            status = sales_models.OrderStatus.ALLOCATED if order >= open_from else sales_models.OrderStatus.DISPATCHED
+            writer.add(sales_models.SalesOrder, {
+                "id": order_id, "customer_name": customer, "status": status.value,
+                "total_amount": round(total, 2), "created_at": created
+            })
+            for item_id, product_id, stock_id, quantity, unit_price in lines:
+                batch_id, bin_id = self.stock_batch[stock_id], self.stock_bin[stock_id]
+                writer.add(sales_models.SalesOrderItem, {
+                    "id": item_id, "order_id": order_id, "product_id": product_id, "quantity": quantity,
+                    "unit_price": unit_price, "allocated_batch_id": batch_id
+                })
+                writer.add(sales_models.SalesOrderAllocation, {
+                    "id": item_id, "order_item_id": item_id, "stock_id": stock_id, "batch_id": batch_id,
+                    "bin_id": bin_id, "quantity": quantity
+                })
+                writer.add(BatchSaleIndex, {
+                    "id": item_id, "batch_id": batch_id, "product_id": product_id, "order_id": order_id,
+                    "order_item_id": item_id, "customer_name": customer, "order_date": created, "quantity": quantity
+                })
+        writer.flush()
+        self.n_orders = n_orders
+
+
+# --- DERIVED TABLES ---
+
+def _rollups(db: Session):
+    # Set-based (INSERT ... SELECT): rollups.rebuild_rollups materialises the sales history in Python
+    stock = inv_models.Stock
+    quarantined = func.sum(case((stock.is_quarantined == True, stock.quantity), else_=0))
+    db.execute(insert(ProductStockRollup).from_select(
+        ["product_id", "on_hand", "quarantined"],
+        select(inv_models.Batch.product_id, func.sum(stock.quantity), quarantined)
+        .join(stock, stock.batch_id == inv_models.Batch.id)
+        .group_by(inv_models.Batch.product_id)
+    ))
+    day = func.date(sales_models.SalesOrder.created_at)
+    db.execute(insert(ProductSalesDaily).from_select(
+        ["product_id", "day", "quantity"],
+        select(sales_models.SalesOrderItem.product_id, day, func.sum(sales_models.SalesOrderItem.quantity))
+        .join(sales_models.SalesOrder, sales_models.SalesOrderItem.order_id == sales_models.SalesOrder.id)
+        .group_by(sales_models.SalesOrderItem.product_id, day)
+    ))
+    db.commit()
+
+def _advance_sequences(conn):
+    # Explicit ids bypass Postgres sequences; move them past the loaded rows
+    for table in ("manufacturers", "products", "warehouses", "bins", "batches", "stocks", "stock_movements",
+                  "sales_orders", "sales_order_items", "sales_order_allocations", "batch_sales_index"):
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), coalesce((SELECT max(id) FROM {table}), 1))"
+        ))
+    conn.commit()
+
+
+def generate(generator: Generator):
+    started = time.perf_counter()
+    with engine.connect() as conn:
+        if conn.execute(select(func.count()).select_from(master_models.Product)).scalar():
+            raise SystemExit("refusing to generate into a database that already has products; use an empty one")
+        if conn.dialect.name == "sqlite":
+            conn.exec_driver_sql("PRAGMA synchronous=OFF")
+        writer = _Writer(conn)
+
+        generator.manufacturers(writer)
+        generator.products(writer)
+        _log(f"{generator.n_products} products, {generator.n_manufacturers} manufacturers", started)
+        generator.bins(writer)
+        _log(f"{writer.counts.get('bins', 0)} bins in {generator.warehouses} warehouse(s)", started)
+        generator.stock(writer)
+        _log(f"{generator.n_batches} batches, {generator.n_stocks} stock rows "
+             f"({generator.expired_rows} expired, quarantined)", started)
+        generator.orders(writer)
+        _log(f"{generator.n_orders} orders, {generator.n_lines} order lines", started)
+        if conn.dialect.name == "postgresql":
+            _advance_sequences(conn)
+
+    db = Session(bind=engine)
+    try:
+        _rollups(db)
+        rebuild_calendar(db)
+    finally:
+        db.close()
+    _log("rollups and expiry calendar", started)
+
+    with engine.connect() as conn:
+        conn.exec_driver_sql("ANALYZE")
+        conn.commit()
+    _log("analyzed; done", started)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m bench.generate", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--products", type=int)
+    parser.add_argument("--batches", type=int)
+    parser.add_argument("--stocks", type=int)
+    parser.add_argument("--order-lines", type=int)
+    parser.add_argument("--warehouses", type=int)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--today", type=date.fromisoformat, default=date.today(),
+                        help="reference date for expiry and order history (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    if migrations.pending():
+        sys.exit("schema is behind; run: python -m app.core.migrations upgrade")
+    products, batches, stocks, lines, warehouses, aisles, racks, levels = SCALES[args.scale]
+    try:
+        generator = Generator(
+            products=args.products or products, batches=args.batches or batches, stocks=args.stocks or stocks,
+            order_lines=args.order_lines or lines, warehouses=args.warehouses or warehouses,
+            aisles=aisles, racks=racks, levels=levels, seed=args.seed, today=args.today
+        )
+    except ValueError as exc:
+        sys.exit(str(exc))
+    generate(generator)
@@ -0,0 +1,277 @@
+"""
+Endpoint benchmarks: drives the ASGI app in-process (no server, no network) under
+concurrency and reports p50/p95/p99 latency, throughput and SQL statements per request
+for each endpoint, then compares against a stored baseline. A regression exits non-zero.
+
+    PHARMA_DATABASE_URL=sqlite:///./bench.db python -m bench.run --save-baseline
+    PHARMA_DATABASE_URL=sqlite:///./bench.db python -m bench.run                # compare
+    python -m bench.run --endpoints orders,trace --requests 500 --concurrency 16
+
+Run it against a database filled by bench.generate. The write endpoints (orders, receive,
+telemetry) change the data, so the same baseline is only meaningful against a fresh copy of
+the generated database and on the same machine.
+
+A regression is: p95 latency above baseline by more than --tolerance (and by at least
+MIN_REGRESSION_MS), throughput below baseline by more than --tolerance, more SQL statements
+per request than the baseline (beyond STATEMENT_SLACK), or errors where the baseline had none.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import httpx
+from sqlalchemy import func
+from app.core import metrics
+from app.core.database import SessionLocal
+from app.main import app
+from app.domains.inventory import models as inv_models, telemetry
+from app.domains.analytics.models import ProductStockRollup
+from app.domains.compliance.models import BatchSaleIndex
+
+DEFAULT_BASELINE = Path(__file__).with_name("baseline.json")
+DEFAULT_REQUESTS = 200
+DEFAULT_CONCURRENCY = 8
+DEFAULT_WARMUP = 10
+DEFAULT_TOLERANCE = 0.25
+MIN_REGRESSION_MS = 2.0     # p95 differences below this are noise at any tolerance
+STATEMENT_SLACK = 0.10      # statement counts vary a little with the rows hit; an N+1 multiplies them
+FIXTURE_SIZE = 200
+
+
+# --- FIXTURE ---
+
+@dataclass
+class Fixture:
+    """Ids sampled once from the database so request bodies hit real, sellable rows."""
+    sellable_products: List[int]                 # plenty of unquarantined stock
+    bin_codes: List[str]
+    traced_batches: List[Tuple[int, str]]        # (product_id, batch_number) with sales
+    run_tag: str = field(default_factory=lambda: f"{int(time.time()) % 100000:05d}")
+
+def load_fixture(rng: random.Random) -> Fixture:
+    db = SessionLocal()
+    try:
+        sellable = ProductStockRollup.on_hand - ProductStockRollup.quarantined
+        products = db.query(ProductStockRollup.product_id)\
+            .filter(sellable >= 500)\
+            .order_by(sellable.desc())\
+            .limit(FIXTURE_SIZE)\
+            .all()
+        bins = db.query(inv_models.Bin.bin_code).order_by(inv_models.Bin.id).all()
+
+        # Random ids over the index instead of ORDER BY random(): constant cost at any scale
+        max_id = db.query(func.max(BatchSaleIndex.id)).scalar() or 0
+        sample_ids = {rng.randint(1, max_id) for _ in range(FIXTURE_SIZE)} if max_id else set()
+        batches = db.query(inv_models.Batch.product_id, inv_models.Batch.batch_number)\
+            .join(BatchSaleIndex, BatchSaleIndex.batch_id == inv_models.Batch.id)\
+            .filter(BatchSaleIndex.id.in_(sample_ids))\
+            .distinct()\
+            .all()
+    finally:
+        db.close()
+
+    fixture = Fixture(
+        sellable_products=[row.product_id for row in products],
+        bin_codes=rng.sample([row.bin_code for row in bins], min(len(bins), FIXTURE_SIZE * 5)),
+        traced_batches=[(row.product_id, row.batch_number) for row in batches]
+    )
+    if not (fixture.sellable_products and fixture.bin_codes and fixture.traced_batches):
+        raise SystemExit("database has no sellable stock / bins / sales to benchmark; run bench.generate first")
+    return fixture
+
+
+# --- SCENARIOS ---
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    route: str      # route template, as labelled by app.core.metrics
+    build: Callable[[Fixture, random.Random, int], Tuple[str, Optional[dict]]]   # -> (url, json body)
+
+def _order(fixture: Fixture, rng: random.Random, i: int):
+    products = rng.sample(fixture.sellable_products, min(len(fixture.sellable_products), rng.randint(1, 4)))
+    return "/sales/orders/", {
+        "customer_name": "Bench Customer",
+        "items": [{"product_id": pid, "quantity": rng.randint(1, 3), "unit_price": 10.0} for pid in products]
+    }
+
+def _receive(fixture: Fixture, rng: random.Random, i: int):
+    today = date.today()
+    return "/inventory/inbound/receive/", {
+        "product_id": rng.choice(fixture.sellable_products),
+        "batch_number": f"BENCH{fixture.run_tag}-{i:05d}",
+        "expiry_date": (today + timedelta(days=540)).isoformat(),
+        "mfg_date": (today - timedelta(days=30)).isoformat(),
+        "mrp": 50.0,
+        "quantity": 100,
+        "target_bin_code": rng.choice(fixture.bin_codes)
+    }
+
+def _telemetry(fixture: Fixture, rng: random.Random, i: int):
+    # In range for cold-chain limits: exercises the profile path without quarantining stock
+    return "/inventory/iot/telemetry/", {"bin_code": rng.choice(fixture.bin_codes), "temperature": round(rng.uniform(3, 7), 1)}
+
+def _live_stock(fixture: Fixture, rng: random.Random, i: int):
+    return "/inventory/stock/live/", None
+
+def _insights(fixture: Fixture, rng: random.Random, i: int):
+    return "/analytics/insights/", None
+
+def _trace(fixture: Fixture, rng: random.Random, i: int):
+    product_id, batch_number = rng.choice(fixture.traced_batches)
+    return f"/compliance/trace/{batch_number}?product_id={product_id}", None
+
+SCENARIOS = {
+    scenario.name: scenario for scenario in (
+        Scenario("orders", "POST", "/sales/orders/", _order),
+        Scenario("receive", "POST", "/inventory/inbound/receive/", _receive),
+        Scenario("telemetry", "POST", "/inventory/iot/telemetry/", _telemetry),
+        Scenario("live_stock", "GET", "/inventory/stock/live/", _live_stock),
+        Scenario("insights", "GET", "/analytics/insights/", _insights),
+        Scenario("trace", "GET", "/compliance/trace/{batch_number}", _trace),
+    )
+}
+
+
+# --- DRIVER ---
+
+def _percentile(ordered: List[float], p: float) -> float:
+    # Nearest rank
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1))]
+
+async def _drive(client: httpx.AsyncClient, scenario: Scenario, fixture: Fixture, rng: random.Random,
+                 requests: int, concurrency: int, offset: int = 0):
+    latencies, errors = [], []
+    pending = iter(range(offset, offset + requests))
+
+    async def worker():
+        for i in pending:
+            url, body = scenario.build(fixture, rng, i)
+            started = time.perf_counter()
+            response = await client.request(scenario.method, url, json=body)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors.append(f"{response.status_code} {response.text[:120]}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, fixture: Fixture, rng: random.Random,
+                       requests: int, concurrency: int, warmup: int) -> dict:
+    if warmup:
+        await _drive(client, scenario, fixture, rng, warmup, min(concurrency, warmup))
+
+    labels = (scenario.method, scenario.route)
+    statements_before, count_before = metrics.REQUEST_STATEMENTS.totals(labels)
+    latencies, errors, elapsed = await _drive(client, scenario, fixture, rng, requests, concurrency, offset=warmup)
+    statements_after, count_after = metrics.REQUEST_STATEMENTS.totals(labels)
+
+    ordered = sorted(latencies)
+    counted = count_after - count_before
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "p50_ms": round(_percentile(ordered, 50) * 1000, 2),
+        "p95_ms": round(_percentile(ordered, 95) * 1000, 2),
+        "p99_ms": round(_percentile(ordered, 99) * 1000, 2),
+        "rps": round(len(latencies) / elapsed, 1),
+        "statements": round((statements_after - statements_before) / counted, 2) if counted else None,
+    }
+
+async def run(names: List[str], requests: int, concurrency: int, warmup: int, seed: int) -> Dict[str, dict]:
+    rng = random.Random(seed)
+    fixture = load_fixture(rng)
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for name in names:
+            results[name] = await run_scenario(client, SCENARIOS[name], fixture, rng, requests, concurrency, warmup)
+            _print_row(name, results[name])
+    telemetry.buffer.flush()
+    return results
+
+
+# --- REPORT / BASELINE ---
+
+_COLUMNS = ("requests", "errors", "p50_ms", "p95_ms", "p99_ms", "rps", "statements")
+
+def _print_header():
+    print(f"{'endpoint':<12}" + "".join(f"{column:>12}" for column in _COLUMNS))
+
+def _print_row(name: str, result: dict):
+    cells = "".join(f"{'-' if result[c] is None else result[c]:>12}" for c in _COLUMNS)
+    print(f"{name:<12}{cells}", flush=True)
+    if result["first_error"]:
+        print(f"{'':<12}first error: {result['first_error']}")
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """Regression messages; empty when every endpoint is within tolerance of the baseline."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        p95_limit = max(base["p95_ms"] * (1 + tolerance), base["p95_ms"] + MIN_REGRESSION_MS)
+        if result["p95_ms"] > p95_limit:
+            regressions.append(f"{name}: p95 {result['p95_ms']} ms > {p95_limit:.2f} ms (baseline {base['p95_ms']})")
+        if result["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {result['rps']} req/s < baseline {base['rps']} req/s")
+        if result["statements"] is not None and base.get("statements") is not None \
+                and result["statements"] > base["statements"] * (1 + STATEMENT_SLACK):
+            regressions.append(f"{name}: {result['statements']} SQL statements/request > baseline {base['statements']}")
+        if result["errors"] and not base.get("errors"):
+            regressions.append(f"{name}: {result['errors']} error(s), baseline had none ({result['first_error']})")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m bench.run", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--endpoints", default=",".join(SCENARIOS), help=f"comma separated: {', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS, help="measured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--warmup", type=int, default=DEFAULT_WARMUP, help="unmeasured requests per endpoint")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed slowdown, 0.25 = 25%%")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.endpoints.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        sys.exit(f"unknown endpoint(s): {', '.join(unknown)}")
+
+    _print_header()
+    results = asyncio.run(run(names, args.requests, args.concurrency, args.warmup, args.seed))
+    settings = {"requests": args.requests, "concurrency": args.concurrency, "warmup": args.warmup}
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps({"settings": settings, "endpoints": results}, indent=2) + "\n")
+        print(f"baseline saved to {args.baseline}")
+        sys.exit(0)
+    if not args.baseline.exists():
+        print(f"no baseline at {args.baseline}; run with --save-baseline to create one")
+        sys.exit(0)
+
+    stored = json.loads(args.baseline.read_text())
+    if stored.get("settings") != settings:
+        print(f"WARNING: baseline was recorded with {stored.get('settings')}, this run used {settings}")
+    regressions = compare(results, stored.get("endpoints", {}), args.tolerance)
+    if regressions:
+        print("\n" + "!" * 72)
+        print(f"PERFORMANCE REGRESSION against {args.baseline}:")
+        for message in regressions:
+            print(f"  - {message}")
+        print("!" * 72)
+        sys.exit(1)
+    print(f"no regression against {args.baseline} (tolerance {args.tolerance:.0%})")
@@ -0,0 +1,78 @@
+import os
+import tempfile
+
+# Settings are read at import: point the app at a throwaway SQLite file first
+_db_dir = tempfile.mkdtemp(prefix="pharma-tests-")
+os.environ["PHARMA_DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+os.environ.setdefault("PHARMA_JOB_WORKERS", "0")
+
+from datetime import date
+import pytest
+from app import main  # noqa: F401  (registers every model)
+from app.core import migrations
+from app.core.database import Base, SessionLocal, engine
+from app.domains.inventory import models as inv_models, schemas as inv_schemas, receiving, putaway, telemetry
+from app.domains.master import models as master_models
+from app.domains.master.cache import cache as master_cache
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    migrations.upgrade(engine)
+    yield
+    engine.dispose()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
+        # Every test starts from empty tables and cold caches (SQLite reuses ids)
+        with engine.begin() as conn:
+            for table in reversed(Base.metadata.sorted_tables):
+                conn.execute(table.delete())
+        master_cache.clear()
+        putaway.index.invalidate()
+        telemetry.cache.clear()
+
+
+class Floor:
+    """One warehouse built up through the real write paths (receipts go through the ledger)."""
+
+    def __init__(self, db):
+        self.db = db
+        self.warehouse = inv_models.Warehouse(name="Main", location_code="MAIN-01")
+        db.add(self.warehouse)
+        db.commit()
+
+    def product(self, sku: str, cold: bool = False) -> master_models.Product:
+        product = master_models.Product(sku_code=sku, name=sku, requires_cold_chain=cold)
+        self.db.add(product)
+        self.db.commit()
+        return product
+
+    def bin(self, code: str, cold: bool = False, capacity: int = None) -> inv_models.Bin:
+        row = inv_models.Bin(bin_code=code, is_cold_storage=cold, warehouse_id=self.warehouse.id, capacity=capacity)
+        self.db.add(row)
+        self.db.commit()
+        putaway.index.invalidate()
+        return row
+
+    def receive(self, product, batch_number: str, expiry: date, quantity: int, bin_code: str):
+        results, bin_ids = receiving.receive_lines(self.db, [inv_schemas.InboundTransaction(
+            product_id=product.id, batch_number=batch_number, expiry_date=expiry, mrp=10.0,
+            quantity=quantity, target_bin_code=bin_code
+        )])
+        self.db.commit()
+        receiving.after_commit(bin_ids)
+        assert results[0].status == "RECEIVED", results[0].detail
+        return results[0]
+
+
+@pytest.fixture
+def floor(db):
+    return Floor(db)
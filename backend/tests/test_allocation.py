@@ -0,0 +1,72 @@
+from datetime import date, timedelta
+import pytest
+from app.domains.inventory import models as inv_models, ledger
+from app.domains.sales.allocation import FefoAllocator, InsufficientStock
+
+
+@pytest.fixture
+def stocked(floor):
+    product = floor.product("PARA-500")
+    floor.bin("A-01-01")
+    floor.bin("A-01-02")
+    today = date.today()
+    late = floor.receive(product, "LATE", today + timedelta(days=300), 10, "A-01-01")
+    soon = floor.receive(product, "SOON", today + timedelta(days=30), 5, "A-01-02")
+    floor.receive(product, "GONE", today - timedelta(days=1), 50, "A-01-01")  # expired: never allocated
+    return product, soon.stock_id, late.stock_id
+
+
+def quantities(db):
+    return dict(db.query(inv_models.Stock.id, inv_models.Stock.quantity))
+
+
+def test_line_splits_across_batches_in_fefo_order(db, stocked):
+    product, soon, late = stocked
+    allocator = FefoAllocator(db, page_size=1)  # forces keyset paging between candidates
+
+    lines = allocator.allocate(product.id, 8)
+
+    assert [(line.stock_id, line.quantity) for line in lines] == [(soon, 5), (late, 3)]
+    assert lines[0].expiry_date < lines[1].expiry_date
+
+
+def test_unfillable_line_reserves_nothing(db, stocked):
+    product, soon, late = stocked
+    allocator = FefoAllocator(db)
+
+    with pytest.raises(InsufficientStock) as raised:
+        allocator.allocate(product.id, 16)
+    assert raised.value.available == 15
+
+    # The failed line left the index untouched: all 15 units are still there
+    lines = allocator.allocate(product.id, 15)
+    assert sum(line.quantity for line in lines) == 15
+
+
+def test_release_rolls_back_an_earlier_line(db, stocked):
+    product, soon, late = stocked
+    allocator = FefoAllocator(db)
+
+    first = allocator.allocate(product.id, 6)
+    allocator.release(product.id, first)
+    again = allocator.allocate(product.id, 6)
+
+    assert [(line.stock_id, line.quantity) for line in again] == [(soon, 5), (late, 1)]
+    allocator.flush(reference="order:1")
+    db.commit()
+    stock = quantities(db)
+    assert (stock[soon], stock[late]) == (0, 9)
+
+
+def test_flush_deducts_and_journals(db, stocked):
+    product, soon, late = stocked
+    allocator = FefoAllocator(db)
+    allocator.lock()
+    allocator.allocate(product.id, 4)
+    allocator.allocate(product.id, 4)
+    allocator.flush(reference="order:2")
+    db.commit()
+
+    stock = quantities(db)
+    assert (stock[soon], stock[late]) == (0, 7)
+    assert ledger.reconcile(db, full=True) == []
@@ -0,0 +1,29 @@
+import json
+from app.domains.sales import bulk
+
+
+def test_rejections_name_the_field_without_echoing_input():
+    body = json.dumps([
+        {"customer_name": "Apollo", "items": [{"product_id": 1, "quantity": "lots", "unit_price": 2.0}]},
+        {"items": []},
+        5
+    ]).encode()
+
+    orders, rejected = bulk.parse_orders(body, "application/json")
+
+    assert orders == []
+    assert [(result.index, result.detail) for result in rejected] == [
+        (0, "items.0.quantity: Input should be a valid integer, unable to parse string as an integer"),
+        (1, "customer_name: Field required"),
+        (2, "Expected an order object")
+    ]
+    assert "lots" not in rejected[0].detail
+
+
+def test_ndjson_lines_are_parsed_independently():
+    body = b'{"customer_name": "A", "items": []}\n{not json\n\n{"customer_name": "B", "items": []}\n'
+
+    orders, rejected = bulk.parse_orders(body, "application/x-ndjson")
+
+    assert [(index, order.customer_name) for index, order in orders] == [(0, "A"), (2, "B")]
+    assert [result.index for result in rejected] == [1]
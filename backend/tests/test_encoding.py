@@ -0,0 +1,137 @@
+import csv
+import gzip
+import io
+import json
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+from app import main
+from app.core import encoding
+from app.core.encoding import CompressionMiddleware, dumps
+from app.domains.inventory import exports
+
+
+def test_dumps_handles_what_the_routes_return():
+    content = {
+        "day": date(2026, 3, 1), "at": datetime(2026, 3, 1, 8, 30), "price": Decimal("12.50"),
+        "units": np.int64(7), "rates": np.array([1.5, 2.0]), "tags": {"cold"}, 3: "int key"
+    }
+    assert json.loads(dumps(content)) == {
+        "day": "2026-03-01", "at": "2026-03-01T08:30:00", "price": 12.5,
+        "units": 7, "rates": [1.5, 2.0], "tags": ["cold"], "3": "int key"
+    }
+
+
+@pytest.mark.parametrize("header, with_brotli, expected", [
+    ("gzip, deflate, br", True, "br"),
+    ("gzip, deflate, br", False, "gzip"),
+    ("br;q=0, gzip;q=0.5", True, "gzip"),
+    ("*", False, "gzip"),
+    ("gzip;q=0, identity", False, None),
+    ("", True, None),
+])
+def test_negotiate_honours_quality(monkeypatch, header, with_brotli, expected):
+    monkeypatch.setattr(encoding, "brotli", object() if with_brotli else None)
+    assert encoding._negotiate(header) == expected
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(encoding, "brotli", None)  # gzip: always available, easy to check
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+    @app.get("/small")
+    def small():
+        return PlainTextResponse("ok")
+
+    @app.get("/big")
+    def big():
+        return PlainTextResponse("row\n" * 1000, headers={"ETag": '"v1"'})
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse((f"line {n}\n" for n in range(5000)), media_type="text/plain")
+
+    @app.get("/events")
+    def events():
+        return StreamingResponse(iter(["data: 1\n\n"] * 100), media_type="text/event-stream")
+
+    @app.get("/binary")
+    def binary():
+        return Response(b"\x00" * 5000, media_type="application/vnd.apache.parquet")
+
+    return TestClient(app)
+
+
+def raw(client, path):
+    # httpx decodes gzip transparently: ask for the bytes as sent
+    with client.stream("GET", path, headers={"Accept-Encoding": "gzip"}) as response:
+        return response, b"".join(response.iter_raw())
+
+
+def test_small_bodies_go_out_as_is(client):
+    response, body = raw(client, "/small")
+    assert "content-encoding" not in response.headers
+    assert body == b"ok"
+
+
+def test_large_bodies_are_gzipped_with_a_weak_etag(client):
+    response, body = raw(client, "/big")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"] == 'W/"v1"'
+    assert int(response.headers["content-length"]) == len(body) < 4000
+    assert gzip.decompress(body) == b"row\n" * 1000
+
+
+def test_streams_are_compressed_as_they_go(client):
+    response, body = raw(client, "/stream")
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert gzip.decompress(body).decode().splitlines()[-1] == "line 4999"
+
+
+@pytest.mark.parametrize("path", ["/events", "/binary"])
+def test_event_streams_and_binary_formats_pass_through(client, path):
+    response, _ = raw(client, path)
+    assert "content-encoding" not in response.headers
+
+
+@pytest.fixture
+def stocked(floor):
+    for sku, bin_code in (("PARA", "A-01-01"), ("AMOX", "A-01-02")):
+        product = floor.product(sku)
+        floor.bin(bin_code)
+        floor.receive(product, "L1", date.today() + timedelta(days=90), 5, bin_code)
+
+
+def test_text_exports_stream_every_row(stocked):
+    client = TestClient(main.app)
+
+    response = client.get("/inventory/stock/live/export", params={"format": "csv"})
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert sorted((row["sku"], row["bin_code"], row["quantity"]) for row in rows) == [
+        ("AMOX", "A-01-02", "5"), ("PARA", "A-01-01", "5")
+    ]
+
+    response = client.get("/inventory/stock/live/export", params={"format": "ndjson", "sku": "AMOX"})
+    assert [json.loads(line)["bin_code"] for line in response.text.splitlines()] == ["A-01-02"]
+
+
+def test_columnar_exports_need_pyarrow(stocked, monkeypatch):
+    monkeypatch.setattr(exports, "pa", None)
+    response = TestClient(main.app).get("/inventory/stock/live/export", params={"format": "parquet"})
+    assert response.status_code == 501
+
+
+def test_arrow_export_round_trips(stocked):
+    pa = pytest.importorskip("pyarrow")
+    response = TestClient(main.app).get("/inventory/stock/live/export", params={"format": "arrow"})
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert sorted(table.column("sku").to_pylist()) == ["AMOX", "PARA"]
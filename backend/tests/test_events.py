@@ -0,0 +1,48 @@
+import asyncio
+import threading
+import time
+from app.core.events import EventBus, InMemoryBackend
+
+
+def test_concurrent_publishers_deliver_in_seq_order():
+    backend = InMemoryBackend()
+    bus = EventBus(backend)
+    threads, per_thread = 8, 100
+
+    # A slow hand-over (many subscribers) widens the window between sequencing and delivery
+    def slow_deliver(events):
+        time.sleep(0.0002)
+        bus._deliver(events)
+    backend.attach(slow_deliver)
+
+    async def run():
+        subscription = bus.subscribe()
+        subscription.queue = asyncio.Queue()  # unbounded: this test is about order, not lag
+        start = threading.Barrier(threads)
+
+        def publish():
+            start.wait()
+            for _ in range(per_thread):
+                bus.publish([{"type": "stock.quantity", "warehouse_id": 1}])
+
+        workers = [threading.Thread(target=publish) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        while any(worker.is_alive() for worker in workers):
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)  # let the last call_soon_threadsafe callbacks run
+        return [subscription.queue.get_nowait()["seq"] for _ in range(subscription.queue.qsize())]
+
+    seqs = asyncio.run(run())
+    assert seqs == list(range(1, threads * per_thread + 1))
+    assert bus.head() == threads * per_thread
+
+
+def test_replay_reports_whether_the_buffer_reaches_back():
+    backend = InMemoryBackend(size=3)
+    for _ in range(5):
+        backend.publish([{"type": "stock.quantity"}])
+    events, complete = backend.since(2)
+    assert [e["seq"] for e in events] == [3, 4, 5] and complete
+    assert not backend.since(1)[1]
+    assert not backend.since(9)[1]      # ahead of us: the process restarted
@@ -0,0 +1,44 @@
+from datetime import date, timedelta
+import pytest
+from fastapi.testclient import TestClient
+from app import main
+from app.domains.inventory import expiry
+
+
+@pytest.fixture
+def shelf(floor):
+    product = floor.product("PARA")
+    floor.bin("A-01-01")
+    floor.bin("A-01-02")
+    today = date.today()
+    floor.receive(product, "GONE", today - timedelta(days=1), 4, "A-01-01")
+    floor.receive(product, "SOON", today + timedelta(days=20), 10, "A-01-01")
+    floor.receive(product, "SOON", today + timedelta(days=20), 5, "A-01-02")
+    floor.receive(product, "LATER", today + timedelta(days=100), 7, "A-01-02")
+    return product
+
+
+def test_summary_buckets_are_cumulative(db, shelf):
+    result = expiry.summary(db, thresholds=(30, 90, 180))
+
+    assert result["expired"] == {"sellable_units": 4, "quarantined_units": 0}
+    assert [(b["within_days"], b["sellable_units"]) for b in result["expiring"]] == [(30, 15), (90, 15), (180, 22)]
+    assert [(p["name"], p["sellable_units"]) for p in expiry.expiring_products(db, within_days=30)] == [("PARA", 15)]
+    assert expiry.verify_calendar(db) == []
+
+
+def test_calendar_does_not_drift_through_allocation_and_sweep(db, shelf):
+    response = TestClient(main.app).post("/sales/orders/", json={
+        "customer_name": "Apollo", "items": [{"product_id": shelf.id, "quantity": 12, "unit_price": 1.0}]
+    })
+    assert response.status_code == 200, response.text
+    assert expiry.verify_calendar(db) == []
+    assert [(b["within_days"], b["sellable_units"]) for b in expiry.summary(db, thresholds=(30,))["expiring"]] == [(30, 3)]
+
+    result = expiry.sweep(db)
+    db.commit()
+    assert (result["quarantined_rows"], result["quarantined_units"]) == (1, 4)
+    assert expiry.summary(db)["expired"] == {"sellable_units": 0, "quarantined_units": 4}
+    assert expiry.verify_calendar(db) == []
+
+    assert expiry.sweep(db)["quarantined_rows"] == 0  # already quarantined rows are left alone
@@ -0,0 +1,81 @@
+from datetime import date, timedelta
+import numpy as np
+import pytest
+from app.domains.analytics import forecast
+from app.domains.analytics.models import ProductForecast, ProductSalesDaily
+
+TODAY = date(2026, 6, 1)  # a Monday
+
+
+def test_demand_blocks_split_products_across_blocks_and_chunks():
+    product_ids = np.array([1, 2, 5, 7, 9], dtype=np.int64)
+    sales = [
+        (np.array([1, 2, 2]), np.array([0, 1, 3]), np.array([4.0, 2.0, 1.0], dtype=np.float32)),
+        (np.array([3, 5, 9]), np.array([2, 9, 0]), np.array([8.0, 5.0, 6.0], dtype=np.float32)),   # 3 was deleted; day 9 is out of range
+    ]
+
+    blocks = list(forecast.demand_blocks(product_ids, iter(sales), days=4, block=2))
+
+    assert [ids.tolist() for ids, _ in blocks] == [[1, 2], [5, 7], [9]]
+    assert blocks[0][1].tolist() == [[4, 0, 0, 0], [0, 2, 0, 1]]
+    assert blocks[1][1].tolist() == [[0, 0, 0, 0], [0, 0, 0, 0]]
+    assert blocks[2][1].tolist() == [[6, 0, 0, 0]]
+
+
+def sell(db, product, per_weekday, days):
+    # per_weekday[w] units every weekday w (Monday = 0) over the `days` before TODAY
+    db.add_all([
+        ProductSalesDaily(product_id=product.id, day=day, quantity=per_weekday[day.weekday()])
+        for day in (TODAY - timedelta(days=n) for n in range(1, days + 1))
+        if per_weekday[day.weekday()]
+    ])
+    db.commit()
+
+
+def test_steady_seller_forecasts_its_rate(db, floor):
+    steady = floor.product("STEADY")
+    sell(db, steady, [10] * 7, forecast.FIT_DAYS)
+
+    result = forecast.refresh(db, today=TODAY)
+    db.commit()
+
+    assert (result["mode"], result["products"]) == ("full", 1)
+    stored = db.get(ProductForecast, steady.id)
+    assert stored.as_of == TODAY - timedelta(days=1)
+    assert stored.daily_rate == pytest.approx(10, rel=0.01)
+    assert stored.ma_7 == stored.ma_28 == pytest.approx(10)
+
+
+def test_weekday_profile_shapes_the_horizon(db, floor):
+    weekdays_only = floor.product("OFFICE")
+    sell(db, weekdays_only, [14, 14, 14, 14, 14, 0, 0], forecast.FIT_DAYS)
+
+    forecast.refresh(db, today=TODAY)
+    db.commit()
+
+    # 70 units a week either way; the level still carries the weekend that just ended
+    assert db.get(ProductForecast, weekdays_only.id).daily_rate == pytest.approx(10, rel=0.15)
+    window = np.array([[14, 14, 14, 14, 14, 0, 0] * 8], dtype=np.float32)
+    profile = forecast.weekday_profile(window, TODAY - timedelta(days=56))
+    assert profile[0, 0] > 1.3 and profile[0, 6] < 0.1
+    assert profile.sum() == pytest.approx(7)
+
+
+def test_refresh_is_incremental_once_forecasts_exist(db, floor):
+    steady = floor.product("STEADY")
+    sell(db, steady, [10] * 7, forecast.FIT_DAYS)
+    forecast.refresh(db, today=TODAY)
+    db.commit()
+
+    assert forecast.refresh(db, today=TODAY)["mode"] == "current"
+
+    later = TODAY + timedelta(days=3)
+    db.add_all([ProductSalesDaily(product_id=steady.id, day=TODAY + timedelta(days=n), quantity=10) for n in range(3)])
+    db.commit()
+    result = forecast.refresh(db, today=later)
+    db.commit()
+
+    assert result["mode"] == "incremental"
+    stored = db.get(ProductForecast, steady.id)
+    assert stored.as_of == later - timedelta(days=1)
+    assert stored.daily_rate == pytest.approx(10, rel=0.01)
@@ -0,0 +1,108 @@
+import asyncio
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.core import idempotency
+from app.core.idempotency import IdempotencyMiddleware, MemoryStore, StoredResponse, DONE
+
+
+def make_client(store=None):
+    calls = []
+    app = FastAPI()
+    app.add_middleware(IdempotencyMiddleware, prefixes=("/orders/",), store=store or MemoryStore(ttl=60))
+
+    @app.post("/orders/")
+    def create(payload: dict):
+        calls.append(payload)
+        return {"order": len(calls), **payload}
+
+    return TestClient(app), calls
+
+
+def test_same_key_and_body_is_replayed():
+    client, calls = make_client()
+    headers = {"Idempotency-Key": "k-1"}
+
+    first = client.post("/orders/", json={"sku": "A"}, headers=headers)
+    again = client.post("/orders/", json={"sku": "A"}, headers=headers)
+
+    assert first.status_code == again.status_code == 200
+    assert again.json() == first.json() == {"order": 1, "sku": "A"}
+    assert again.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+    assert len(calls) == 1
+
+
+def test_same_key_different_body_is_422():
+    client, calls = make_client()
+    headers = {"Idempotency-Key": "k-2"}
+
+    client.post("/orders/", json={"sku": "A"}, headers=headers)
+    clash = client.post("/orders/", json={"sku": "B"}, headers=headers)
+
+    assert clash.status_code == 422
+    assert len(calls) == 1
+
+
+def test_requests_without_key_always_run():
+    client, calls = make_client()
+    client.post("/orders/", json={"sku": "A"})
+    client.post("/orders/", json={"sku": "A"})
+    assert len(calls) == 2
+
+
+def stored(size: int) -> StoredResponse:
+    return StoredResponse(status=200, headers=[], body=b"x" * size, compressed=False)
+
+
+def test_memory_store_evicts_oldest_past_byte_cap():
+    store = MemoryStore(ttl=60, max_bytes=250)
+    for key in ("a", "b", "c"):
+        assert store.reserve(key, key) is None
+        store.complete(key, key, stored(100))
+
+    assert store.reserve("a", "a") is None       # evicted: the key is free again
+    assert store.reserve("b", "b").state == DONE
+    assert store.reserve("c", "c").state == DONE
+    assert store.stored_bytes <= 250
+
+
+def test_memory_store_release_frees_bytes():
+    store = MemoryStore(ttl=60, max_bytes=1000)
+    store.reserve("a", "a")
+    store.complete("a", "a", stored(100))
+    store.release("a")
+    assert store.stored_bytes == 0
+    assert len(store) == 0
+
+
+def test_finishing_request_keeps_a_newer_requests_event():
+    # The first request outlived IN_PROGRESS_TTL and a second one claimed the key meanwhile
+    newer = asyncio.Event()
+
+    class Store:
+        def reserve(self, key, fingerprint):
+            return None
+
+        def complete(self, key, fingerprint, response):
+            pass
+
+        def release(self, key):
+            pass
+
+    async def app(scope, receive, send):
+        await receive()
+        middleware._running["k-3"] = newer
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    middleware = IdempotencyMiddleware(app, prefixes=("/",), store=Store())
+    scope = {"type": "http", "method": "POST", "path": "/", "headers": [(idempotency.HEADER, b"k-3")]}
+
+    async def receive():
+        return {"type": "http.request", "body": b"{}", "more_body": False}
+
+    async def send(message):
+        pass
+
+    asyncio.run(middleware(scope, receive, send))
+    assert middleware._running["k-3"] is newer
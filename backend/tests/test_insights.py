@@ -0,0 +1,15 @@
+from app.domains.analytics import engine
+
+
+def test_progress_covers_the_last_partial_chunk(db, floor, monkeypatch):
+    monkeypatch.setattr(engine, "CHUNK_SIZE", 2)
+    for sku in ("A", "B", "C"):
+        floor.product(sku)
+
+    reports = []
+    insights = engine.compute_insights(db, window_days=30, progress=reports.append)
+
+    assert reports == [2, 3]
+    assert [(insight["title"], insight["message"]) for insight in insights] == [
+        ("Low Inventory", f"{sku} is below safety stock levels.") for sku in ("A", "B", "C")
+    ]
@@ -0,0 +1,130 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+import pytest
+from fastapi.testclient import TestClient
+from app import main
+from app.domains.inventory import models as inv_models
+from app.domains.jobs import runner as jobs, tasks
+from app.domains.jobs.models import Job, JobResultChunk, JobStatus
+from app.domains.jobs.runner import Cron, Runner
+
+
+@pytest.mark.parametrize("expression, after, expected", [
+    ("*/15 * * * *", datetime(2026, 3, 1, 10, 7, 30), datetime(2026, 3, 1, 10, 15)),
+    ("*/15 * * * *", datetime(2026, 3, 1, 10, 15), datetime(2026, 3, 1, 10, 30)),   # strictly after
+    ("0 2 * * *", datetime(2026, 3, 1, 2, 0), datetime(2026, 3, 2, 2, 0)),
+    ("30 23 31 12 *", datetime(2026, 6, 1), datetime(2026, 12, 31, 23, 30)),
+    ("0 9 * * 1-5", datetime(2026, 3, 6, 10, 0), datetime(2026, 3, 9, 9, 0)),       # Friday -> Monday
+    ("0 0 * * 7", datetime(2026, 3, 2), datetime(2026, 3, 8)),                      # 7 is Sunday too
+    ("0 0 1 * 1", datetime(2026, 3, 2, 12), datetime(2026, 3, 9)),                  # day fields OR'ed
+    ("0 0 29 2 *", datetime(2026, 1, 1), datetime(2028, 2, 29)),                    # next leap day
+    ("5,10-12/2 * * * *", datetime(2026, 3, 1, 10, 6), datetime(2026, 3, 1, 10, 10)),
+])
+def test_cron_next_after(expression, after, expected):
+    assert Cron(expression).next_after(after) == expected
+
+
+@pytest.mark.parametrize("expression", ["* * * *", "60 * * * *", "* 24 * * *", "5-1 * * * *"])
+def test_cron_rejects_bad_expressions(expression):
+    with pytest.raises(ValueError):
+        Cron(expression)
+
+
+def test_stop_requeues_claimed_jobs_that_never_started(db):
+    job = jobs.submit(db, "expiry_sweep")
+    db.commit()
+
+    runner = Runner()
+    runner._workers = 2
+    runner._pool = ThreadPoolExecutor(max_workers=1)
+    release = threading.Event()
+    runner._pool.submit(release.wait)              # the only pool thread is busy
+    runner._thread = threading.Thread(target=lambda: None)
+    runner._thread.start()
+
+    runner._tick()                                  # claims the job; it waits behind the busy thread
+    db.expire_all()
+    assert db.get(Job, job.id).status == JobStatus.RUNNING
+
+    runner.stop()
+    release.set()
+    db.expire_all()
+    requeued = db.get(Job, job.id)
+    assert requeued.status == JobStatus.QUEUED
+    assert requeued.worker is None
+    assert runner._running == {}
+
+
+def test_cancelled_sweep_rolls_back(db, floor):
+    product = floor.product("OLD-1")
+    floor.bin("A-01-01")
+    floor.receive(product, "EXP", date.today() - timedelta(days=1), 5, "A-01-01")
+    job = jobs.submit(db, "expiry_sweep")
+    job.status, job.cancel_requested = JobStatus.RUNNING, True
+    db.commit()
+
+    with pytest.raises(jobs.JobCancelled):
+        tasks.expiry_sweep(jobs.JobContext(job.id))
+    assert db.query(inv_models.Stock).filter(inv_models.Stock.is_quarantined == True).count() == 0
+
+
+@pytest.mark.parametrize("kind", ["expiry_sweep", "ledger_snapshot"])
+def test_tasks_stop_at_progress_when_runner_stops(db, kind):
+    job = jobs.submit(db, kind)
+    db.commit()
+    stopping = threading.Event()
+    stopping.set()
+    with pytest.raises(jobs._ShuttingDown):
+        getattr(tasks, kind)(jobs.JobContext(job.id, stopping))
+
+
+@jobs.task("test_lines")
+def _lines(ctx, count: int, fail_at: int = -1):
+    def chunks():
+        for n in range(count):
+            if n == fail_at:
+                raise RuntimeError("export broke")
+            yield f"{n:08d},{'x' * 56}\n"
+    return jobs.Output("text/csv", chunks())
+
+
+def test_large_result_is_stored_in_chunks_and_streamed_back(db, monkeypatch):
+    monkeypatch.setattr(jobs, "RESULT_CHUNK_BYTES", 1024)
+    job = jobs.submit(db, "test_lines", {"count": 20000})
+    db.commit()
+    Runner()._execute(job.id, "test_lines", {"count": 20000})
+
+    db.expire_all()
+    done = db.get(Job, job.id)
+    assert done.status == JobStatus.SUCCEEDED
+    assert done.result_bytes == 20000 * 66
+    assert db.query(JobResultChunk).filter(JobResultChunk.job_id == job.id).count() > 1
+
+    response = TestClient(main.app).get(f"/jobs/{job.id}/result")
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert len(lines) == 20000
+    assert lines[0].startswith("00000000,") and lines[-1].startswith("00019999,")
+
+
+def test_failed_result_leaves_no_chunks(db, monkeypatch):
+    monkeypatch.setattr(jobs, "RESULT_CHUNK_BYTES", 1024)
+    job = jobs.submit(db, "test_lines", {"count": 20000, "fail_at": 15000})
+    db.commit()
+    Runner()._execute(job.id, "test_lines", {"count": 20000, "fail_at": 15000})
+
+    db.expire_all()
+    assert db.get(Job, job.id).status == JobStatus.FAILED
+    assert db.query(JobResultChunk).count() == 0
+
+
+def test_prune_drops_result_chunks(db):
+    job = jobs.submit(db, "test_lines", {"count": 10})
+    db.commit()
+    Runner()._execute(job.id, "test_lines", {"count": 10})
+
+    pruned = jobs.prune(db, now=datetime.utcnow() + timedelta(days=365))
+    db.commit()
+    assert pruned == 1
+    assert db.query(JobResultChunk).count() == 0
@@ -0,0 +1,66 @@
+from datetime import date, datetime, timedelta
+import pytest
+from sqlalchemy import update
+from app.domains.inventory import models as inv_models, ledger
+
+
+@pytest.fixture
+def journal(db, floor, monkeypatch):
+    """10 received two hours ago, counted down to 7 an hour ago, to 4 now; snapshot in between."""
+    monkeypatch.setattr(ledger, "SNAPSHOT_SETTLE_SECONDS", 0)
+    now = datetime.utcnow()
+    product = floor.product("AMOX-250")
+    floor.bin("A-01-01")
+
+    def backdate(at):
+        db.execute(update(inv_models.StockMovement).where(inv_models.StockMovement.created_at > at - timedelta(minutes=1))
+                   .values(created_at=at))
+        db.commit()
+
+    stock_id = floor.receive(product, "B1", date.today() + timedelta(days=365), 10, "A-01-01").stock_id
+    backdate(now - timedelta(hours=2))
+    ledger.adjust(db, stock_id, 7, "cycle count")
+    db.commit()
+    backdate(now - timedelta(hours=1))
+    snapshot = ledger.take_snapshot(db)
+    ledger.adjust(db, stock_id, 4, "cycle count")
+    db.commit()
+    return product, stock_id, snapshot, now
+
+
+def on_hand(result, product):
+    return sum(line["on_hand"] for line in result["lines"] if line["product_id"] == product.id)
+
+
+def test_stock_at_reads_snapshot_plus_tail(db, journal):
+    product, _, snapshot, now = journal
+    assert snapshot is not None and snapshot.rows == 1
+
+    before = ledger.stock_at(db, now - timedelta(minutes=90))
+    assert before["snapshot_id"] is None
+    assert on_hand(before, product) == 10
+
+    at_snapshot = ledger.stock_at(db, now - timedelta(minutes=30))
+    assert at_snapshot["snapshot_id"] == snapshot.id
+    assert on_hand(at_snapshot, product) == 7
+
+    assert on_hand(ledger.stock_at(db, now + timedelta(seconds=5)), product) == 4
+    assert ledger.stock_at(db, now - timedelta(hours=3))["lines"] == []
+
+
+def test_reconcile_matches_then_reports_drift(db, journal):
+    _, stock_id, _, _ = journal
+    assert ledger.reconcile(db) == []
+    assert ledger.reconcile(db, full=True) == []
+
+    # A write that bypassed the ledger
+    db.execute(update(inv_models.Stock).where(inv_models.Stock.id == stock_id).values(quantity=9))
+    db.commit()
+
+    for full in (False, True):
+        drift = ledger.reconcile(db, full=full)
+        assert drift == [{
+            "stock_id": stock_id,
+            "stock": {"quantity": 9, "quarantined": 0},
+            "ledger": {"quantity": 4, "quarantined": 0}
+        }]
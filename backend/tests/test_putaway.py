@@ -0,0 +1,148 @@
+from datetime import date, timedelta
+from fastapi.testclient import TestClient
+from app import main
+from app.core.database import SessionLocal
+from app.domains.inventory import models as inv_models, putaway, receiving, schemas as inv_schemas
+from app.domains.inventory.putaway import _Zone
+
+
+def test_nearest_picks_closest_bin_with_room():
+    zone = _Zone([11, 12, 13, 14, 15, 16], [0, 50, 0, 0, 5, 50])
+    assert zone.nearest(4, 10) == 5           # position 4 has 5 free: too small
+    assert zone.nearest(2, 10) == 1
+    assert zone.nearest(3, 5) == 4
+    assert zone.nearest(0, 10) == 1
+    assert zone.nearest(5, 60) is None
+
+
+def test_nearest_ties_go_forward():
+    zone = _Zone([1, 2, 3, 4, 5], [20, 0, 0, 0, 20])
+    assert zone.nearest(2, 10) == 4
+    zone.set(4, 0)
+    assert zone.nearest(2, 10) == 0
+
+
+def test_zone_total_follows_updates():
+    zone = _Zone([1, 2, 3], [10, 20, 30])
+    assert zone.total == 60
+    zone.set(1, 5)
+    assert zone.total == 45
+    assert zone.nearest(0, 25) == 2
+
+
+def line(product, quantity, warehouse_id=None):
+    return inv_schemas.InboundTransaction(
+        product_id=product.id, batch_number="B1", expiry_date=date.today() + timedelta(days=200),
+        mrp=1.0, quantity=quantity, warehouse_id=warehouse_id
+    )
+
+
+def test_unanchored_line_goes_to_zone_with_most_total_space(db, floor):
+    product = floor.product("ORS-1")
+    floor.bin("A-01-01", capacity=100)        # one big bin
+    other = inv_models.Warehouse(name="Annex", location_code="ANX-01")
+    db.add(other)
+    db.commit()
+    for code in ("B-01-01", "B-01-02", "B-01-03"):
+        db.add(inv_models.Bin(bin_code=code, warehouse_id=other.id, capacity=60))
+    db.commit()
+    putaway.index.invalidate()
+
+    (suggestion,) = putaway.index.suggest(db, [line(product, 10)])
+    assert suggestion.warehouse_id == other.id
+
+
+def test_receipt_holds_its_bin_until_commit(db, floor):
+    product = floor.product("ORS-2")
+    floor.bin("A-01-01", capacity=100)
+    floor.bin("A-01-02", capacity=100)
+
+    # First receipt is assigned a bin but hasn't committed yet
+    results, _ = receiving.receive_lines(db, [line(product, 80)])
+    assert results[0].bin == "A-01-01"
+
+    # A concurrent receipt must not be given the same (now nearly full) bin
+    other = SessionLocal()
+    try:
+        (suggestion,) = putaway.index.suggest(other, [line(product, 80)], split=False)
+        assert suggestion.placements[0].bin_code == "A-01-02"
+    finally:
+        other.close()
+
+    db.commit()
+    (summary,) = putaway.index.summary(db)
+    assert summary["used"] == 80
+    assert putaway.index._held == {}
+
+
+def test_rolled_back_receipt_releases_its_hold(db, floor):
+    product = floor.product("ORS-3")
+    floor.bin("A-01-01", capacity=100)
+
+    receiving.receive_lines(db, [line(product, 80)])
+    db.rollback()
+
+    assert putaway.index._held == {}
+    (suggestion,) = putaway.index.suggest(db, [line(product, 100)], split=False)
+    assert suggestion.placements[0].bin_code == "A-01-01"
+
+
+def test_closed_session_releases_its_hold(db, floor):
+    # e.g. a receive route raising before it commits: the request session is just closed
+    product = floor.product("ORS-4")
+    floor.bin("A-01-01", capacity=100)
+    session = SessionLocal()
+    receiving.receive_lines(session, [line(product, 80)])
+    session.close()
+    assert putaway.index._held == {}
+
+
+def explicit(product, quantity, bin_code):
+    return line(product, quantity).model_copy(update={"target_bin_code": bin_code})
+
+
+def test_receipt_into_bin_of_wrong_temperature_is_rejected(db, floor):
+    insulin = floor.product("INS-1", cold=True)
+    syrup = floor.product("SYR-1")
+    floor.bin("A-01-01")
+    floor.bin("C-01-01", cold=True)
+
+    results, _ = receiving.receive_lines(db, [
+        explicit(insulin, 5, "A-01-01"), explicit(syrup, 5, "C-01-01"), explicit(insulin, 5, "C-01-01")
+    ])
+    assert [(r.status, r.reason) for r in results] == [
+        ("REJECTED", receiving.INCOMPATIBLE), ("REJECTED", receiving.INCOMPATIBLE), ("RECEIVED", None)
+    ]
+
+
+def test_receipt_beyond_bin_free_space_is_rejected(db, floor):
+    product = floor.product("ORS-5")
+    floor.bin("A-01-01", capacity=100)
+    floor.receive(product, "B0", date.today() + timedelta(days=100), 60, "A-01-01")
+
+    # Lines are checked in order against what the earlier ones took
+    results, _ = receiving.receive_lines(db, [
+        explicit(product, 30, "A-01-01"), explicit(product, 20, "A-01-01"), explicit(product, 10, "A-01-01")
+    ])
+    assert [(r.status, r.reason) for r in results] == [
+        ("RECEIVED", None), ("REJECTED", receiving.NO_CAPACITY), ("RECEIVED", None)
+    ]
+    db.commit()
+    (summary,) = putaway.index.summary(db)
+    assert summary["used"] == 100
+
+
+def test_single_line_receipt_status_codes(db, floor):
+    client = TestClient(main.app)
+    insulin = floor.product("INS-2", cold=True)
+    floor.bin("A-01-01", capacity=10)
+
+    def post(**changes):
+        body = {"product_id": insulin.id, "batch_number": "B1", "expiry_date": "2030-01-01",
+                "mrp": 1.0, "quantity": 5, "target_bin_code": "A-01-01"}
+        return client.post("/inventory/inbound/receive/", json={**body, **changes}).status_code
+
+    assert post() == 422                                  # cold-chain product, ambient bin
+    assert post(product_id=insulin.id + 1) == 404          # unknown product
+    assert post(target_bin_code="Z-99-99") == 404          # unknown bin
+    assert post(target_bin_code=None) == 409               # no cold-storage bin anywhere
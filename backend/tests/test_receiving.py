@@ -0,0 +1,54 @@
+from datetime import date, timedelta
+from fastapi.testclient import TestClient
+from app import main
+from app.domains.inventory import models as inv_models
+
+
+def grn_line(product_id, batch_number, quantity, bin_code, **extra):
+    return {
+        "product_id": product_id, "batch_number": batch_number, "quantity": quantity, "target_bin_code": bin_code,
+        "expiry_date": (date.today() + timedelta(days=300)).isoformat(), "mrp": 12.5, **extra
+    }
+
+
+def test_grn_receives_valid_lines_and_rejects_the_rest(db, floor):
+    para = floor.product("PARA")
+    floor.bin("A-01-01")
+    floor.bin("A-01-02")
+    floor.receive(para, "OLD", date.today() + timedelta(days=100), 5, "A-01-01")
+
+    response = TestClient(main.app).post("/inventory/inbound/receive/bulk", json={"reference": "INV-77", "lines": [
+        grn_line(para.id, "NEW", 10, "A-01-01"),
+        grn_line(para.id + 999, "NEW", 10, "A-01-01"),   # unknown product
+        grn_line(para.id, "NEW", 4, "Z-99-99"),          # unknown bin
+        grn_line(para.id, "NEW", 6, "A-01-01"),          # same batch and bin as line 0
+        grn_line(para.id, "NEW", 3, "A-01-02"),
+        grn_line(para.id, "OLD", 2, "A-01-01"),          # tops up existing stock
+    ]})
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert (body["reference"], body["received"], body["rejected"]) == ("INV-77", 4, 2)
+    results = body["results"]
+    assert [r["status"] for r in results] == ["RECEIVED", "REJECTED", "REJECTED", "RECEIVED", "RECEIVED", "RECEIVED"]
+    assert results[0]["stock_id"] == results[3]["stock_id"]
+    assert results[0]["new_quantity"] == results[3]["new_quantity"] == 16
+    assert (results[4]["bin"], results[4]["new_quantity"]) == ("A-01-02", 3)
+    assert results[5]["new_quantity"] == 7
+
+    db.expire_all()
+    batches = db.query(inv_models.Batch.batch_number).order_by(inv_models.Batch.batch_number).all()
+    assert [number for (number,) in batches] == ["NEW", "OLD"]
+    assert db.query(inv_models.Stock).count() == 3
+
+
+def test_grn_with_nothing_valid_writes_nothing(db, floor):
+    floor.bin("A-01-01")
+
+    response = TestClient(main.app).post("/inventory/inbound/receive/bulk", json={"lines": [
+        grn_line(12345, "NEW", 10, "A-01-01")
+    ]})
+
+    assert response.status_code == 200
+    assert (response.json()["received"], response.json()["rejected"]) == (0, 1)
+    assert db.query(inv_models.Batch).count() == 0
@@ -0,0 +1,50 @@
+from datetime import date, timedelta
+import pytest
+from app.domains.master import models as master_models, search
+
+
+@pytest.fixture
+def catalog(db, floor):
+    products = {}
+    for sku, name, composition in (
+        ("DOLO-650", "Dolo 650", "Paracetamol 650mg"),
+        ("CALPOL-500", "Calpol 500", "Paracetamol 500mg"),
+        ("PARACIP-10", "Paracip", "Paracetamol 500mg"),
+        ("AMOXIL-250", "Amoxil", "Amoxicillin 250mg"),
+    ):
+        products[sku] = master_models.Product(sku_code=sku, name=name, composition=composition)
+        db.add(products[sku])
+    db.commit()
+    floor.bin("A-01-01")
+    floor.receive(products["DOLO-650"], "D1", date.today() + timedelta(days=300), 10, "A-01-01")
+    return products
+
+
+def skus(hits):
+    return [hit["sku_code"] for hit in hits]
+
+
+def test_prefix_hits_rank_before_composition_matches(db, catalog):
+    hits = search.search_products(db, "para")
+    assert skus(hits)[0] == "PARACIP-10"
+    assert sorted(skus(hits)[1:]) == ["CALPOL-500", "DOLO-650"]
+
+
+def test_every_term_must_match(db, catalog):
+    assert skus(search.search_products(db, "paracetamol 650")) == ["DOLO-650"]
+    assert skus(search.search_products(db, "amox 650")) == []
+
+
+def test_hits_carry_available_stock(db, catalog):
+    hits = {hit["sku_code"]: hit["available"] for hit in search.search_products(db, "paracetamol")}
+    assert hits == {"DOLO-650": 10, "CALPOL-500": 0, "PARACIP-10": 0}
+
+
+def test_index_follows_catalog_edits(db, catalog):
+    catalog["AMOXIL-250"].composition = "Paracetamol 250mg"
+    db.commit()
+    assert "AMOXIL-250" in skus(search.search_products(db, "paracetamol 250"))
+
+    db.delete(catalog["CALPOL-500"])
+    db.commit()
+    assert "CALPOL-500" not in skus(search.search_products(db, "paracetamol"))
@@ -0,0 +1,158 @@
+from datetime import date, datetime, timedelta
+import pytest
+from sqlalchemy import event
+from app.core.database import engine
+from app.domains.inventory import models as inv_models, schemas as inv_schemas, telemetry
+
+
+@pytest.fixture(autouse=True)
+def fresh_pipeline(monkeypatch):
+    # The buffer and the detector are per-process singletons: give every test its own
+    monkeypatch.setattr(telemetry, "buffer", telemetry.TelemetryBuffer())
+    monkeypatch.setattr(telemetry, "detector", telemetry.ExcursionDetector())
+
+
+def reading(bin_code, temperature, at):
+    return inv_schemas.TelemetryData(bin_code=bin_code, temperature=temperature, recorded_at=at)
+
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(engine, "before_cursor_execute", self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(engine, "before_cursor_execute", self)
+
+
+def test_nominal_readings_skip_the_database_once_warm(db, floor):
+    vaccine = floor.product("VAX", cold=True)
+    floor.bin("C-01", cold=True)
+    floor.receive(vaccine, "V1", date.today() + timedelta(days=300), 10, "C-01")
+    now = datetime.utcnow()
+    telemetry.process_readings(db, [reading("C-01", 4.0, now)])
+
+    with StatementCounter() as statements:
+        result = telemetry.process_readings(db, [reading("C-01", 5.0, now), reading("C-01", 7.5, now)])
+    assert statements.count == 0
+    assert result["quarantined"] == []
+
+
+def test_unknown_bins_are_reported(db, floor):
+    floor.bin("C-01", cold=True)
+    result = telemetry.process_readings(db, [reading("C-01", 4.0, None), reading("NOPE", 4.0, None)])
+    assert result["unknown_bins"] == ["NOPE"]
+
+
+def test_changing_product_limits_drops_cached_profiles(db, floor):
+    vaccine = floor.product("VAX", cold=True)
+    fridge = floor.bin("C-01", cold=True)
+    floor.receive(vaccine, "V1", date.today() + timedelta(days=300), 10, "C-01")
+    assert telemetry.cache.profile(db, fridge.id).max_safe == telemetry.DEFAULT_MAX_TEMP
+
+    vaccine.max_temp, vaccine.min_temp = 5.0, 2.0
+    db.commit()
+    profile = telemetry.cache.profile(db, fridge.id)
+    assert (profile.min_safe, profile.max_safe) == (2.0, 5.0)
+
+
+def test_failed_flush_keeps_points_for_the_next_one(db, floor, monkeypatch):
+    fridge = floor.bin("C-01", cold=True)
+    start = datetime(2026, 1, 5, 8, 0)
+    telemetry.process_readings(db, [reading("C-01", 4.0, start), reading("C-01", 5.0, start + timedelta(seconds=30))])
+
+    write_points = telemetry.write_points
+    def broken(db, points):
+        raise RuntimeError("database away")
+    monkeypatch.setattr(telemetry, "write_points", broken)
+    with pytest.raises(RuntimeError):
+        telemetry.buffer.flush()
+
+    telemetry.process_readings(db, [reading("C-01", 6.0, start + timedelta(seconds=60))])
+    monkeypatch.setattr(telemetry, "write_points", write_points)
+    telemetry.buffer.flush()
+
+    temperatures = [t for (t,) in db.query(inv_models.TelemetryReading.temperature)
+                    .filter(inv_models.TelemetryReading.bin_id == fridge.id)
+                    .order_by(inv_models.TelemetryReading.recorded_at)]
+    assert temperatures == [4.0, 5.0, 6.0]
+
+
+def test_flush_if_due_logs_instead_of_raising(monkeypatch):
+    def broken(db, points):
+        raise RuntimeError("database away")
+    monkeypatch.setattr(telemetry, "write_points", broken)
+    monkeypatch.setattr(telemetry, "FLUSH_SIZE", 1)
+    telemetry.buffer.add([(1, datetime(2026, 1, 5), 4.0)])
+
+    telemetry.buffer.flush_if_due()
+    assert len(telemetry.buffer._points) == 1
+
+
+def test_rollups_merge_across_flushes(db, floor):
+    fridge = floor.bin("C-01", cold=True)
+    start = datetime(2026, 1, 5, 8, 0)
+    telemetry.process_readings(db, [reading("C-01", 4.0, start), reading("C-01", 6.0, start + timedelta(seconds=20))])
+    telemetry.buffer.flush()
+    telemetry.process_readings(db, [reading("C-01", 2.0, start + timedelta(seconds=40)),
+                                    reading("C-01", 7.0, start + timedelta(minutes=1))])
+    telemetry.buffer.flush()
+
+    resolution, points = telemetry.history(db, fridge.id, start, start + timedelta(hours=1), "1m")
+    assert resolution == "1m"
+    assert [(p["t"], p["min"], p["max"], p["avg"], p["samples"]) for p in points] == [
+        (start, 2.0, 6.0, 4.0, 3),
+        (start + timedelta(minutes=1), 7.0, 7.0, 7.0, 1)
+    ]
+    _, hourly = telemetry.history(db, fridge.id, start, start + timedelta(days=30))
+    assert [(p["min"], p["max"], p["samples"]) for p in hourly] == [(2.0, 7.0, 4)]
+
+
+def test_history_picks_resolution_from_span(db, floor):
+    fridge = floor.bin("C-01", cold=True)
+    start = datetime(2026, 1, 5, 8, 0)
+    telemetry.process_readings(db, [reading("C-01", 4.0, start)])
+    telemetry.buffer.flush()
+
+    assert telemetry.history(db, fridge.id, start, start + timedelta(hours=1))[0] == "raw"
+    assert telemetry.history(db, fridge.id, start, start + timedelta(days=2))[0] == "1m"
+    assert telemetry.history(db, fridge.id, start, start + timedelta(days=60))[0] == "1h"
+
+
+def test_single_spike_is_watched_not_quarantined(db, floor):
+    vaccine = floor.product("VAX", cold=True)
+    floor.bin("C-01", cold=True)
+    floor.receive(vaccine, "V1", date.today() + timedelta(days=300), 10, "C-01")
+    start = datetime(2026, 1, 5, 8, 0)
+
+    result = telemetry.process_readings(db, [reading("C-01", 12.0, start)])
+    assert result["quarantined"] == []
+    assert [(w["bin_code"], w["product_id"], w["kind"]) for w in result["watching"]] == [("C-01", vaccine.id, "HIGH")]
+
+    result = telemetry.process_readings(db, [reading("C-01", 5.0, start + timedelta(seconds=30))])
+    assert result["watching"] == []
+    assert db.query(inv_models.Stock).filter(inv_models.Stock.is_quarantined == True).count() == 0
+
+
+def test_sustained_breach_quarantines_and_records_excursion(db, floor):
+    vaccine = floor.product("VAX", cold=True)
+    floor.bin("C-01", cold=True)
+    floor.receive(vaccine, "V1", date.today() + timedelta(days=300), 10, "C-01")
+    start = datetime(2026, 1, 5, 8, 0)
+
+    readings = [reading("C-01", 9.0 + minute / 10, start + timedelta(minutes=minute)) for minute in range(6)]
+    result = telemetry.process_readings(db, readings)
+    db.commit()
+
+    assert result["quarantined"] == [{"bin_code": "C-01", "batches": ["V1"]}]
+    stock = db.query(inv_models.Stock).one()
+    assert stock.is_quarantined
+    assert "HIGH 9.5°C for 300s" in stock.quarantine_reason
+    excursion = db.query(inv_models.TelemetryExcursion).one()
+    assert (excursion.product_id, excursion.kind, excursion.peak_temp) == (vaccine.id, "HIGH", 9.5)
@@ -0,0 +1,65 @@
+from datetime import date, timedelta
+import pytest
+from fastapi.testclient import TestClient
+from app import main
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def recalled(floor, client):
+    """LOT-1 of PARA sold to two customers (one order split across bins); AMOX has its own LOT-1."""
+    para, amox = floor.product("PARA"), floor.product("AMOX")
+    floor.bin("A-01-01")
+    floor.bin("A-01-02")
+    expiry = date.today() + timedelta(days=200)
+    floor.receive(para, "LOT-1", expiry, 4, "A-01-01")
+    floor.receive(para, "LOT-1", expiry, 6, "A-01-02")
+    floor.receive(amox, "LOT-1", expiry, 5, "A-01-01")
+    for customer, quantity in (("Apollo", 5), ("MedPlus", 2), ("Apollo", 1)):
+        response = client.post("/sales/orders/", json={
+            "customer_name": customer, "items": [{"product_id": para.id, "quantity": quantity, "unit_price": 1.0}]
+        })
+        assert response.status_code == 200, response.text
+    return para, amox
+
+
+def test_trace_lists_every_sale_and_where_the_rest_is(client, recalled):
+    para, _ = recalled
+    response = client.get("/compliance/trace/LOT-1", params={"product_id": para.id})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["batch_info"]["product"] == "PARA"
+    assert body["total_sold"] == 8
+    assert sorted((sale["customer"], sale["qty_sold"]) for sale in body["sales_trail"]) == [
+        ("Apollo", 1), ("Apollo", 1), ("Apollo", 4), ("MedPlus", 2)
+    ]
+    assert sorted((c["customer"], c["qty"]) for c in body["customers"]) == [("Apollo", 6), ("MedPlus", 2)]
+    assert [(loc["bin"], loc["qty"]) for loc in body["current_locations"]] == [("A-01-02", 2)]
+
+
+def test_bare_batch_number_shared_by_products_is_ambiguous(client, recalled):
+    response = client.get("/compliance/trace/LOT-1")
+    assert response.status_code == 409
+    assert sorted(c["product"] for c in response.json()["detail"]["candidates"]) == ["AMOX", "PARA"]
+
+    assert client.get("/compliance/trace/NOPE").status_code == 404
+
+
+def test_recall_mode_reports_misses_and_ambiguity(client, recalled):
+    para, _ = recalled
+    response = client.post("/compliance/trace/", json={"batches": [
+        {"batch_number": "LOT-1", "product_id": para.id},
+        {"batch_number": "LOT-1"},
+        {"batch_number": "NOPE"}
+    ]})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [result["total_sold"] for result in body["results"]] == [8]
+    assert body["not_found"] == [{"product_id": None, "batch_number": "NOPE"}]
+    assert [entry["batch_number"] for entry in body["ambiguous"]] == ["LOT-1"]
@@ -0,0 +1,48 @@
+from datetime import date, timedelta
+from fastapi.testclient import TestClient
+from app import main
+from app.domains.inventory.locations import route
+
+
+def test_route_walks_aisles_in_a_serpentine():
+    stops = [(1, "B-05-01"), (1, "A-03-02"), (1, "DOCK"), (1, "B-02-01"), (1, "A-03-01"), (1, "D-01-01"), (1, "A-01-01")]
+    assert route(stops) == [
+        (1, "A-01-01"), (1, "A-03-01"), (1, "A-03-02"),   # up aisle A
+        (1, "B-05-01"), (1, "B-02-01"),                   # down aisle B
+        (1, "D-01-01"),                                   # up again: C is not visited
+        (1, "DOCK")                                       # unparsable codes last
+    ]
+
+
+def test_wave_consolidates_orders_into_one_routed_pick_list(floor):
+    client = TestClient(main.app)
+    expiry = date.today() + timedelta(days=200)
+    products = {}
+    for sku, bin_code in (("P-A1", "A-01-01"), ("P-B5", "B-05-01"), ("P-B2", "B-02-01"), ("P-A3", "A-03-01")):
+        products[sku] = floor.product(sku)
+        floor.bin(bin_code)
+        floor.receive(products[sku], "L1", expiry, 50, bin_code)
+
+    order_ids = []
+    for items in ((("P-B2", 2), ("P-A1", 1)), (("P-A3", 4), ("P-B5", 3), ("P-A1", 2))):
+        response = client.post("/sales/orders/", json={"customer_name": "Apollo", "items": [
+            {"product_id": products[sku].id, "quantity": quantity, "unit_price": 1.0} for sku, quantity in items
+        ]})
+        assert response.status_code == 200, response.text
+        order_ids.append(response.json()["id"])
+
+    response = client.post("/sales/waves/", json={})
+    assert response.status_code == 200, response.text
+    wave = response.json()
+    assert (wave["order_count"], wave["line_count"]) == (2, 5)
+    assert [(task["sequence"], task["bin_code"], task["quantity"]) for task in wave["tasks"]] == [
+        (1, "A-01-01", 3), (2, "A-03-01", 4), (3, "B-05-01", 3), (4, "B-02-01", 2)
+    ]
+    assert wave["tasks"][0]["orders"] == [
+        {"order_id": order_ids[0], "quantity": 1}, {"order_id": order_ids[1], "quantity": 2}
+    ]
+
+    # Claimed orders don't go into a second wave
+    assert client.post("/sales/waves/", json={}).status_code == 404
+
+    assert client.post(f"/sales/waves/{wave['id']}/dispatch").json()["status"] == "DISPATCHED"
@@ -6,19 +6,52 @@ const InventoryDashboard = () => {
     const [loading, setLoading] = useState(true);
 
     useEffect(() => {
-        loadData();
-    }, []);
+        let source = null;
+        let cancelled = false;
 
-    const loadData = async () => {
-        try {
-            const response = await inventoryService.getLiveStock();
-            setStock(response.data);
-            setLoading(false);
-        } catch (error) {
-            console.error("Failed to fetch inventory", error);
-            setLoading(false);
-        }
-    };
+        // Snapshot once, then apply row deltas pushed by the server (no polling)
+        const connect = async () => {
+            try {
+                const response = await inventoryService.getLiveStock();
+                if (cancelled) return;
+                setStock(response.data);
+                setLoading(false);
+
+                const seq = response.headers['x-event-seq'] || 0;
+                source = new EventSource(inventoryService.liveStockEventsUrl(seq));
+                source.addEventListener('stock.received', (e) => {
+                    const { row } = JSON.parse(e.data);
+                    setStock((rows) => rows.some((r) => r.stock_id === row.stock_id)
+                        ? rows.map((r) => (r.stock_id === row.stock_id ? row : r))
+                        : [...rows, row]);
+                });
+                source.addEventListener('stock.quantity', (e) => {
+                    const { stock_id, quantity } = JSON.parse(e.data);
+                    setStock((rows) => rows
+                        .map((r) => (r.stock_id === stock_id ? { ...r, quantity } : r))
+                        .filter((r) => r.quantity > 0));
+                });
+                source.addEventListener('stock.quarantined', (e) => {
+                    const { stock_id } = JSON.parse(e.data);
+                    setStock((rows) => rows.map((r) => (r.stock_id === stock_id ? { ...r, is_quarantined: true } : r)));
+                });
+                // The server couldn't replay the gap: take a fresh snapshot
+                source.addEventListener('reset', () => {
+                    source.close();
+                    connect();
+                });
+            } catch (error) {
+                console.error("Failed to fetch inventory", error);
+                setLoading(false);
+            }
+        };
+
+        connect();
+        return () => {
+            cancelled = true;
+            if (source) source.close();
+        };
+    }, []);
 
     // Helper: Logic to determine if stock is expiring
     const getExpiryStatus = (dateString) => {
@@ -53,10 +86,10 @@ const InventoryDashboard = () => {
                     {stock.length === 0 ? (
                         <tr><td colSpan="6" style={{textAlign:'center', padding:'20px'}}>Warehouse is Empty</td></tr>
                     ) : (
-                        stock.map((item, index) => {
+                        stock.map((item) => {
                             const status = getExpiryStatus(item.expiry_date);
                             return (
-                                <tr key={index}>
+                                <tr key={item.stock_id}>
                                     <td>
                                         <span style={{ fontFamily: 'monospace', color: '#60a5fa' }}>{item.bin_code}</span>
                                         {item.is_cold_chain && <span style={{marginLeft: '8px'}}>❄</span>}
@@ -9,22 +9,46 @@ const api = axios.create({
     },
 });
 
+// Keyset-paged listings: follow X-Next-Cursor to the last page and return every row.
+// Headers are the first page's (its X-Event-Seq predates every row read after it).
+const getAllPages = async (url, params = {}) => {
+    const first = await api.get(url, { params });
+    const data = [...first.data];
+    let cursor = first.headers['x-next-cursor'];
+    while (cursor) {
+        const page = await api.get(url, { params: { ...params, cursor } });
+        data.push(...page.data);
+        cursor = page.headers['x-next-cursor'];
+    }
+    return { ...first, data };
+};
+
 export const masterService = {
-    getProducts: () => api.get('/master/products/'),
-    getManufacturers: () => api.get('/master/manufacturers/'),
+    getProducts: (params = {}) => getAllPages('/master/products/', params),
+    getManufacturers: (params = {}) => getAllPages('/master/manufacturers/', params),
+    // Type-ahead: brand, SKU prefix or molecule, with sellable stock
+    searchProducts: (q, limit = 20) => api.get('/master/products/search', { params: { q, limit } }),
 };
 
 export const inventoryService = {
-    // THIS WAS MISSING
-    getLiveStock: () => api.get('/inventory/stock/live/'),
+    // Whole floor: every page of the live stock listing
+    getLiveStock: (params = {}) => getAllPages('/inventory/stock/live/', params),
+    // Server-Sent Events: row deltas after the snapshot's X-Event-Seq
+    liveStockEventsUrl: (since) => `${API_URL}/inventory/stock/live/events?since=${since}`,
     
     // THIS WAS MISSING
     receiveStock: (data) => api.post('/inventory/inbound/receive/', data),
+    // Putaway: bins for { lines: [{ product_id, batch_number, quantity }] } (receipts without a bin get one automatically)
+    suggestPutaway: (data) => api.post('/inventory/putaway/suggest', data),
 };
 
 export const salesService = {
     // Create a new order (Triggers FEFO allocation)
     createOrder: (data) => api.post('/sales/orders/', data),
+    // Pick waves: plan (claims ALLOCATED orders), routed pick list, dispatch
+    planWave: (options = {}) => api.post('/sales/waves/', options),
+    getWave: (waveId) => api.get(`/sales/waves/${waveId}`),
+    dispatchWave: (waveId) => api.post(`/sales/waves/${waveId}/dispatch`),
 };
 
 export const complianceService = {
@@ -32,6 +56,18 @@ export const complianceService = {
 };
 export const analyticsService = {
     getInsights: () => api.get('/analytics/insights/'),
+    // Demand forecast per product (fastest movers first) with days of cover
+    getForecast: (params = {}) => api.get('/analytics/forecast/', { params }),
+    // Latest precomputed insights (falls back to computing when none is stored yet)
+    getStoredInsights: () => api.get('/analytics/insights/', { params: { stored: true } }),
+};
+
+export const jobsService = {
+    // Background jobs: submit, poll status/progress, fetch the stored result
+    submit: (kind, params = {}) => api.post('/jobs/', { kind, params }),
+    getJob: (jobId) => api.get(`/jobs/${jobId}`),
+    getResult: (jobId) => api.get(`/jobs/${jobId}/result`),
+    cancel: (jobId) => api.post(`/jobs/${jobId}/cancel`),
 };
 
 export default api;
\ No newline at end of file